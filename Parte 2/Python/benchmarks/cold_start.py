@@ -0,0 +1,139 @@
+"""
+Tempo da partida até o primeiro job: worker a frio contra fork de um pai aquecido.
+
+Num diretório temporário (SQLite com `--gallery` linhas sintéticas e uma foto
+em storage/app/public), mede `--repeat` vezes:
+  - cold: processo Python novo que importa o facesvc, abre repositório e
+          FaceService e roda process_image (o que um worker.py faz)
+  - fork: o mesmo a partir de um fork deste processo, depois de importar,
+          aquecer os modelos e publicar a galeria (o que o supervisor.py faz)
+
+O tempo vai de antes do Popen/fork até o fim do process_image no filho.
+
+Uso:
+    python -m benchmarks.cold_start --image foto.jpg --model hog --repeat 5
+"""
+from __future__ import annotations
+import argparse
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .suite import make_db, make_images, pct, working_dir
+
+PYTHON_DIR = Path(__file__).resolve().parents[1]
+
+
+def first_job(db: str, index_path: str, image: str, model: str) -> float:
+    """Abre tudo como o worker e processa uma foto; retorna o instante (perf_counter) do fim."""
+    from facesvc.config import RecognizerConfig
+    from facesvc.db_sqlite import FaceRepo
+    from facesvc.service import FaceService
+
+    repo = FaceRepo(db)
+    svc = FaceService(repo, RecognizerConfig(model=model, index_path=index_path))
+    svc.process_image(1, image)
+    done = time.perf_counter()
+    svc.close()
+    repo.close()
+    return done
+
+
+def cold(tmp: Path, db: str, index_path: str, image: str, model: str) -> float:
+    cmd = [sys.executable, "-m", "benchmarks.cold_start", "--child", db, index_path, image, "--model", model]
+    path = os.pathsep.join(p for p in (str(PYTHON_DIR), os.getenv("PYTHONPATH", "")) if p)
+    t0 = time.perf_counter()
+    subprocess.run(cmd, check=True, cwd=tmp / "Python", env={**os.environ, "PYTHONPATH": path},
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+
+
+def forked(db: str, index_path: str, image: str, model: str) -> float:
+    r, w = os.pipe()
+    t0 = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        code = 0
+        try:
+            os.write(w, repr(first_job(db, index_path, image, model)).encode())
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+    os.close(w)
+    with os.fdopen(r) as f:
+        done = float(f.read())
+    os.waitpid(pid, 0)
+    return done - t0
+
+
+def warm_parent(db: str, index_path: str, model: str) -> float:
+    from facesvc.config import RecognizerConfig
+    from facesvc.db_sqlite import FaceRepo
+    from facesvc.detection import warm_up
+    from facesvc.service import FaceService
+
+    t0 = time.perf_counter()
+    repo = FaceRepo(db)
+    svc = FaceService(repo, RecognizerConfig(model=model, index_path=index_path))
+    warm_up(svc.cfg)
+    svc.gallery.reload()
+    svc.close()
+    repo.close()
+    gc.freeze()
+    return time.perf_counter() - t0
+
+
+def run(args) -> dict:
+    report = {"gallery": args.gallery, "model": args.model, "repeat": args.repeat}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        public = tmp / "storage" / "app" / "public"
+        public.mkdir(parents=True)
+        (tmp / "Python").mkdir()
+        if args.image:
+            image = "bench" + Path(args.image).suffix
+            shutil.copy(args.image, public / image)
+        else:
+            (image,) = make_images(public, 1)
+        db = str(tmp / "faces.sqlite")
+        make_db(db, args.gallery, max(1, args.gallery // 20))
+        index_path = str(tmp / "faces.flat-index.npz")
+
+        cold_s = [cold(tmp, db, index_path, image, args.model) for _ in range(args.repeat)]
+        report["warm_parent_s"] = warm_parent(db, index_path, args.model)
+        with working_dir(tmp / "Python"):
+            fork_s = [forked(db, index_path, image, args.model) for _ in range(args.repeat)]
+    report["cold_first_job_s"], report["cold_first_job_p95_s"] = float(np.median(cold_s)), pct(cold_s, 95)
+    report["fork_first_job_s"], report["fork_first_job_p95_s"] = float(np.median(fork_s)), pct(fork_s, 95)
+    report["speedup"] = report["cold_first_job_s"] / report["fork_first_job_s"]
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--child", nargs=3, metavar=("DB", "INDEX", "IMAGE"), help=argparse.SUPPRESS)
+    ap.add_argument("--image", help="foto real (padrão: sintética, sem rostos)")
+    ap.add_argument("--model", default="hog", choices=["hog", "cnn"])
+    ap.add_argument("--gallery", type=int, default=10000, help="linhas em faces")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    if args.child:
+        first_job(*args.child, args.model)
+        return
+    if not hasattr(os, "fork"):
+        ap.error("precisa de os.fork")
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
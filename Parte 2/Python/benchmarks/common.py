@@ -0,0 +1,39 @@
+"""Utilitários compartilhados pelos benchmarks (dados sintéticos, cronômetro)."""
+from __future__ import annotations
+import time
+from typing import Tuple
+import numpy as np
+
+
+def synthetic_gallery(
+    n_rows: int,
+    n_people: int,
+    dim: int = 128,
+    spread: float = 0.25,
+    seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Galeria sintética parecida com embeddings do dlib: um centro por pessoa e
+    variações em torno dele. Retorna (encodings (N, dim), person_ids (N,), centros).
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0.0, 0.1, size=(n_people, dim)).astype(np.float32)
+    pids = rng.integers(0, n_people, size=n_rows)
+    noise = rng.normal(0.0, spread / np.sqrt(dim), size=(n_rows, dim)).astype(np.float32)
+    return centers[pids] + noise, pids.astype(np.int64) + 1, centers
+
+
+def synthetic_queries(centers: np.ndarray, k: int, spread: float = 0.25, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    who = rng.integers(0, centers.shape[0], size=k)
+    dim = centers.shape[1]
+    return centers[who] + rng.normal(0.0, spread / np.sqrt(dim), size=(k, dim)).astype(np.float32)
+
+
+class Timer:
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.t0
@@ -0,0 +1,80 @@
+"""
+Compara dois relatórios de `benchmarks.suite` e aponta regressões.
+
+Só entram métricas presentes nos dois relatórios e que seguem a convenção
+de nomes da suíte: `_s`/`_ms`/`_us` (tempo, menor é melhor) e `_per_s`
+(vazão, maior é melhor). Sai com código 1 se alguma piorou mais que
+`--threshold` (fração: 0.10 = 10%).
+
+Uso:
+    python -m benchmarks.compare base.json novo.json --threshold 0.20
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+
+
+def flatten(obj, prefix: str = "") -> dict:
+    out = {}
+    for k, v in obj.items():
+        key = f"{prefix}.{k}" if prefix else str(k)
+        if isinstance(v, dict):
+            out.update(flatten(v, key))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = float(v)
+    return out
+
+
+def direction(key: str) -> int:
+    """+1 se maior é melhor, -1 se menor é melhor, 0 se não é métrica de desempenho."""
+    name = key.rsplit(".", 1)[-1]
+    if name.endswith("_per_s"):
+        return 1
+    if name.endswith(("_s", "_ms", "_us")):
+        return -1
+    return 0
+
+
+def compare(base: dict, new: dict, threshold: float) -> list:
+    a = flatten({k: v for k, v in base.items() if k != "meta"})
+    b = flatten({k: v for k, v in new.items() if k != "meta"})
+    rows = []
+    for key in sorted(a.keys() & b.keys()):
+        sign = direction(key)
+        if sign == 0 or a[key] == 0:
+            continue
+        change = (b[key] - a[key]) / a[key]
+        worse = -sign * change  # > 0 = piorou
+        rows.append({"metric": key, "base": a[key], "new": b[key], "change": change, "regression": worse > threshold})
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("base")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=0.20)
+    ap.add_argument("--json", action="store_true", help="saída em JSON em vez de tabela")
+    args = ap.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    rows = compare(base, new, args.threshold)
+
+    if args.json:
+        print(json.dumps({
+            "base": base.get("meta", {}).get("commit"), "new": new.get("meta", {}).get("commit"), "rows": rows,
+        }, indent=2))
+    else:
+        print(f"base={base.get('meta', {}).get('commit', '?')} novo={new.get('meta', {}).get('commit', '?')}")
+        width = max((len(r["metric"]) for r in rows), default=10)
+        for r in rows:
+            flag = "  REGRESSÃO" if r["regression"] else ""
+            print(f"{r['metric']:<{width}}  {r['base']:>12.4g}  {r['new']:>12.4g}  {r['change']:>+8.1%}{flag}")
+    sys.exit(1 if any(r["regression"] for r in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Vazão da detecção + encoding em lote, por tamanho de lote.
+
+Lê frames amostrados de um vídeo (ou fotos de uma pasta, redimensionadas para
+o tamanho da primeira) e, para cada tamanho de lote, roda
+`analyze_images_batch` sobre todos eles. Tamanho 1 é o caminho de sempre, uma
+imagem por chamada. O ganho aparece com `--model cnn`; o HOG não tem modo em
+lote e serve de controle.
+
+Uso:
+    python -m benchmarks.detect_batch video.mp4 --model cnn --batch 1 4 8 16 32
+    python -m benchmarks.detect_batch pasta/com/fotos --model cnn --batch 1 8 16
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import List
+
+import cv2
+import numpy as np
+import face_recognition
+
+from facesvc.config import RecognizerConfig
+from facesvc.detection import analyze_images_batch
+from .common import Timer
+from .detect_scale import IMAGE_EXTS
+
+
+def load_frames(source: Path, limit: int, frame_skip: int) -> List[np.ndarray]:
+    if source.is_dir():
+        files = sorted(p for p in source.iterdir() if p.suffix.lower() in IMAGE_EXTS)[:limit]
+        images = [face_recognition.load_image_file(str(p)) for p in files]
+        if not images:
+            return []
+        h, w = images[0].shape[:2]
+        return [img if img.shape[:2] == (h, w) else cv2.resize(img, (w, h)) for img in images]
+    cap = cv2.VideoCapture(str(source))
+    frames, i = [], 0
+    while len(frames) < limit:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if i % (frame_skip + 1) == 0:
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        i += 1
+    cap.release()
+    return frames
+
+
+def run(images: List[np.ndarray], batches, model: str, upsample: int, detect_scale: float) -> dict:
+    cfg = RecognizerConfig(model=model, upsample=upsample, detect_scale=detect_scale)
+    report = {
+        "images": len(images), "shape": list(images[0].shape) if images else None,
+        "model": model, "upsample": upsample, "detect_scale": detect_scale, "cpus": os.cpu_count(), "runs": [],
+    }
+    analyze_images_batch(images[:1], cfg)  # aquece (carrega os modelos do dlib)
+    base = None
+    for size in batches:
+        timings: dict = {}
+        faces = 0
+        with Timer() as t:
+            for a in range(0, len(images), size):
+                faces += sum(len(locs) for locs, _ in analyze_images_batch(images[a:a + size], cfg, timings))
+        per_s = len(images) / t.elapsed
+        base = base or per_s
+        report["runs"].append({
+            "batch_size": size,
+            "images_per_s": per_s,
+            "speedup": per_s / base,
+            "detect_s": timings.get("detect", 0.0),
+            "encode_s": timings.get("encode", 0.0),
+            "faces": faces,
+        })
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("source", type=Path, help="vídeo ou diretório com imagens")
+    ap.add_argument("--batch", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    ap.add_argument("--model", default="cnn", choices=["hog", "cnn"])
+    ap.add_argument("--upsample", type=int, default=1)
+    ap.add_argument("--detect-scale", type=float, default=1.0)
+    ap.add_argument("--limit", type=int, default=128, help="frames/fotos usados")
+    ap.add_argument("--frame-skip", type=int, default=5)
+    args = ap.parse_args()
+    images = load_frames(args.source, args.limit, args.frame_skip)
+    if not images:
+        ap.error(f"nenhuma imagem lida de {args.source}")
+    print(json.dumps(run(images, args.batch, args.model, args.upsample, args.detect_scale), indent=2))
+
+
+if __name__ == "__main__":
+    main()
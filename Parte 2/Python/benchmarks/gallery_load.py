@@ -0,0 +1,83 @@
+"""
+Tempo de carga da galeria a frio: linha a linha x em páginas x snapshot .npy.
+
+Cria um SQLite temporário com `--rows` linhas em faces e mede:
+  - per_row:  fetchall + um np.frombuffer por linha + np.vstack (carga antiga)
+  - paged:    FaceRepo.load_face_rows (páginas direto num array pré-alocado)
+  - snapshot: EmbeddingGallery.reload com o índice salvo (vetores mapeados)
+  - delta:    idem, depois de `--delta` linhas novas no banco
+
+Uso:
+    python -m benchmarks.gallery_load --rows 200000 --delta 2000
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+
+import numpy as np
+
+from facesvc.db_sqlite import FaceRepo
+from facesvc.gallery import EmbeddingGallery
+from facesvc.repo import blob_to_enc, enc_to_blob
+from .common import Timer, synthetic_gallery
+from .repo_writes import SQLITE_SCHEMA
+
+
+def fill(conn, encs: np.ndarray, pids: np.ndarray) -> None:
+    conn.executemany("INSERT OR IGNORE INTO people (id, name) VALUES (?, NULL)", [(int(p),) for p in np.unique(pids)])
+    conn.executemany(
+        "INSERT INTO faces (person_id, encoding, source) VALUES (?, ?, 'bench')",
+        [(int(p), enc_to_blob(e)) for e, p in zip(encs, pids)]
+    )
+    conn.commit()
+
+
+def run(rows: int, people: int, delta: int, kind: str) -> dict:
+    encs, pids, _ = synthetic_gallery(rows + delta, people)
+    report = {"rows": rows, "delta": delta, "index": kind, "seconds": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite")
+        conn = sqlite3.connect(path)
+        conn.executescript(SQLITE_SCHEMA)
+        fill(conn, encs[:rows], pids[:rows])
+        index_path = os.path.join(tmp, f"bench.{kind}-index.npz")
+        secs = report["seconds"]
+
+        with Timer() as t:
+            got = conn.execute("SELECT encoding, person_id FROM faces").fetchall()
+            np.vstack([blob_to_enc(b) for (b, _) in got])
+        secs["per_row"] = t.elapsed
+
+        repo = FaceRepo(path)
+        with Timer() as t:
+            repo.load_face_rows()
+        secs["paged"] = t.elapsed
+
+        EmbeddingGallery(repo, index_kind=kind, index_path=index_path).reload()  # grava o snapshot
+        with Timer() as t:
+            EmbeddingGallery(FaceRepo(path), index_kind=kind, index_path=index_path).reload()
+        secs["snapshot"] = t.elapsed
+
+        fill(conn, encs[rows:], pids[rows:])
+        with Timer() as t:
+            EmbeddingGallery(FaceRepo(path), index_kind=kind, index_path=index_path).reload()
+        secs["delta"] = t.elapsed
+        conn.close()
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=200000)
+    ap.add_argument("--people", type=int, default=5000)
+    ap.add_argument("--delta", type=int, default=2000)
+    ap.add_argument("--index", default="flat", choices=["flat", "ivf"])
+    args = ap.parse_args()
+    print(json.dumps(run(args.rows, args.people, args.delta, args.index), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Vazão de fotos (jobs/min) com N jobs concorrentes.
+
+Para cada N, envia todas as imagens de amostra por N threads, como o worker
+faz com WORKER_CONCURRENCY=N: a detecção + encoding vai para um pool de N
+processos (N=1 roda no próprio processo). Não toca no banco; mede só o
+estágio de CPU, que é o que deveria escalar com o número de núcleos.
+
+Uso:
+    python -m benchmarks.photo_throughput caminho/para/imagens --workers 1 2 4 8 --repeat 3
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from facesvc.config import RecognizerConfig
+from facesvc.detection import analyze_image
+from facesvc.pipeline import ImageAnalyzerPool
+from .common import Timer
+from .detect_scale import IMAGE_EXTS
+
+
+def run(files, workers, model: str, repeat: int) -> dict:
+    jobs = [str(f) for f in files] * repeat
+    report = {"images": len(jobs), "model": model, "cpus": os.cpu_count(), "runs": []}
+    base = None
+    for n in workers:
+        cfg = RecognizerConfig(model=model, image_workers=n)
+        pool = ImageAnalyzerPool(cfg, workers=n) if n > 1 else None
+        analyze = pool.analyze if pool else (lambda f: analyze_image(f, cfg))
+        if pool:
+            list(ThreadPoolExecutor(n).map(analyze, jobs[:n]))  # aquece os processos (imports, modelos)
+        with Timer() as t:
+            with ThreadPoolExecutor(max_workers=n) as ex:
+                faces = sum(len(locs) for locs, _ in ex.map(analyze, jobs))
+        if pool:
+            pool.close()
+        per_min = 60.0 * len(jobs) / t.elapsed
+        base = base or per_min
+        report["runs"].append({
+            "workers": n,
+            "jobs_per_min": per_min,
+            "speedup": per_min / base,
+            "faces": faces,
+        })
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("images", type=Path, help="diretório com imagens de amostra")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--model", default="hog")
+    ap.add_argument("--repeat", type=int, default=1, help="repete o conjunto para alongar a medição")
+    args = ap.parse_args()
+    files = sorted(p for p in args.images.iterdir() if p.suffix.lower() in IMAGE_EXTS)
+    print(json.dumps(run(files, args.workers, args.model, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
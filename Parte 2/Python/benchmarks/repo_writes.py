@@ -0,0 +1,114 @@
+"""
+Linhas/s gravadas pelo repositório: um commit por linha x write-behind em lote.
+
+Simula o padrão de um vídeo: a cada "frame", K rostos viram K linhas em faces
+e K em video_hits, e de vez em quando aparece uma pessoa nova. `--batch 1`
+equivale ao comportamento antigo (commit a cada linha).
+
+SQLite usa um arquivo temporário com as tabelas do Laravel. MySQL (`--mysql`)
+usa o banco de DB_HOST/DB_DATABASE...: rode num banco de teste. As linhas
+criadas são apagadas no fim. video_hits só é exercitada com `--media-id` de
+uma mídia existente (chave estrangeira).
+
+Uso:
+    python -m benchmarks.repo_writes --rows 20000 --batch 1 50 500
+    python -m benchmarks.repo_writes --mysql --media-id 1 --rows 5000
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from .common import Timer
+
+SQLITE_SCHEMA = """
+CREATE TABLE people (id INTEGER PRIMARY KEY AUTOINCREMENT, name VARCHAR, created_at DATETIME, updated_at DATETIME);
+CREATE TABLE faces (id INTEGER PRIMARY KEY AUTOINCREMENT, person_id INTEGER NOT NULL REFERENCES people(id) ON DELETE CASCADE,
+                    encoding BLOB NOT NULL, source VARCHAR, created_at DATETIME, updated_at DATETIME);
+CREATE INDEX faces_person_id_index ON faces(person_id);
+CREATE TABLE video_hits (id INTEGER PRIMARY KEY AUTOINCREMENT, media_id INTEGER NOT NULL, person_id INTEGER NOT NULL,
+                         frame_index INTEGER NOT NULL, timestamp_s NUMERIC NOT NULL, left INTEGER NOT NULL, top INTEGER NOT NULL,
+                         right INTEGER NOT NULL, bottom INTEGER NOT NULL, distance FLOAT NOT NULL,
+                         created_at DATETIME, updated_at DATETIME);
+"""
+
+
+def write_workload(repo, rows: int, media_id, faces_per_frame: int = 2, new_person_every: int = 20) -> list:
+    """Grava ~`rows` linhas (faces + hits) e devolve os ids das pessoas criadas."""
+    rng = np.random.default_rng(0)
+    encs = rng.normal(0.0, 0.1, size=(64, 128)).astype(np.float32)
+    people = [repo.add_person(None)]
+    written = frame = 0
+    while written < rows:
+        for k in range(faces_per_frame):
+            if written % new_person_every == 0:
+                people.append(repo.add_person(None))
+            pid = people[-1 - (k % len(people))]
+            repo.add_embedding(pid, encs[written % len(encs)], f"bench@{frame}")
+            written += 1
+            if media_id is not None:
+                repo.record_video_hit(media_id, pid, frame, frame / 30.0, (10, 60, 60, 10), 0.4)
+                written += 1
+        frame += 1
+    repo.flush()
+    return people
+
+
+def run_sqlite(rows: int, batches) -> list:
+    import sqlite3
+    from facesvc.db_sqlite import FaceRepo
+
+    out = []
+    for batch in batches:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.sqlite")
+            conn = sqlite3.connect(path)
+            conn.executescript(SQLITE_SCHEMA)
+            conn.close()
+            repo = FaceRepo(path, batch_rows=batch, batch_ms=1e9)
+            with Timer() as t:
+                write_workload(repo, rows, media_id=1)
+            out.append({"backend": "sqlite", "batch_rows": batch, "rows": rows, "rows_per_s": rows / t.elapsed})
+            repo.close()
+    return out
+
+
+def run_mysql(rows: int, batches, media_id) -> list:
+    from facesvc.db import FaceRepo
+
+    out = []
+    for batch in batches:
+        repo = FaceRepo(batch_rows=batch, batch_ms=1e9)
+        with Timer() as t:
+            people = write_workload(repo, rows, media_id=media_id)
+        out.append({"backend": "mysql", "batch_rows": batch, "rows": rows, "rows_per_s": rows / t.elapsed})
+        marks = ",".join(["%s"] * len(people))
+
+        def cleanup(cur):
+            if media_id is not None:
+                cur.execute(f"DELETE FROM video_hits WHERE person_id IN ({marks})", people)
+            cur.execute(f"DELETE FROM faces WHERE person_id IN ({marks})", people)
+            cur.execute(f"DELETE FROM people WHERE id IN ({marks})", people)
+        repo._transaction(cleanup)
+        repo.close()
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--batch", type=int, nargs="+", default=[1, 50, 500])
+    ap.add_argument("--mysql", action="store_true", help="mede também o repositório MySQL (banco de teste!)")
+    ap.add_argument("--media-id", type=int, default=None, help="mídia existente para os video_hits no MySQL")
+    args = ap.parse_args()
+    runs = run_sqlite(args.rows, args.batch)
+    if args.mysql:
+        runs += run_mysql(args.rows, args.batch, args.media_id)
+    print(json.dumps({"runs": runs}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
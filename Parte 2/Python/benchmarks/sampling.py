@@ -0,0 +1,51 @@
+"""
+Tempo de parede de cada estratégia de amostragem de frames no mesmo vídeo.
+
+Mede só a decodificação/amostragem (sem detecção), que é o custo que as
+estratégias mudam.
+
+Uso:
+    python -m benchmarks.sampling video.mp4 --frame-skip 29 --samples-per-second 1
+"""
+from __future__ import annotations
+import argparse
+import json
+
+import cv2
+
+from facesvc.sampling import STRATEGIES, sample_frames
+from .common import Timer
+
+
+def run(path: str, strategies, frame_skip: int, samples_per_second: float) -> dict:
+    report = {"video": path, "frame_skip": frame_skip, "samples_per_second": samples_per_second, "runs": []}
+    for strategy in strategies:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise RuntimeError(f"Não foi possível abrir o vídeo: {path}")
+        frames = 0
+        with Timer() as t:
+            for _ in sample_frames(cap, path, strategy, frame_skip=frame_skip, samples_per_second=samples_per_second):
+                frames += 1
+        cap.release()
+        report["runs"].append({
+            "strategy": strategy,
+            "wall_s": t.elapsed,
+            "frames_sampled": frames,
+            "ms_per_sample": 1000 * t.elapsed / frames if frames else None,
+        })
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("video")
+    ap.add_argument("--strategy", nargs="+", default=list(STRATEGIES))
+    ap.add_argument("--frame-skip", type=int, default=5)
+    ap.add_argument("--samples-per-second", type=float, default=1.0)
+    args = ap.parse_args()
+    print(json.dumps(run(args.video, args.strategy, args.frame_skip, args.samples_per_second), indent=2))
+
+
+if __name__ == "__main__":
+    main()
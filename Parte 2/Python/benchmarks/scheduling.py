@@ -0,0 +1,116 @@
+"""
+Espera na fila por classe: fila única contra filas por classe com prioridade.
+
+Simula (sem Redis nem modelos) `--workers` workers atendendo chegadas de
+Poisson de fotos, vídeos curtos e vídeos longos durante `--duration` segundos,
+com os tempos de processamento de `--service` (exponenciais). Para cada
+política reporta p50/p99 da espera por classe:
+  - fifo:  fila única, ordem de chegada
+  - lifo:  fila única, o mais novo primeiro (a fila antiga saía pelo fim)
+  - prio:  filas por classe com os pesos de `--classes`, uma vez por valor
+           de `--aging` (0 = prioridade estrita, sem aging)
+
+A escolha da classe é a mesma `facesvc.scheduling.pick` do worker.
+
+Uso:
+    python -m benchmarks.scheduling --workers 4 --aging 60 0
+    python -m benchmarks.scheduling --rate photo:2 short:0.05 long:0.005 --service photo:0.5 short:20 long:300
+"""
+from __future__ import annotations
+import argparse
+import heapq
+import json
+from collections import deque
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from facesvc.scheduling import parse_classes, pick
+from .suite import pct
+
+Job = Tuple[float, str, float]   # chegada, classe, tempo de processamento
+
+
+def pairs(items: List[str]) -> Dict[str, float]:
+    return {name: float(value) for name, _, value in (s.partition(":") for s in items)}
+
+
+def arrivals(rates: Dict[str, float], service: Dict[str, float], duration: float, seed: int) -> List[Job]:
+    rng = np.random.default_rng(seed)
+    jobs: List[Job] = []
+    for name, rate in rates.items():
+        t = 0.0
+        while rate > 0:
+            t += rng.exponential(1.0 / rate)
+            if t >= duration:
+                break
+            jobs.append((t, name, float(rng.exponential(service[name]))))
+    jobs.sort()
+    return jobs
+
+
+def simulate(jobs: List[Job], workers: int, policy: str, spec: str = "", aging_s: float = 0.0) -> dict:
+    classes = [c for c in parse_classes(spec, "") if c.name != "default"] if policy == "prio" else []
+    names = [c.name for c in classes]
+    queues: Dict[str, deque] = {name: deque() for name in names}
+    single: deque = deque()
+    free = [0.0] * workers
+    waits: Dict[str, List[float]] = {}
+    i = 0
+    while i < len(jobs) or single or any(queues.values()):
+        t = heapq.heappop(free)
+        if not single and not any(queues.values()):
+            t = max(t, jobs[i][0])   # worker ocioso até a próxima chegada
+        while i < len(jobs) and jobs[i][0] <= t:
+            (queues[jobs[i][1]] if classes else single).append(jobs[i])
+            i += 1
+        if policy == "fifo":
+            job = single.popleft()
+        elif policy == "lifo":
+            job = single.pop()
+        else:
+            heads = [t - queues[n][0][0] if queues[n] else None for n in names]
+            job = queues[names[pick(classes, heads, aging_s)[0]]].popleft()
+        arrived, name, service = job
+        waits.setdefault(name, []).append(t - arrived)
+        heapq.heappush(free, t + service)
+    return {
+        name: {"jobs": len(w), "wait_p50_s": pct(w, 50), "wait_p99_s": pct(w, 99), "wait_max_s": max(w)}
+        for name, w in sorted(waits.items())
+    }
+
+
+def run(args) -> dict:
+    rates, service = pairs(args.rate), pairs(args.service)
+    jobs = arrivals(rates, service, args.duration, args.seed)
+    load = sum(rates[n] * service[n] for n in rates) / args.workers
+    report = {"workers": args.workers, "duration_s": args.duration, "jobs": len(jobs), "load": load,
+              "classes": args.classes, "policies": {}}
+    report["policies"]["fifo"] = simulate(jobs, args.workers, "fifo")
+    report["policies"]["lifo"] = simulate(jobs, args.workers, "lifo")
+    for aging in args.aging:
+        report["policies"][f"prio(aging={aging:g})"] = simulate(jobs, args.workers, "prio", args.classes, aging)
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--duration", type=float, default=4 * 3600, help="segundos simulados de chegadas")
+    ap.add_argument("--classes", default="photo:8,short:3,long:1", help="como QUEUE_CLASSES")
+    ap.add_argument("--aging", type=float, nargs="+", default=[60.0, 0.0], help="QUEUE_AGING_S a comparar")
+    ap.add_argument("--rate", nargs="+", default=["photo:2", "short:0.05", "long:0.005"], help="chegadas/s por classe")
+    ap.add_argument("--service", nargs="+", default=["photo:0.5", "short:20", "long:300"],
+                    help="tempo médio de processamento (s) por classe")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    if args.workers < 1:
+        ap.error("--workers precisa ser >= 1")
+    missing = set(pairs(args.rate)) - {c.name for c in parse_classes(args.classes, "")}
+    if missing or set(pairs(args.rate)) - set(pairs(args.service)):
+        ap.error("cada classe de --rate precisa estar em --classes e em --service")
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
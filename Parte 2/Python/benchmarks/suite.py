@@ -0,0 +1,245 @@
+"""
+Suíte de regressão do pipeline: um relatório JSON para comparar entre commits.
+
+Roda offline, num diretório temporário: SQLite com as tabelas do Laravel,
+galerias sintéticas de `--sizes` linhas e fotos/vídeo sintéticos (ou os reais
+de `--images` / `--video`). Mede:
+  - gallery:       load_all_encodings e reload da galeria, por tamanho
+  - best_match:    latência de uma busca (_best_match) e de um lote (_best_matches)
+  - repo_writes:   linhas/s gravadas pelo write-behind do SQLite
+  - process_image: s por foto (detecção + encoding + matching + gravação)
+  - process_video: s por vídeo, frames/s e tempo por estágio (facesvc.metrics)
+
+Fotos e vídeo sintéticos não têm rostos de verdade: medem decodificação e
+detector. Para o caminho completo (encoding, matching, gravação) passe mídia real.
+
+Métricas terminadas em `_s`/`_ms`/`_us` são tempos (menor é melhor) e em
+`_per_s` são vazões (maior é melhor); `benchmarks.compare` usa essa convenção.
+
+Uso:
+    python -m benchmarks.suite --sizes 1000 100000 1000000 --out bench.json
+    python -m benchmarks.suite --images pasta/com/fotos --video video.mp4 --out bench.json
+    python -m benchmarks.compare base.json bench.json
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from facesvc.config import RecognizerConfig
+from facesvc.db_sqlite import FaceRepo
+from facesvc.metrics import metrics
+from facesvc.service import FaceService
+from .common import Timer, synthetic_gallery, synthetic_queries
+from .detect_scale import IMAGE_EXTS
+from .gallery_load import fill
+from .repo_writes import SQLITE_SCHEMA, run_sqlite
+
+
+def make_db(path: str, rows: int, people: int, chunk_rows: int = 50_000) -> np.ndarray:
+    """SQLite novo com `rows` linhas sintéticas em faces; retorna os centros das pessoas."""
+    conn = sqlite3.connect(path)
+    conn.executescript(SQLITE_SCHEMA)
+    encs, pids, centers = synthetic_gallery(rows, people)
+    for a in range(0, rows, chunk_rows):
+        fill(conn, encs[a:a + chunk_rows], pids[a:a + chunk_rows])
+    conn.close()
+    return centers
+
+
+def make_images(dst: Path, n: int, size=(480, 640), seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    names = []
+    for i in range(n):
+        img = cv2.GaussianBlur(rng.integers(0, 256, size=size + (3,), dtype=np.uint8), (0, 0), 3)
+        name = f"bench-{i}.jpg"
+        cv2.imwrite(str(dst / name), img)
+        names.append(name)
+    return names
+
+
+def make_video(path: Path, seconds: float, fps: float = 30.0, size=(360, 640), seed: int = 0) -> None:
+    """Vídeo mp4v com fundo fixo e retângulos em movimento (força o decodificador a trabalhar)."""
+    rng = np.random.default_rng(seed)
+    h, w = size
+    background = cv2.GaussianBlur(rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8), (0, 0), 5)
+    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    for i in range(int(seconds * fps)):
+        frame = background.copy()
+        x = (7 * i) % (w - 80)
+        cv2.rectangle(frame, (x, 100), (x + 80, 200), (200, 180, 160), -1)
+        out.write(frame)
+    out.release()
+
+
+@contextmanager
+def working_dir(path: Path):
+    # FaceService lê a mídia de ../storage/app/public relativo ao diretório atual
+    prev = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(prev)
+
+
+def pct(values, q: float) -> float:
+    return float(np.percentile(np.asarray(values), q)) if len(values) else 0.0
+
+
+def bench_gallery(tmp: Path, rows: int, people: int, index: str, queries: int, batch: int) -> dict:
+    path = str(tmp / f"gallery-{rows}.sqlite")
+    centers = make_db(path, rows, people)
+    repo = FaceRepo(path)
+    with Timer() as t:
+        repo.load_all_encodings()
+    out = {"rows": rows, "load_all_encodings_s": t.elapsed}
+
+    svc = FaceService(repo, RecognizerConfig(index=index, gallery_ttl_s=0))
+    with Timer() as t:
+        svc.gallery.reload()
+    out["gallery_reload_s"] = t.elapsed
+
+    q = synthetic_queries(centers, queries)
+    svc._best_match(q[0])  # aquece
+    lat = []
+    for enc in q:
+        with Timer() as t:
+            svc._best_match(enc)
+        lat.append(t.elapsed * 1000.0)
+    out["best_match_p50_ms"], out["best_match_p95_ms"] = pct(lat, 50), pct(lat, 95)
+
+    qb = q[:batch]
+    with Timer() as t:
+        svc._best_matches(qb)
+    out["best_matches_batch"] = len(qb)
+    out["best_matches_per_query_us"] = t.elapsed / len(qb) * 1e6
+    repo.close()
+    os.remove(path)
+    return out
+
+
+def bench_media(tmp: Path, args) -> dict:
+    public = tmp / "storage" / "app" / "public"
+    public.mkdir(parents=True)
+    workdir = tmp / "Python"
+    workdir.mkdir()
+
+    if args.images:
+        files = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in IMAGE_EXTS)[:args.n_images]
+        images = []
+        for f in files:
+            shutil.copy(f, public / f.name)
+            images.append(f.name)
+    else:
+        images = make_images(public, args.n_images)
+    if args.video:
+        video = "bench" + Path(args.video).suffix
+        shutil.copy(args.video, public / video)
+    else:
+        video = "bench.mp4"
+        make_video(public / video, args.video_s)
+
+    db = str(tmp / "media.sqlite")
+    make_db(db, args.media_gallery, max(1, args.media_gallery // 20))
+    repo = FaceRepo(db)
+    svc = FaceService(repo, RecognizerConfig(model=args.model, gallery_ttl_s=0))
+    out = {}
+    with working_dir(workdir):
+        svc.process_image(0, images[0])  # aquece (modelos do dlib, galeria)
+        lat, faces = [], 0
+        for i, name in enumerate(images, start=1):
+            with Timer() as t:
+                res = svc.process_image(i, name)
+            lat.append(t.elapsed)
+            faces += len(res.detections)
+        out["process_image"] = {
+            "images": len(images), "faces": faces,
+            "mean_s": float(np.mean(lat)), "p95_s": pct(lat, 95),
+            "images_per_s": len(images) / sum(lat),
+        }
+
+        with metrics.job() as stats, Timer() as t:
+            res = svc.process_video(10_000, video, frame_skip=args.frame_skip, sampling=args.sampling)
+        summary = stats.to_dict()
+        frames = summary["counters"].get("frames_sampled", 0)
+        out["process_video"] = {
+            "frame_skip": args.frame_skip, "sampling": args.sampling, "frames_sampled": frames,
+            "hits": len(res.hits), "total_s": t.elapsed, "frames_per_s": frames / t.elapsed,
+            "stages": {f"{k}_s": v["seconds"] for k, v in summary["stages"].items()},
+        }
+    svc.close()
+    repo.close()
+    return out
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(args) -> dict:
+    report = {
+        "meta": {
+            "commit": git_commit(), "python": platform.python_version(), "numpy": np.__version__,
+            "opencv": cv2.__version__, "machine": platform.machine(), "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "gallery": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for rows in args.sizes:
+            report["gallery"][f"{args.index}/{rows}"] = bench_gallery(
+                tmp, rows, max(1, rows // 20), args.index, args.queries, args.batch
+            )
+        (writes,) = run_sqlite(args.write_rows, [500])
+        report["repo_writes"] = {"rows": writes["rows"], "rows_per_s": writes["rows_per_s"]}
+        if not args.skip_media:
+            report.update(bench_media(tmp, args))
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--index", default="flat", choices=["flat", "ivf"])
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--batch", type=int, default=32, help="rostos por chamada de _best_matches")
+    ap.add_argument("--write-rows", type=int, default=20000)
+    ap.add_argument("--images", help="pasta com fotos reais (padrão: sintéticas)")
+    ap.add_argument("--n-images", type=int, default=10)
+    ap.add_argument("--video", help="vídeo real (padrão: sintético)")
+    ap.add_argument("--video-s", type=float, default=10.0, help="duração do vídeo sintético")
+    ap.add_argument("--frame-skip", type=int, default=5)
+    ap.add_argument("--sampling", default="grab")
+    ap.add_argument("--model", default="hog", choices=["hog", "cnn"])
+    ap.add_argument("--media-gallery", type=int, default=10000, help="linhas em faces durante os testes de mídia")
+    ap.add_argument("--skip-media", action="store_true", help="só galeria e escrita (sem detector)")
+    ap.add_argument("--out", help="grava o relatório neste arquivo, além de imprimir")
+    args = ap.parse_args()
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
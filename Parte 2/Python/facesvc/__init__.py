@@ -1 +1 @@
-__all__ = ["db", "service", "models", "config", "db_sqlite"]
\ No newline at end of file
+__all__ = ["db", "repo", "service", "models", "config", "db_sqlite", "gallery", "matching", "index", "compaction", "tracking", "detection", "sampling", "pipeline", "chunking", "jobqueue", "cache", "metrics", "hits", "clustering", "adaptive", "scheduling"]
\ No newline at end of file
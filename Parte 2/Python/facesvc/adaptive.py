@@ -0,0 +1,193 @@
+from __future__ import annotations
+from dataclasses import dataclass, replace
+from typing import Dict, Iterator, List, Optional
+import time
+from loguru import logger
+
+from .config import RecognizerConfig
+from .metrics import metrics
+from .models import VideoBudget, VideoSettings
+from .sampling import SampledFrame
+
+
+@dataclass(frozen=True)
+class BudgetLevel:
+    """Um degrau de custo: configuração do detector e intervalo mínimo entre frames analisados."""
+    model: str
+    upsample: int
+    detect_scale: float
+    min_interval_s: float = 0.0   # 0 = todos os frames amostrados
+
+
+def budget_ladder(cfg: RecognizerConfig, sample_interval_s: float, detector: bool = True) -> List[BudgetLevel]:
+    """
+    Degraus do mais caro (a configuração do worker) ao mais barato: menos
+    upsample, frame menor no detector, HOG no lugar da CNN e, por fim, menos
+    frames analisados. Sem `detector` (detecção num pool de processos com
+    configuração fixa), só a amostragem muda.
+    """
+    levels = [BudgetLevel(cfg.model, cfg.upsample, cfg.detect_scale)]
+
+    def push(**changes) -> None:
+        levels.append(replace(levels[-1], **changes))
+
+    if detector:
+        for upsample in range(cfg.upsample - 1, -1, -1):
+            push(upsample=upsample)
+        for scale in (0.75, 0.5):
+            if scale < levels[-1].detect_scale:
+                push(detect_scale=scale)
+        if cfg.model == "cnn":
+            push(model="hog")
+        if 0.35 < levels[-1].detect_scale:
+            push(detect_scale=0.35)
+    for k in (2, 4, 8):
+        push(min_interval_s=k * sample_interval_s)
+    return levels
+
+
+class DeadlineController:
+    """
+    Ajusta o custo de um vídeo durante o processamento para terminar dentro
+    de `deadline_s` segundos de relógio.
+
+    `pace` envolve o iterador de frames amostrados: cada pedido de frame novo
+    marca o fim do anterior, então o custo medido inclui tudo (decodificação,
+    detecção, matching, gravação). A cada `check_s` o controlador compara o
+    custo recente por segundo de vídeo com o que o prazo permite no trecho
+    que falta: acima de `degrade_at` desce um degrau de `budget_ladder`,
+    abaixo de `upgrade_at` sobe um. Um degrau que já foi medido só volta a
+    ser usado se o custo dele couber no prazo (evita oscilar entre dois
+    degraus). Sem duração conhecida, só desce quando o prazo já passou.
+    """
+
+    def __init__(
+        self,
+        cfg: RecognizerConfig,
+        deadline_s: float,
+        sample_interval_s: float,
+        start_s: float = 0.0,
+        end_s: Optional[float] = None,
+        detector: bool = True,
+        check_s: float = 1.0,
+        degrade_at: float = 0.9,
+        upgrade_at: float = 0.45,
+        min_frames: int = 2,
+    ):
+        self.cfg = cfg
+        self.deadline_s = float(deadline_s)
+        self.start_s = float(start_s)
+        self.end_s = end_s
+        self.levels = budget_ladder(cfg, sample_interval_s, detector)
+        self.check_s = min(check_s, self.deadline_s / 20.0)
+        self.degrade_at = degrade_at
+        self.upgrade_at = upgrade_at
+        self.min_frames = min_frames
+        self.level = 0
+        self.settings: List[VideoSettings] = []
+        self._cfgs: Dict[int, RecognizerConfig] = {0: cfg}
+        self._t0: Optional[float] = None
+        self._check_t = 0.0          # relógio e posição no vídeo da última verificação
+        self._check_pos = start_s
+        self._frames_since = 0
+        self._cost: Optional[float] = None   # s de relógio por s de vídeo (média móvel)
+        self._level_cost: Dict[int, float] = {}   # último custo medido em cada degrau
+        self._last_due = None        # timestamp do último frame analisado
+        self._elapsed: Optional[float] = None
+
+    @property
+    def current(self) -> BudgetLevel:
+        return self.levels[self.level]
+
+    @property
+    def detect_cfg(self) -> RecognizerConfig:
+        """RecognizerConfig do detector no degrau atual."""
+        cfg = self._cfgs.get(self.level)
+        if cfg is None:
+            lv = self.current
+            cfg = self._cfgs[self.level] = replace(
+                self.cfg, model=lv.model, upsample=lv.upsample, detect_scale=lv.detect_scale,
+            )
+        return cfg
+
+    def pace(self, frames: Iterator[SampledFrame]) -> Iterator[SampledFrame]:
+        """Repassa os frames que o degrau atual manda analisar, medindo o custo entre um pedido e outro."""
+        self._t0 = time.perf_counter()
+        self._check_t = self._t0
+        for frame_idx, timestamp_s, frame in frames:
+            if not self.settings:
+                self._open_settings(frame_idx, timestamp_s)
+            self._maybe_adjust(frame_idx, timestamp_s)
+            if not self._due(timestamp_s):
+                continue
+            self.settings[-1].frames += 1
+            self._frames_since += 1
+            yield frame_idx, timestamp_s, frame
+        self._elapsed = time.perf_counter() - self._t0
+
+    def report(self) -> VideoBudget:
+        elapsed = self._elapsed
+        if elapsed is None:
+            elapsed = time.perf_counter() - self._t0 if self._t0 is not None else 0.0
+        met = elapsed <= self.deadline_s
+        if not met:
+            metrics.inc("deadline_missed")
+        return VideoBudget(deadline_s=self.deadline_s, elapsed_s=elapsed, met=met, settings=self.settings)
+
+    # --- controle ---
+    def _due(self, timestamp_s: float) -> bool:
+        gap = self.current.min_interval_s
+        if gap > 0 and self._last_due is not None and timestamp_s - self._last_due < gap - 1e-6:
+            return False
+        self._last_due = timestamp_s
+        return True
+
+    def _maybe_adjust(self, frame_idx: int, timestamp_s: float) -> None:
+        now = time.perf_counter()
+        if now - self._check_t < self.check_s or self._frames_since < self.min_frames:
+            return
+        advanced = timestamp_s - self._check_pos
+        if advanced > 0:
+            cost = (now - self._check_t) / advanced
+            self._cost = cost if self._cost is None else 0.5 * (self._cost + cost)
+            self._level_cost[self.level] = self._cost
+        self._check_t, self._check_pos, self._frames_since = now, timestamp_s, 0
+
+        elapsed = now - self._t0
+        left = self.deadline_s - elapsed
+        if self.end_s is None or self._cost is None:
+            ratio = float("inf") if left <= 0 else 0.0   # sem duração: só reage ao estouro
+            upgrade = False
+        elif left <= 0:
+            ratio, upgrade = float("inf"), False
+        else:
+            # custo atual sobre o custo que cabe no que falta do prazo
+            remaining = max(0.0, self.end_s - timestamp_s)
+            ratio = self._cost * remaining / left
+            upgrade = ratio < self.upgrade_at
+            known = self._level_cost.get(self.level - 1)
+            if upgrade and known is not None:
+                upgrade = known * remaining / left < self.degrade_at
+        if ratio > self.degrade_at and self.level + 1 < len(self.levels):
+            self._change(self.level + 1, frame_idx, timestamp_s, ratio)
+        elif upgrade and self.level > 0:
+            self._change(self.level - 1, frame_idx, timestamp_s, ratio)
+
+    def _change(self, level: int, frame_idx: int, timestamp_s: float, ratio: float) -> None:
+        self.level = level
+        self._cost = None   # o custo do degrau novo é medido do zero
+        self._open_settings(frame_idx, timestamp_s)
+        metrics.inc("budget_changes")
+        lv = self.current
+        logger.info(
+            f"Prazo {self.deadline_s:.0f}s: degrau {level}/{len(self.levels) - 1} "
+            f"({lv.model}, upsample={lv.upsample}, escala={lv.detect_scale:g}, intervalo={lv.min_interval_s:g}s) "
+            f"em {timestamp_s:.1f}s | carga={ratio:.2f}"
+        )
+
+    def _open_settings(self, frame_idx: int, timestamp_s: float) -> None:
+        lv = self.current
+        self.settings.append(VideoSettings(
+            from_frame=frame_idx, from_s=timestamp_s, level=self.level, model=lv.model,
+            upsample=lv.upsample, detect_scale=lv.detect_scale, min_interval_s=lv.min_interval_s,
+        ))
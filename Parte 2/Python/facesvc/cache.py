@@ -0,0 +1,212 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from loguru import logger
+
+from .config import RecognizerConfig
+
+Location = Tuple[int, int, int, int]  # (top, right, bottom, left)
+
+# muda quando o formato das entradas ou o que elas significam muda
+CACHE_VERSION = 1
+
+# campos do RecognizerConfig que alteram detecção/encoding (matching fica de fora: sempre roda de novo)
+_IMAGE_FIELDS = ("model", "upsample", "detect_scale", "detect_max_side")
+_VIDEO_FIELDS = _IMAGE_FIELDS + ("track", "track_iou", "track_reencode_iou", "track_reencode_s")
+
+
+def file_digest(path: str, chunk_bytes: int = 1 << 20) -> str:
+    """Hash do conteúdo do arquivo (BLAKE2b), lido em blocos."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@dataclass
+class VideoAnalysis:
+    """
+    Saída da análise de um vídeo, na ordem dos frames: as caixas de todo frame
+    com rosto e os encodings dos rostos que foram codificados (com tracking,
+    só parte deles). Reproduzida por `FaceService` sem abrir o vídeo.
+    """
+    fps: float
+    frames: List[Tuple[int, float, List[Location]]] = field(default_factory=list)
+    encodings: dict = field(default_factory=dict)  # (posição do frame, rosto) -> encoding
+
+    def add_frame(self, frame_idx: int, timestamp_s: float, locations) -> int:
+        self.frames.append((int(frame_idx), float(timestamp_s), [tuple(int(v) for v in loc) for loc in locations]))
+        return len(self.frames) - 1
+
+    def add_encodings(self, pos: int, face_idx, encodings) -> None:
+        for i, enc in zip(face_idx, encodings):
+            self.encodings[(pos, int(i))] = np.asarray(enc, dtype=np.float32)
+
+
+class AnalysisCache:
+    """
+    Cache em disco do resultado de detecção + encoding, por conteúdo de
+    arquivo: a mesma foto/vídeo enviado de novo (outro media_id) pula a parte
+    cara e só refaz o matching contra a galeria atual.
+
+    A chave junta o hash do arquivo, os campos de `RecognizerConfig` que mudam
+    a detecção/encoding e os parâmetros de amostragem do vídeo. Cada entrada é
+    um .npz em `root/xx/<chave>.npz`; acertos atualizam o mtime e, quando o
+    total passa de `max_bytes`, as entradas mais antigas (LRU por mtime) são
+    apagadas. Vários processos podem usar o mesmo diretório.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 2 << 30):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._total: Optional[int] = None   # bytes em disco (estimativa; refeita a cada limpeza)
+        os.makedirs(root, exist_ok=True)
+
+    # --- chaves ---
+    def key(self, path: str, cfg: RecognizerConfig, kind: str, **params) -> str:
+        fields = _VIDEO_FIELDS if kind == "video" else _IMAGE_FIELDS
+        spec = {
+            "v": CACHE_VERSION,
+            "kind": kind,
+            "file": file_digest(path),
+            "cfg": {f: getattr(cfg, f) for f in fields},
+            "params": params,
+        }
+        return hashlib.blake2b(json.dumps(spec, sort_keys=True).encode(), digest_size=20).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.npz")
+
+    # --- leitura ---
+    def _load(self, key: str):
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {k: data[k] for k in data.files}
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Entrada de cache ilegível removida ({path}): {e}")
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # LRU: acerto conta como uso recente
+        except OSError:
+            pass
+        return arrays
+
+    def get_image(self, key: str) -> Optional[Tuple[List[Location], List[np.ndarray]]]:
+        data = self._load(key)
+        if data is None:
+            return None
+        locations = [tuple(loc) for loc in data["locations"].tolist()]
+        return locations, list(data["encodings"])
+
+    def get_video(self, key: str) -> Optional[VideoAnalysis]:
+        data = self._load(key)
+        if data is None:
+            return None
+        out = VideoAnalysis(fps=float(data["fps"]))
+        bounds = np.concatenate([[0], np.cumsum(data["counts"])])
+        locations = data["locations"].tolist()
+        for pos, (fi, ts) in enumerate(zip(data["frame_index"].tolist(), data["timestamp_s"].tolist())):
+            a, b = int(bounds[pos]), int(bounds[pos + 1])
+            out.frames.append((fi, ts, [tuple(loc) for loc in locations[a:b]]))
+            for j in np.nonzero(data["encoded"][a:b])[0]:
+                out.encodings[(pos, int(j))] = data["encodings"][a + j]
+        return out
+
+    # --- escrita ---
+    def put_image(self, key: str, locations, encodings) -> None:
+        self._write(key, {
+            "locations": np.asarray(locations, dtype=np.int32).reshape((-1, 4)),
+            "encodings": np.asarray(encodings, dtype=np.float32).reshape((-1, 128)),
+        })
+
+    def put_video(self, key: str, analysis: VideoAnalysis) -> None:
+        counts = np.array([len(locs) for _, _, locs in analysis.frames], dtype=np.int32)
+        total = int(counts.sum())
+        encoded = np.zeros((total,), dtype=bool)
+        encodings = np.zeros((total, 128), dtype=np.float32)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        for (pos, i), enc in analysis.encodings.items():
+            encoded[offsets[pos] + i] = True
+            encodings[offsets[pos] + i] = enc
+        self._write(key, {
+            "fps": np.array(analysis.fps),
+            "frame_index": np.array([f[0] for f in analysis.frames], dtype=np.int64),
+            "timestamp_s": np.array([f[1] for f in analysis.frames], dtype=np.float64),
+            "counts": counts,
+            "locations": np.array([loc for _, _, locs in analysis.frames for loc in locs], dtype=np.int32).reshape((-1, 4)),
+            "encoded": encoded,
+            "encodings": encodings,
+        })
+
+    def _write(self, key: str, arrays: dict) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        try:
+            np.savez(tmp, **arrays)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar no cache ({path}): {e}")
+            self._remove(tmp)
+            return
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_total()
+            else:
+                self._total += os.path.getsize(path)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    # --- LRU ---
+    def _entries(self):
+        for sub in os.scandir(self.root):
+            if not sub.is_dir():
+                continue
+            for e in os.scandir(sub.path):
+                if e.name.endswith(".npz") and not e.name.endswith(".tmp.npz"):
+                    try:
+                        st = e.stat()
+                    except FileNotFoundError:
+                        continue  # removida por outro processo
+                    yield e.path, st.st_size, st.st_mtime
+
+    def _scan_total(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        """Apaga as entradas usadas há mais tempo até o total cair para 90% do limite."""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            if self._remove(path):
+                total -= size
+                removed += 1
+        self._total = total
+        if removed:
+            logger.info(f"Cache de análise: {removed} entradas antigas removidas ({total / 2**20:.1f} MiB em uso)")
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
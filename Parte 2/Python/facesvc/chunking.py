@@ -0,0 +1,286 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import json
+import threading
+import time
+import numpy as np
+from loguru import logger
+import redis
+
+from .models import VideoBudget, VideoProcessingResult
+
+MERGE = "merge"
+
+
+def plan_chunks(duration_s: float, chunk_s: float) -> List[Tuple[float, Optional[float]]]:
+    """
+    Divide [0, duração) em trechos de ~`chunk_s` segundos. O último fica aberto
+    (end_s=None) para não perder frames se a duração reportada for imprecisa;
+    uma sobra menor que meio trecho é absorvida pelo anterior.
+    """
+    if chunk_s <= 0 or duration_s <= chunk_s:
+        return [(0.0, None)]
+    n = max(1, int(round(duration_s / chunk_s)))
+    size = duration_s / n
+    bounds = [round(i * size, 3) for i in range(n)]
+    return [(a, b) for a, b in zip(bounds, bounds[1:])] + [(bounds[-1], None)]
+
+
+class ChunkCoordinator:
+    """
+    Estado de um vídeo dividido em pedaços, guardado num hash Redis por mídia
+    (`{prefix}:{media_id}`), para que qualquer worker pegue qualquer pedaço:
+
+      - n, params             quantos pedaços e os parâmetros comuns (path, amostragem...)
+      - chunk:{i}             "start:end" do trecho
+      - state:{i}             pending | running | done | failed
+      - lease:{i}             epoch até quando o worker dono ainda é considerado vivo
+      - attempts:{i}          tentativas já feitas
+      - result:{i}            VideoProcessingResult parcial (JSON)
+      - done                  contador de pedaços concluídos
+
+    A etapa final de junção ("merge") usa os mesmos campos state/lease/attempts.
+    Quem processa renova o lease numa thread; um pedaço `running` com lease
+    vencido (worker morreu) é devolvido à fila por `requeue_expired`.
+    """
+
+    def __init__(self, r, queue_key: str, prefix: str = "face:video", lease_s: float = 120.0, max_attempts: int = 3,
+                 job_class: Optional[str] = None):
+        self.r = r
+        self.queue_key = queue_key
+        self.job_class = job_class   # com filas por classe (facesvc.scheduling): vai no payload
+        self.prefix = prefix
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+
+    def _key(self, media_id: int) -> str:
+        return f"{self.prefix}:{media_id}"
+
+    @property
+    def _active_key(self) -> str:
+        return f"{self.prefix}:active"
+
+    def job_payload(self, media_id: int, step) -> str:
+        job = {"media_id": int(media_id), "chunk": step}
+        if self.job_class:
+            job["class"] = self.job_class
+        return json.dumps(job)
+
+    def _push(self, media_id: int, steps) -> None:
+        payloads = [self.job_payload(media_id, s) for s in steps]
+        if payloads:
+            self.r.rpush(self.queue_key, *payloads)
+
+    # --- criação ---
+    def create(self, media_id: int, chunks: List[Tuple[float, Optional[float]]], params: dict) -> None:
+        key = self._key(media_id)
+        fields = {"n": len(chunks), "params": json.dumps(params), "done": 0, "created_at": time.time()}
+        for i, (a, b) in enumerate(chunks):
+            fields[f"chunk:{i}"] = f"{a}:{'' if b is None else b}"
+            fields[f"state:{i}"] = "pending"
+            fields[f"attempts:{i}"] = 0
+        pipe = self.r.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping=fields)
+        pipe.sadd(self._active_key, int(media_id))
+        pipe.execute()
+        self._push(media_id, range(len(chunks)))
+        logger.info(f"Vídeo dividido em {len(chunks)} pedaços | media_id={media_id}")
+
+    # --- leitura ---
+    def params(self, media_id: int) -> Optional[dict]:
+        raw = self.r.hget(self._key(media_id), "params")
+        return json.loads(raw) if raw else None
+
+    def chunk_range(self, media_id: int, i: int) -> Tuple[float, Optional[float]]:
+        a, b = self.r.hget(self._key(media_id), f"chunk:{i}").split(":")
+        return float(a), (float(b) if b else None)
+
+    def results(self, media_id: int) -> List[VideoProcessingResult]:
+        key = self._key(media_id)
+        n = int(self.r.hget(key, "n"))
+        raws = self.r.hmget(key, [f"result:{i}" for i in range(n)])
+        return [VideoProcessingResult.model_validate(json.loads(raw)) for raw in raws]
+
+    def attempts(self, media_id: int, step) -> int:
+        return int(self.r.hget(self._key(media_id), f"attempts:{step}") or 0)
+
+    # --- ciclo de vida de um pedaço ---
+    def claim(self, media_id: int, step) -> bool:
+        """
+        Marca o pedaço como em execução; False se já terminou, se outro worker
+        ainda detém o lease (entrega duplicada) ou se a mídia não existe mais.
+        Leitura e escrita numa transação (WATCH/MULTI): com o pedaço entregue
+        duas vezes (reaper e lease vencido), só um worker o reivindica.
+        """
+        key = self._key(media_id)
+        with self.r.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    state, lease = pipe.hmget(key, [f"state:{step}", f"lease:{step}"])
+                    if state is None or state in ("done", "failed"):
+                        return False
+                    if state == "running" and lease is not None and float(lease) > time.time():
+                        return False
+                    pipe.multi()
+                    pipe.hset(key, mapping={f"state:{step}": "running", f"lease:{step}": time.time() + self.lease_s})
+                    pipe.execute()
+                    return True
+                except redis.WatchError:
+                    continue  # o hash mudou entre a leitura e o EXEC: lê de novo
+
+    @contextmanager
+    def lease(self, media_id: int, step):
+        """Renova o lease do pedaço enquanto o bloco executa."""
+        key = self._key(media_id)
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.lease_s / 3):
+                self.r.hset(key, f"lease:{step}", time.time() + self.lease_s)
+
+        t = threading.Thread(target=renew, name=f"lease-{media_id}-{step}", daemon=True)
+        t.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            t.join()
+
+    def complete(self, media_id: int, i: int, partial: VideoProcessingResult) -> bool:
+        """
+        Grava o resultado parcial do pedaço `i`. Retorna True para o worker que
+        concluiu o último pedaço: ele fica com a etapa de merge (já reivindicada).
+        """
+        key = self._key(media_id)
+        # json.dumps (e não model_dump_json) preserva distance=inf das pessoas novas
+        if not self.r.hsetnx(key, f"result:{i}", json.dumps(partial.model_dump())):
+            return False  # outro worker já concluiu este pedaço
+        pipe = self.r.pipeline()
+        pipe.hset(key, f"state:{i}", "done")
+        pipe.hincrby(key, "done", 1)
+        pipe.hget(key, "n")
+        _, done, n = pipe.execute()
+        if int(done) < int(n):
+            return False
+        self.r.hset(key, mapping={
+            f"state:{MERGE}": "running", f"lease:{MERGE}": time.time() + self.lease_s, f"attempts:{MERGE}": 0,
+        })
+        return True
+
+    def fail(self, media_id: int, step, error: str) -> bool:
+        """Devolve o pedaço à fila; True quando esgotou as tentativas e o vídeo todo falhou."""
+        key = self._key(media_id)
+        attempts = self.r.hincrby(key, f"attempts:{step}", 1)
+        if attempts >= self.max_attempts:
+            self.r.hset(key, mapping={f"state:{step}": "failed", "error": error})
+            return True
+        self.r.hset(key, f"state:{step}", "pending")
+        self._push(media_id, [step])
+        logger.warning(f"Pedaço {step} devolvido à fila ({attempts}/{self.max_attempts}) | media_id={media_id}")
+        return False
+
+    def cleanup(self, media_id: int) -> None:
+        pipe = self.r.pipeline()
+        pipe.delete(self._key(media_id))
+        pipe.srem(self._active_key, int(media_id))
+        pipe.execute()
+
+    def requeue_expired(self) -> List[int]:
+        """
+        Devolve à fila os pedaços `running` cujo lease venceu. Só um worker
+        varre por vez (trava com expiração). Retorna as mídias que esgotaram
+        as tentativas, para o chamador avisar o Laravel.
+        """
+        if not self.r.set(f"{self.prefix}:reaper", "1", nx=True, ex=max(1, int(self.lease_s / 2))):
+            return []
+        failed: List[int] = []
+        now = time.time()
+        for mid in self.r.smembers(self._active_key):
+            media_id = int(mid)
+            fields = self.r.hgetall(self._key(media_id))
+            if not fields:
+                self.r.srem(self._active_key, media_id)
+                continue
+            steps = [str(i) for i in range(int(fields["n"]))] + [MERGE]
+            for step in steps:
+                if fields.get(f"state:{step}") != "running" or float(fields.get(f"lease:{step}", 0)) > now:
+                    continue
+                logger.warning(f"Lease vencido do pedaço {step} | media_id={media_id}")
+                if self.fail(media_id, step if step == MERGE else int(step), "lease vencido"):
+                    failed.append(media_id)
+                    break
+        return failed
+
+
+def merge_chunk_results(gallery, partials: List[VideoProcessingResult], threshold: float) -> VideoProcessingResult:
+    """
+    Junta os resultados parciais num único VideoProcessingResult.
+
+    Pedaços processados em paralelo não veem as pessoas anônimas criadas
+    pelos outros ao mesmo tempo, então o mesmo rosto desconhecido pode virar
+    uma pessoa nova em cada pedaço. Aqui, cada pessoa nova de um pedaço é
+    comparada (centróide dos encodings) com as pessoas novas dos pedaços
+    anteriores; abaixo do threshold, as duas são fundidas no banco e os hits
+    e segmentos passam a apontar para a mais antiga. Segmentos que cruzam a
+    fronteira entre pedaços continuam separados.
+    """
+    gallery.ensure_fresh()  # inclui as pessoas criadas pelos outros workers
+    partials = sorted(partials, key=lambda p: p.start_s)
+    new_ids = [pid for p in partials for pid in p.new_person_ids]
+    centroids = gallery.centroids(new_ids)
+
+    canon_ids: List[int] = []
+    canon_vecs: List[np.ndarray] = []
+    canon_chunk: List[int] = []
+    remap: Dict[int, int] = {}
+    for ci, part in enumerate(partials):
+        for pid in part.new_person_ids:
+            vec = centroids.get(pid)
+            if vec is None:
+                continue
+            target = None
+            if canon_vecs:
+                d = np.linalg.norm(np.stack(canon_vecs) - vec, axis=1)
+                d[np.asarray(canon_chunk) == ci] = np.inf  # mesmo pedaço: o matching normal já decidiu
+                j = int(np.argmin(d))
+                if d[j] <= threshold:
+                    target = canon_ids[j]
+            if target is None:
+                canon_ids.append(pid)
+                canon_vecs.append(vec)
+                canon_chunk.append(ci)
+            else:
+                gallery.merge_person(pid, target)
+                remap[pid] = target
+
+    first = partials[0]
+    merged = VideoProcessingResult(
+        media_id=first.media_id, media_path=first.media_path, fps=first.fps,
+        frame_skip=first.frame_skip, sampling=first.sampling,
+    )
+    for part in partials:
+        for hit in part.hits:
+            pid = remap.get(hit.match.person_id, hit.match.person_id)
+            if pid != hit.match.person_id:
+                hit.match.person_id = pid
+                hit.match.name = gallery.name_of(pid)
+            merged.hits.append(hit)
+        for seg in part.segments:
+            if seg.person_id in remap:
+                seg.person_id = remap[seg.person_id]
+                seg.name = gallery.name_of(seg.person_id)
+            merged.segments.append(seg)
+    merged.new_person_ids = [pid for pid in new_ids if pid not in remap]
+    budgets = [p.budget for p in partials if p.budget is not None]
+    if budgets:
+        # pedaços com prazo rodam em paralelo: vale o mais lento
+        merged.budget = VideoBudget(
+            deadline_s=max(b.deadline_s for b in budgets), elapsed_s=max(b.elapsed_s for b in budgets),
+            met=all(b.met for b in budgets), settings=[s for b in budgets for s in b.settings],
+        )
+    if remap:
+        logger.info(f"Merge de pedaços: {len(remap)} pessoas duplicadas fundidas | media_id={first.media_id}")
+    return merged
@@ -0,0 +1,160 @@
+from __future__ import annotations
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+
+from .matching import nearest
+
+
+@dataclass
+class UnknownCluster:
+    """Rostos desconhecidos de um job que parecem ser a mesma pessoa, ainda sem linha em people."""
+    total: np.ndarray                 # soma dos encodings (o centróide é total / len)
+    encodings: List[np.ndarray] = field(default_factory=list)
+    items: List[Any] = field(default_factory=list)   # o que o chamador quer de volta na promoção (hits adiados)
+    first_s: float = 0.0
+    last_s: float = 0.0
+    last_frame: int = -1
+
+    def __len__(self) -> int:
+        return len(self.encodings)
+
+    @property
+    def centroid(self) -> np.ndarray:
+        return self.total / len(self.encodings)
+
+
+class UnknownFaceBuffer:
+    """
+    Agrupamento incremental (leader clustering) dos rostos sem match de um
+    vídeo, antes de criar pessoas.
+
+    Cada rosto desconhecido entra no grupo de centróide mais próximo, se
+    estiver a até `radius`, ou abre um grupo novo. Dois rostos do mesmo frame
+    nunca caem no mesmo grupo. Um grupo só vira pessoa quando junta
+    `min_faces` rostos; grupos que não são vistos há mais de `ttl_s` segundos
+    (ou que sobram no fim do vídeo) são descartados: em geral são detecções
+    falsas ou alguém que só passou pela borda do quadro.
+    """
+
+    def __init__(self, radius: float = 0.6, min_faces: int = 2, ttl_s: float = 5.0):
+        self.radius = float(radius)
+        self.min_faces = max(1, int(min_faces))
+        self.ttl_s = float(ttl_s)
+        self.clusters: List[UnknownCluster] = []
+
+    def __len__(self) -> int:
+        return len(self.clusters)
+
+    def add(self, encoding: np.ndarray, frame_idx: int, timestamp_s: float, item: Any = None) -> Optional[UnknownCluster]:
+        """Agrupa um rosto; devolve (e tira do buffer) o grupo se ele acabou de atingir `min_faces`."""
+        enc = np.asarray(encoding, dtype=np.float32).reshape(-1)
+        cluster = None
+        if self.clusters:
+            centroids = np.stack([c.centroid for c in self.clusters])
+            d = np.linalg.norm(centroids - enc, axis=1)
+            d[[c.last_frame == frame_idx for c in self.clusters]] = np.inf
+            j = int(np.argmin(d))
+            if d[j] <= self.radius:
+                cluster = self.clusters[j]
+        if cluster is None:
+            cluster = UnknownCluster(total=np.zeros_like(enc), first_s=timestamp_s)
+            self.clusters.append(cluster)
+        cluster.total += enc
+        cluster.encodings.append(enc)
+        cluster.items.append(item)
+        cluster.last_s, cluster.last_frame = timestamp_s, frame_idx
+        if len(cluster) >= self.min_faces:
+            self.clusters.remove(cluster)
+            return cluster
+        return None
+
+    def expire(self, now_s: float) -> List[UnknownCluster]:
+        """Tira do buffer os grupos que não aparecem há mais de `ttl_s`."""
+        stale = [c for c in self.clusters if now_s - c.last_s > self.ttl_s]
+        if stale:
+            self.clusters = [c for c in self.clusters if now_s - c.last_s <= self.ttl_s]
+        return stale
+
+    def drain(self) -> List[UnknownCluster]:
+        out, self.clusters = self.clusters, []
+        return out
+
+
+@dataclass
+class MergeReport:
+    anonymous_before: int
+    anonymous_after: int
+    merged: int
+    merges: List[Tuple[int, int, float]]   # (pessoa removida, pessoa mantida, distância entre centróides)
+    dry_run: bool
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def merge_anonymous_people(
+    repo,
+    radius: float = 0.5,
+    threshold: float = 0.6,
+    min_overlap: float = 0.5,
+    dry_run: bool = False,
+) -> MergeReport:
+    """
+    Funde pessoas anônimas (sem nome) que são a mesma pessoa, criadas antes
+    do agrupamento de desconhecidos ou por jobs diferentes.
+
+    As pessoas são visitadas em ordem de id; cada uma é comparada com a
+    pessoa mantida de centróide mais próximo. São fundidas (a mais nova na
+    mais antiga, via `repo.reassign_person`) quando os centróides estão a até
+    `radius` e pelo menos `min_overlap` dos encodings da mais nova têm um
+    encoding da mais antiga a até `threshold`. Pessoas com nome não são tocadas.
+    """
+    names = repo.load_person_names()
+    _, encs, pids = repo.load_face_rows()
+    anon = sorted(pid for pid, name in names.items() if not name)
+    rows: Dict[int, np.ndarray] = {}
+    if anon:
+        order = np.argsort(pids, kind="stable")
+        uniq, starts = np.unique(pids[order], return_index=True)
+        bounds = list(starts) + [pids.shape[0]]
+        wanted = set(anon)
+        for n, pid in enumerate(uniq.tolist()):
+            if pid in wanted:
+                rows[pid] = encs[order[bounds[n]:bounds[n + 1]]]
+
+    kept_ids: List[int] = []
+    kept_centroids: List[np.ndarray] = []
+    kept_rows: List[np.ndarray] = []
+    merges: List[Tuple[int, int, float]] = []
+    for pid in anon:
+        vecs = rows.get(pid)
+        if vecs is None:
+            continue  # pessoa sem rostos gravados: nada a comparar
+        centroid = vecs.mean(axis=0)
+        if kept_ids:
+            d = np.linalg.norm(np.stack(kept_centroids) - centroid, axis=1)
+            j = int(np.argmin(d))
+            if d[j] <= radius:
+                _, dist = nearest(vecs, kept_rows[j])
+                if float(np.mean(dist <= threshold)) >= min_overlap:
+                    merges.append((pid, kept_ids[j], float(d[j])))
+                    kept_rows[j] = np.vstack([kept_rows[j], vecs])
+                    kept_centroids[j] = kept_rows[j].mean(axis=0)
+                    continue
+        kept_ids.append(pid)
+        kept_centroids.append(centroid)
+        kept_rows.append(vecs)
+
+    if not dry_run:
+        for src, dst, _ in merges:
+            repo.reassign_person(src, dst)
+    logger.info(f"Pessoas anônimas: {len(anon)} -> {len(anon) - len(merges)} ({len(merges)} fundidas)")
+    return MergeReport(
+        anonymous_before=len(anon),
+        anonymous_after=len(anon) - len(merges),
+        merged=len(merges),
+        merges=merges,
+        dry_run=dry_run,
+    )
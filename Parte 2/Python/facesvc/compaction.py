@@ -0,0 +1,123 @@
+from __future__ import annotations
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Tuple
+import time
+import numpy as np
+from loguru import logger
+
+from .index import FlatIndex
+from .matching import nearest
+
+
+@dataclass
+class CompactionReport:
+    people: int
+    rows_before: int
+    rows_after: int
+    storage_bytes_before: Optional[int]
+    storage_bytes_after: Optional[int]
+    match_ms_before: float
+    match_ms_after: float
+    dry_run: bool
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def select_prototypes(encodings: np.ndarray, max_prototypes: int, radius: float) -> Tuple[np.ndarray, List[int]]:
+    """
+    Escolhe os protótipos de uma pessoa: o centróide mais até `max_prototypes - 1`
+    exemplares diversos, por farthest-point (k-center guloso). Para assim que
+    todo embedding da pessoa estiver a no máximo `radius` de algum protótipo.
+
+    Retorna (centróide, índices dos exemplares mantidos).
+    """
+    encs = np.asarray(encodings, dtype=np.float32)
+    centroid = encs.mean(axis=0)
+    _, dmin = nearest(encs, centroid[None, :])
+    keep: List[int] = []
+    while len(keep) < max_prototypes - 1:
+        i = int(np.argmax(dmin))
+        if dmin[i] <= radius:
+            break
+        keep.append(i)
+        _, d = nearest(encs, encs[i][None, :])
+        dmin = np.minimum(dmin, d)
+    return centroid, keep
+
+
+def _match_ms(gallery: np.ndarray, queries: np.ndarray, repeats: int = 3) -> float:
+    """Tempo médio (ms) por rosto de uma busca exata em lote na galeria dada."""
+    if gallery.shape[0] == 0 or queries.shape[0] == 0:
+        return 0.0
+    idx = FlatIndex(dim=gallery.shape[1])
+    idx.add(gallery)
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for q in queries:
+            idx.search(q[None, :])
+        best = min(best, time.perf_counter() - t0)
+    return 1000.0 * best / queries.shape[0]
+
+
+def compact_faces(
+    repo,
+    max_prototypes: int = 8,
+    radius: float = 0.35,
+    dry_run: bool = False,
+    sample_queries: int = 200,
+    vacuum: bool = True,
+) -> CompactionReport:
+    """
+    Reescreve a tabela faces mantendo, por pessoa, só o centróide e os
+    exemplares escolhidos por `select_prototypes`. Pessoas que já têm poucas
+    linhas (<= max_prototypes) não são tocadas.
+    """
+    size_before = repo.storage_bytes() if hasattr(repo, "storage_bytes") else None
+    ids, encs, pids = repo.load_face_rows()
+    rows_before = int(ids.shape[0])
+
+    rng = np.random.default_rng(0)
+    sample = encs[rng.choice(rows_before, min(sample_queries, rows_before), replace=False)] if rows_before else encs
+
+    order = np.argsort(pids, kind="stable")
+    uniq, starts = np.unique(pids[order], return_index=True)
+    bounds = list(starts) + [rows_before]
+
+    kept_rows: List[np.ndarray] = []
+    rows_after = 0
+    for n, pid in enumerate(uniq.tolist()):
+        sel = order[bounds[n]:bounds[n + 1]]
+        if sel.size <= max_prototypes:
+            kept_rows.append(encs[sel])
+            rows_after += int(sel.size)
+            continue
+        centroid, keep = select_prototypes(encs[sel], max_prototypes, radius)
+        kept = sel[keep]
+        kept_rows.append(np.vstack([centroid[None, :], encs[kept]]))
+        rows_after += 1 + len(keep)
+        if not dry_run:
+            drop = np.setdiff1d(ids[sel], ids[kept])
+            repo.replace_faces(drop.tolist(), [(pid, centroid, "prototype:centroid")])
+        logger.debug("Pessoa {}: {} -> {} linhas", pid, int(sel.size), 1 + len(keep))
+
+    compacted = np.vstack(kept_rows) if kept_rows else encs
+    match_before = _match_ms(encs, sample)
+    match_after = _match_ms(compacted, sample)
+    del encs, compacted
+
+    if not dry_run and vacuum and hasattr(repo, "vacuum"):
+        repo.vacuum()
+    size_after = repo.storage_bytes() if hasattr(repo, "storage_bytes") and not dry_run else None
+
+    return CompactionReport(
+        people=int(uniq.shape[0]),
+        rows_before=rows_before,
+        rows_after=rows_after,
+        storage_bytes_before=size_before,
+        storage_bytes_after=size_after,
+        match_ms_before=match_before,
+        match_ms_after=match_after,
+        dry_run=dry_run,
+    )
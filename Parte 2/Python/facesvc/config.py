@@ -1,7 +1,33 @@
 from dataclasses import dataclass
+from typing import Optional
 
 @dataclass
 class RecognizerConfig:
     threshold: float = 0.6
     model: str = "hog"   # "hog" ou "cnn"
     upsample: int = 1
+    detect_scale: float = 1.0     # fator aplicado ao frame antes do detector (encoding segue em resolução cheia)
+    detect_max_side: Optional[int] = None  # reduz até o maior lado caber nisso (ex.: 960)
+    gallery_ttl_s: float = 30.0   # recarga periódica da galeria (0 = só por contador de mudanças)
+    index: str = "flat"           # "flat" (exato) ou "ivf" (aproximado)
+    index_path: Optional[str] = None  # onde salvar o índice (.npz); None = não persiste
+    ivf_nlist: int = 256
+    ivf_nprobe: int = 8
+    consolidate: bool = False     # representa cada pessoa por um conjunto limitado de protótipos
+    prototype_radius: float = 0.35
+    max_prototypes: int = 8
+    video_workers: int = 1        # >1: detecção/encoding de vídeo num pool de processos
+    image_workers: int = 1        # >1: detecção/encoding de fotos num pool de processos (jobs concorrentes)
+    detect_batch: int = 1         # >1: detecção/encoding em lotes (frames do vídeo; fotos de jobs simultâneos)
+    batch_wait_ms: float = 50.0   # quanto uma foto espera por outras para completar o lote
+    track: bool = False           # vídeo: rastreia rostos entre frames e só recodifica quando preciso
+    track_iou: float = 0.3        # IoU mínimo para associar uma detecção a um track
+    track_reencode_iou: float = 0.5   # recodifica se a caixa se afastou disso do último encoding
+    track_reencode_s: float = 2.0     # ...ou se o último encoding do track tem mais que isso
+    raw_hits: bool = True         # vídeo: um hit por frame em video_hits e no resultado (False = só segmentos)
+    segment_gap_s: float = 2.0    # ausência maior que isso encerra o segmento de aparição da pessoa
+    unknown_min_faces: int = 1    # só vídeo: >1 liga o agrupamento de desconhecidos (1 = desligado, pessoa na hora)
+    unknown_radius: Optional[float] = None  # raio do agrupamento de desconhecidos; None = threshold
+    unknown_ttl_s: float = 5.0    # grupo de desconhecidos sem aparecer há mais que isso é descartado
+    cache_dir: Optional[str] = None   # cache de detecção/encoding por conteúdo do arquivo; None = desligado
+    cache_max_bytes: int = 2 << 30    # acima disso, apaga as entradas usadas há mais tempo
@@ -1,78 +1,351 @@
 from __future__ import annotations
-from typing import List, Optional, Tuple
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
 import numpy as np
 import os
+import queue
+import threading
+import time
+from loguru import logger
 import mysql.connector  # ou psycopg2, conforme seu Laravel
 
-# Helpers p/ BLOB <-> numpy
-def enc_to_blob(encoding: np.ndarray) -> bytes:
-    enc32 = encoding.astype(np.float32, copy=False)
-    return enc32.tobytes(order="C")
+from .metrics import metrics
+from .repo import FaceRows, blob_to_enc, enc_to_blob, read_face_pages  # noqa: F401  (blob_to_enc reexportado)
+
+# erros de conexão (servidor caiu, wait_timeout, rede): vale repetir numa conexão nova
+_RETRYABLE = (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError)
+
+_INSERT_FACE = "INSERT INTO faces (person_id, encoding, source, created_at, updated_at) VALUES (%s, %s, %s, NOW(), NOW())"
+_INSERT_HIT = """INSERT INTO video_hits
+                 (media_id, person_id, frame_index, timestamp_s, `left`, `top`, `right`, `bottom`, distance, created_at, updated_at)
+                 VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s, NOW(), NOW())"""
+_INSERT_SEGMENT = """INSERT INTO video_segments
+                     (media_id, person_id, start_frame, end_frame, start_s, end_s, hits, best_distance,
+                      `left`, `top`, `right`, `bottom`, created_at, updated_at)
+                     VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s, NOW(), NOW())"""
+
+
+def _missing_table(e: mysql.connector.Error) -> bool:
+    """Só ER_NO_SUCH_TABLE (1146) marca a tabela opcional como ausente; os demais erros sobem."""
+    return getattr(e, "errno", None) == 1146
 
-def blob_to_enc(blob: bytes) -> np.ndarray:
-    arr = np.frombuffer(blob, dtype=np.float32)
-    return arr.reshape((128,))
 
 class FaceRepo:
     """
     Repositório que fala diretamente com as tabelas do Laravel:
       - people (id, name)
       - faces  (id, person_id, encoding, source)
-      - video_hits (opcional)
+      - video_hits, video_segments (opcionais)
+
+    Usa um pool próprio de até `pool_size` conexões, abertas sob demanda:
+    cada operação pega uma conexão livre e a devolve no fim, então várias
+    threads do worker consultam o banco ao mesmo tempo. Quem não acha
+    conexão livre espera. Conexões mortas são trocadas na retirada; se a
+    conexão cair no meio da operação, ela é descartada e a operação é
+    repetida uma vez numa conexão nova (as de várias etapas rodam numa
+    transação, que o servidor desfaz na queda). `close` fecha todas as
+    conexões abertas. Consultas pontuais usam prepared statements.
+
+    Como no repositório SQLite, faces, video_hits e video_segments são write-behind: um
+    executemany (INSERT multi-linha, uma ida ao servidor) e um commit por
+    lote de `batch_rows` linhas / `batch_ms` ms, e em todo `flush()`.
     """
-    def __init__(self):
-        self.cnx = mysql.connector.connect(
+    def __init__(self, batch_rows: int = 500, batch_ms: float = 200.0, pool_size: int = 4, page_rows: int = 10_000):
+        self._config = dict(
             host=os.getenv("DB_HOST", "127.0.0.1"),
             port=int(os.getenv("DB_PORT", "3306")),
             user=os.getenv("DB_USERNAME", "root"),
             password=os.getenv("DB_PASSWORD", ""),
             database=os.getenv("DB_DATABASE", "laravel"),
+            autocommit=True,
         )
-        self.cnx.autocommit = True
+        # no máximo pool_size conexões em uso; as livres ficam em _idle
+        self._slots = threading.BoundedSemaphore(max(1, int(pool_size)))
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._open: List = []   # todas as conexões abertas pelo pool, para o close
+        self._open_lock = threading.Lock()
+        self.batch_rows = batch_rows
+        self.batch_ms = batch_ms
+        self.page_rows = page_rows
+        self._buf_lock = threading.RLock()
+        self._pending_faces: List[tuple] = []
+        self._pending_hits: List[tuple] = []
+        self._pending_segments: List[tuple] = []
+        self._pending_since: Optional[float] = None
+        self._has_hits_table = True
+        self._has_segments_table = True
+
+    # --- conexões ---
+    def _connect(self):
+        return mysql.connector.connect(**self._config)
+
+    def _discard(self, cnx) -> None:
+        with self._open_lock:
+            if cnx in self._open:
+                self._open.remove(cnx)
+        try:
+            cnx.close()
+        except mysql.connector.Error:
+            pass  # já caiu
+
+    def _checkout(self):
+        while True:
+            try:
+                cnx = self._idle.get_nowait()
+            except queue.Empty:
+                cnx = self._connect()
+                with self._open_lock:
+                    self._open.append(cnx)
+                return cnx
+            if cnx.is_connected():
+                return cnx
+            self._discard(cnx)
+
+    @contextmanager
+    def _connection(self):
+        with self._slots:
+            cnx = self._checkout()
+            try:
+                yield cnx
+            except _RETRYABLE:
+                self._discard(cnx)  # conexão quebrada não volta para o pool
+                raise
+            except BaseException:
+                self._idle.put(cnx)
+                raise
+            else:
+                self._idle.put(cnx)
+
+    def _run(self, fn):
+        """Executa fn(cnx) com uma conexão do pool, repetindo uma vez se a conexão cair."""
+        for attempt in (1, 2):
+            try:
+                with self._connection() as cnx:
+                    return fn(cnx)
+            except _RETRYABLE as e:
+                if attempt == 2:
+                    raise
+                logger.warning(f"Conexão MySQL perdida ({e}); repetindo numa conexão nova")
+
+    def _query(self, sql: str, params: tuple = (), prepared: bool = False) -> List[tuple]:
+        def run(cnx):
+            cur = cnx.cursor(prepared=prepared)
+            try:
+                cur.execute(sql, params)
+                return cur.fetchall()
+            finally:
+                cur.close()
+        return self._run(run)
+
+    def _execute(self, sql: str, params: tuple = ()) -> int:
+        """Comando único (autocommit) com prepared statement; retorna o lastrowid."""
+        def run(cnx):
+            cur = cnx.cursor(prepared=True)
+            try:
+                cur.execute(sql, params)
+                return cur.lastrowid
+            finally:
+                cur.close()
+        return self._run(run)
+
+    def _transaction(self, fn) -> None:
+        """Executa fn(cur) numa transação; rollback em erro."""
+        def run(cnx):
+            cnx.start_transaction()
+            cur = cnx.cursor()
+            try:
+                fn(cur)
+                cnx.commit()
+            except Exception:
+                cnx.rollback()
+                raise
+            finally:
+                cur.close()
+        self._run(run)
+
+    def close(self) -> None:
+        self.flush()
+        with self._open_lock:
+            conns, self._open = self._open, []
+        for cnx in conns:
+            try:
+                cnx.close()
+            except mysql.connector.Error:
+                pass
+        self._idle = queue.LifoQueue()
 
     # --- people ---
     def add_person(self, name: Optional[str]) -> int:
-        cur = self.cnx.cursor()
-        cur.execute("INSERT INTO people (name, created_at, updated_at) VALUES (%s, NOW(), NOW())", (name,))
-        pid = cur.lastrowid
-        cur.close()
+        pid = self._execute("INSERT INTO people (name, created_at, updated_at) VALUES (%s, NOW(), NOW())", (name,))
         return int(pid)
 
     def person_name(self, person_id: int) -> Optional[str]:
-        cur = self.cnx.cursor()
-        cur.execute("SELECT name FROM people WHERE id=%s", (person_id,))
-        row = cur.fetchone()
-        cur.close()
-        return row[0] if row else None
+        rows = self._query("SELECT name FROM people WHERE id=%s", (person_id,), prepared=True)
+        return rows[0][0] if rows else None
 
     def update_person_name(self, person_id: int, name: str) -> None:
-        cur = self.cnx.cursor()
-        cur.execute("UPDATE people SET name=%s, updated_at=NOW() WHERE id=%s", (name, person_id))
-        cur.close()
+        self._execute("UPDATE people SET name=%s, updated_at=NOW() WHERE id=%s", (name, person_id))
+
+    def load_person_names(self) -> Dict[int, Optional[str]]:
+        rows = self._query("SELECT id, name FROM people")
+        return {int(pid): name for (pid, name) in rows}
+
+    def reassign_person(self, src_id: int, dst_id: int) -> None:
+        """Funde a pessoa `src_id` em `dst_id` (faces, hits e segmentos passam para dst) e remove src."""
+        self.flush()
+
+        def run(cur):
+            cur.execute("UPDATE faces SET person_id=%s, updated_at=NOW() WHERE person_id=%s", (dst_id, src_id))
+            for table in ("video_hits", "video_segments"):
+                try:
+                    cur.execute(f"UPDATE {table} SET person_id=%s WHERE person_id=%s", (dst_id, src_id))
+                except mysql.connector.errors.ProgrammingError as e:
+                    if not _missing_table(e):
+                        raise
+            cur.execute("DELETE FROM people WHERE id=%s", (src_id,))
+        self._transaction(run)
+
+    # --- buffer de escrita ---
+    def _enqueue(self, buf: List[tuple], row: tuple) -> None:
+        with self._buf_lock:
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            buf.append(row)
+            self.maybe_flush()
+
+    def maybe_flush(self) -> None:
+        """Grava o buffer se ele já passou do tamanho ou da idade configurados."""
+        with self._buf_lock:
+            if self._pending_since is None:
+                return
+            pending = len(self._pending_faces) + len(self._pending_hits) + len(self._pending_segments)
+            if (pending >= self.batch_rows
+                    or (time.monotonic() - self._pending_since) * 1000.0 >= self.batch_ms):
+                self.flush()
+
+    def flush(self) -> None:
+        """Grava faces, video_hits e video_segments pendentes numa única transação."""
+        with self._buf_lock:
+            if self._pending_since is None:
+                return
+            faces, hits, segments = self._pending_faces, self._pending_hits, self._pending_segments
+            self._pending_faces, self._pending_hits, self._pending_segments = [], [], []
+            self._pending_since = None
+
+            def run(cur):
+                if faces:
+                    cur.executemany(_INSERT_FACE, faces)
+                if hits and self._has_hits_table:
+                    try:
+                        cur.executemany(_INSERT_HIT, hits)
+                    except mysql.connector.errors.ProgrammingError as e:
+                        if not _missing_table(e):
+                            raise
+                        self._has_hits_table = False  # tabela video_hits não existe
+                if segments and self._has_segments_table:
+                    try:
+                        cur.executemany(_INSERT_SEGMENT, segments)
+                    except mysql.connector.errors.ProgrammingError as e:
+                        if not _missing_table(e):
+                            raise
+                        self._has_segments_table = False  # tabela video_segments não existe
+            try:
+                with metrics.timer("db_write"):
+                    self._transaction(run)
+            except Exception:
+                # devolve ao buffer para a próxima tentativa
+                self._pending_faces[:0], self._pending_hits[:0], self._pending_segments[:0] = faces, hits, segments
+                self._pending_since = self._pending_since or time.monotonic()
+                raise
+            metrics.inc("db_rows_written", len(faces) + len(hits) + len(segments))
 
     # --- faces (embeddings) ---
-    def add_embedding(self, person_id: int, encoding: np.ndarray, source: Optional[str]) -> int:
-        cur = self.cnx.cursor()
-        cur.execute(
-            "INSERT INTO faces (person_id, encoding, source, created_at, updated_at) VALUES (%s, %s, %s, NOW(), NOW())",
-            (person_id, enc_to_blob(encoding), source)
-        )
-        fid = cur.lastrowid
-        cur.close()
-        return int(fid)
+    def add_embedding(self, person_id: int, encoding: np.ndarray, source: Optional[str]) -> Optional[int]:
+        """Enfileira o encoding; o id só existe depois do flush, então retorna None."""
+        self._enqueue(self._pending_faces, (int(person_id), enc_to_blob(encoding), source))
+        return None
 
     def load_all_encodings(self) -> Tuple[np.ndarray, List[int]]:
-        cur = self.cnx.cursor()
-        cur.execute("SELECT encoding, person_id FROM faces")
-        rows = cur.fetchall()
-        cur.close()
-        if not rows:
-            return np.empty((0, 128), dtype=np.float32), []
-        encs = np.vstack([blob_to_enc(b) for (b, _) in rows])
-        pids = [int(pid) for (_, pid) in rows]
-        return encs, pids
-
-    # --- video hits (opcional) ---
+        _, encs, pids = self.load_face_rows()
+        return encs, pids.tolist()
+
+    def load_face_rows(self, after_id: int = 0) -> FaceRows:
+        """(face_ids, encodings (N, 128), person_ids) das linhas de faces com id > `after_id`, em ordem de id."""
+        self.flush()
+
+        def run(cnx):
+            head = cnx.cursor(buffered=True)
+            head.execute("SELECT COUNT(*), MAX(id) FROM faces WHERE id > %s", (int(after_id),))
+            total, max_id = head.fetchone()
+            head.close()
+            cur = cnx.cursor()  # sem buffer: fetchmany traz do servidor uma página por vez
+            try:
+                cur.execute(
+                    "SELECT id, encoding, person_id FROM faces WHERE id > %s AND id <= %s ORDER BY id",
+                    (int(after_id), int(max_id or 0))
+                )
+                return read_face_pages(cur, int(total), self.page_rows)
+            finally:
+                cur.close()
+        return self._run(run)
+
+    def replace_faces(self, delete_ids: Sequence[int], inserts: Sequence[Tuple[int, np.ndarray, Optional[str]]]) -> None:
+        """Remove `delete_ids` e insere `inserts` (person_id, encoding, source) numa única transação."""
+        self.flush()
+
+        def run(cur):
+            cur.executemany("DELETE FROM faces WHERE id=%s", [(int(i),) for i in delete_ids])
+            cur.executemany(_INSERT_FACE, [(int(pid), enc_to_blob(enc), source) for (pid, enc, source) in inserts])
+        self._transaction(run)
+
+    def storage_bytes(self) -> int:
+        self.flush()
+        ((size,),) = self._query(
+            "SELECT COALESCE(SUM(data_length + index_length), 0) FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name IN ('faces', 'people', 'video_hits', 'video_segments')"
+        )
+        return int(size)
+
+    def faces_watermark(self) -> Tuple[int, int]:
+        """(COUNT, MAX(id)) da tabela faces; identifica o estado salvo de um índice."""
+        self.flush()
+        ((count, max_id),) = self._query("SELECT COUNT(*), MAX(id) FROM faces")
+        return int(count), int(max_id or 0)
+
+    # --- video hits / segmentos (opcionais) ---
+    def delete_video_hits(self, media_id: int, start_s: float = 0.0, end_s: Optional[float] = None) -> None:
+        """Apaga hits e segmentos de um trecho do vídeo (ex.: antes de reprocessar um pedaço que falhou)."""
+        self.flush()
+        if self._has_hits_table:
+            try:
+                if end_s is None:
+                    self._execute(
+                        "DELETE FROM video_hits WHERE media_id=%s AND timestamp_s >= %s", (media_id, float(start_s))
+                    )
+                else:
+                    self._execute(
+                        "DELETE FROM video_hits WHERE media_id=%s AND timestamp_s >= %s AND timestamp_s < %s",
+                        (media_id, float(start_s), float(end_s))
+                    )
+            except mysql.connector.errors.ProgrammingError as e:
+                if not _missing_table(e):
+                    raise
+                self._has_hits_table = False  # tabela video_hits não existe
+        if not self._has_segments_table:
+            return
+        try:
+            if end_s is None:
+                self._execute("DELETE FROM video_segments WHERE media_id=%s AND start_s >= %s", (media_id, float(start_s)))
+            else:
+                self._execute(
+                    "DELETE FROM video_segments WHERE media_id=%s AND start_s >= %s AND start_s < %s",
+                    (media_id, float(start_s), float(end_s))
+                )
+        except mysql.connector.errors.ProgrammingError as e:
+            if not _missing_table(e):
+                raise
+            self._has_segments_table = False  # tabela video_segments não existe
+
     def record_video_hit(
         self,
         media_id: int,
@@ -82,13 +355,25 @@ class FaceRepo:
         bbox: Tuple[int, int, int, int],  # (top, right, bottom, left)
         distance: float,
     ) -> None:
-        # Assumindo tabela video_hits como sugeri
-        cur = self.cnx.cursor()
         t, r, b, l = map(int, bbox)
-        cur.execute(
-            """INSERT INTO video_hits
-               (media_id, person_id, frame_index, timestamp_s, left, top, right, bottom, distance, created_at, updated_at)
-               VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s, NOW(), NOW())""",
-            (media_id, person_id, frame_index, float(timestamp_s), l, t, r, b, float(distance))
-        )
-        cur.close()
+        self._enqueue(self._pending_hits, (
+            int(media_id), int(person_id), int(frame_index), float(timestamp_s), l, t, r, b, float(distance)
+        ))
+
+    def record_video_segment(
+        self,
+        media_id: int,
+        person_id: int,
+        start_frame: int,
+        end_frame: int,
+        start_s: float,
+        end_s: float,
+        hits: int,
+        best_distance: float,
+        bbox: Tuple[int, int, int, int],  # (top, right, bottom, left) do frame com a menor distância
+    ) -> None:
+        t, r, b, l = map(int, bbox)
+        self._enqueue(self._pending_segments, (
+            int(media_id), int(person_id), int(start_frame), int(end_frame), float(start_s), float(end_s),
+            int(hits), float(best_distance), l, t, r, b
+        ))
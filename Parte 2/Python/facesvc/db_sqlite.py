@@ -1,41 +1,96 @@
 # facesvc/db_sqlite.py
 from __future__ import annotations
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 import os
 import sqlite3
+import threading
+import time
 import numpy as np
+from loguru import logger
 
-def enc_to_blob(encoding: np.ndarray) -> bytes:
-    enc32 = encoding.astype(np.float32, copy=False)
-    return enc32.tobytes(order="C")
+from .metrics import metrics
+from .repo import FaceRows, blob_to_enc, enc_to_blob, read_face_pages  # noqa: F401  (blob_to_enc reexportado)
+
+
+def _missing_table(e: sqlite3.OperationalError) -> bool:
+    """Só "no such table" marca a tabela opcional como ausente; travas e erros de disco sobem."""
+    return "no such table" in str(e).lower()
 
-def blob_to_enc(blob: bytes) -> np.ndarray:
-    arr = np.frombuffer(blob, dtype=np.float32)
-    return arr.reshape((128,))
 
 class FaceRepo:
     """
     Repositório usando as tabelas do Laravel em SQLite:
       - people (id, name, created_at, updated_at)
       - faces  (id, person_id, encoding BLOB, source, created_at, updated_at)
-      - video_hits (opcional)
+      - video_hits, video_segments (opcionais)
+
+    O SQLite aceita um escritor por vez, então todas as escritas passam por
+    uma única conexão (`_writer`, protegida por lock), enquanto cada thread
+    lê pela sua própria conexão (`conn`); em WAL as leituras não esperam as
+    escritas. `data_version` é lido na conexão de escrita: só muda quando
+    outro processo (ex.: Laravel) grava no arquivo.
+
+    Escritas em faces, video_hits e video_segments são write-behind: ficam num buffer e vão
+    para o banco num único executemany + commit quando o buffer passa de
+    `batch_rows` linhas ou tem mais de `batch_ms` ms, e sempre em `flush()`
+    (fim de job, erro, antes de qualquer leitura dessas tabelas). people é
+    gravada na hora, para que o id da pessoa nova já exista quando as faces
+    dela forem gravadas. `batch_rows=1` volta ao comportamento de um commit por linha.
     """
-    def __init__(self, db_path):
-        print(f"SQLite path: {db_path}")
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.conn.execute("PRAGMA journal_mode=WAL;")
-        self.conn.execute("PRAGMA synchronous=NORMAL;")
+    def __init__(self, db_path, batch_rows: int = 500, batch_ms: float = 200.0, page_rows: int = 10_000):
+        logger.debug("SQLite aberto em {}", db_path)
+        self.db_path = db_path
+        self._local = threading.local()
+        self._all_conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        self._writer = self._connect()
+        self._write_lock = threading.RLock()
+        self.batch_rows = batch_rows
+        self.batch_ms = batch_ms
+        self.page_rows = page_rows
+        self._pending_faces: List[tuple] = []
+        self._pending_hits: List[tuple] = []
+        self._pending_segments: List[tuple] = []
+        self._pending_since: Optional[float] = None
+        self._has_hits_table = True
+        self._has_segments_table = True
+
+    # --- conexões ---
+    def _connect(self) -> sqlite3.Connection:
+        # check_same_thread=False só porque close() fecha as conexões de todas as threads
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30.0)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        with self._conns_lock:
+            self._all_conns.append(conn)
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Conexão de leitura desta thread (criada no primeiro uso)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def close(self) -> None:
+        self.flush()
+        with self._conns_lock:
+            conns, self._all_conns = self._all_conns, []
+        for conn in conns:
+            conn.close()
 
     # --- people ---
     def add_person(self, name: Optional[str]) -> int:
-        cur = self.conn.cursor()
-        cur.execute(
-            "INSERT INTO people (name, created_at, updated_at) VALUES (?, datetime('now'), datetime('now'))",
-            (name,)
-        )
-        self.conn.commit()
-        pid = cur.lastrowid
-        cur.close()
+        with self._write_lock:
+            cur = self._writer.cursor()
+            cur.execute(
+                "INSERT INTO people (name, created_at, updated_at) VALUES (?, datetime('now'), datetime('now'))",
+                (name,)
+            )
+            self._writer.commit()
+            pid = cur.lastrowid
+            cur.close()
         return int(pid)
 
     def person_name(self, person_id: int) -> Optional[str]:
@@ -43,34 +98,176 @@ class FaceRepo:
         return row[0] if row else None
 
     def update_person_name(self, person_id: int, name: str) -> None:
-        self.conn.execute(
-            "UPDATE people SET name=?, updated_at=datetime('now') WHERE id=?",
-            (name, person_id)
-        )
-        self.conn.commit()
+        with self._write_lock:
+            self._writer.execute(
+                "UPDATE people SET name=?, updated_at=datetime('now') WHERE id=?",
+                (name, person_id)
+            )
+            self._writer.commit()
+
+    def load_person_names(self) -> Dict[int, Optional[str]]:
+        rows = self.conn.execute("SELECT id, name FROM people").fetchall()
+        return {int(pid): name for (pid, name) in rows}
+
+    def reassign_person(self, src_id: int, dst_id: int) -> None:
+        """Funde a pessoa `src_id` em `dst_id` (faces, hits e segmentos passam para dst) e remove src."""
+        with self._write_lock:
+            self.flush()
+            with self._writer:
+                self._writer.execute(
+                    "UPDATE faces SET person_id=?, updated_at=datetime('now') WHERE person_id=?", (dst_id, src_id)
+                )
+                for table in ("video_hits", "video_segments"):
+                    try:
+                        self._writer.execute(f"UPDATE {table} SET person_id=? WHERE person_id=?", (dst_id, src_id))
+                    except sqlite3.OperationalError as e:
+                        if not _missing_table(e):
+                            raise
+                self._writer.execute("DELETE FROM people WHERE id=?", (src_id,))
+
+    def data_version(self) -> int:
+        # Muda sempre que OUTRA conexão (ex.: Laravel) faz commit no arquivo
+        with self._write_lock:
+            return int(self._writer.execute("PRAGMA data_version").fetchone()[0])
+
+    # --- buffer de escrita ---
+    def _enqueue(self, buf: List[tuple], row: tuple) -> None:
+        with self._write_lock:
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            buf.append(row)
+            self.maybe_flush()
+
+    def maybe_flush(self) -> None:
+        """Grava o buffer se ele já passou do tamanho ou da idade configurados."""
+        with self._write_lock:
+            if self._pending_since is None:
+                return
+            pending = len(self._pending_faces) + len(self._pending_hits) + len(self._pending_segments)
+            if (pending >= self.batch_rows
+                    or (time.monotonic() - self._pending_since) * 1000.0 >= self.batch_ms):
+                self.flush()
+
+    def flush(self) -> None:
+        """Grava faces, video_hits e video_segments pendentes numa única transação."""
+        with self._write_lock:
+            if self._pending_since is None:
+                return
+            faces, hits, segments = self._pending_faces, self._pending_hits, self._pending_segments
+            self._pending_faces, self._pending_hits, self._pending_segments = [], [], []
+            self._pending_since = None
+            try:
+                with metrics.timer("db_write"), self._writer:
+                    if faces:
+                        self._writer.executemany(
+                            "INSERT INTO faces (person_id, encoding, source, created_at, updated_at) "
+                            "VALUES (?, ?, ?, datetime('now'), datetime('now'))",
+                            faces
+                        )
+                    if hits and self._has_hits_table:
+                        try:
+                            self._writer.executemany(
+                                "INSERT INTO video_hits (media_id, person_id, frame_index, timestamp_s, left, top, right, bottom, distance, created_at, updated_at) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))",
+                                hits
+                            )
+                        except sqlite3.OperationalError as e:
+                            if not _missing_table(e):
+                                raise
+                            self._has_hits_table = False  # tabela não existe — ignore
+                    if segments and self._has_segments_table:
+                        try:
+                            self._writer.executemany(
+                                "INSERT INTO video_segments (media_id, person_id, start_frame, end_frame, start_s, end_s, hits, best_distance, "
+                                "left, top, right, bottom, created_at, updated_at) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))",
+                                segments
+                            )
+                        except sqlite3.OperationalError as e:
+                            if not _missing_table(e):
+                                raise
+                            self._has_segments_table = False
+            except Exception:
+                # devolve ao buffer para a próxima tentativa
+                self._pending_faces[:0], self._pending_hits[:0], self._pending_segments[:0] = faces, hits, segments
+                self._pending_since = self._pending_since or time.monotonic()
+                raise
+            metrics.inc("db_rows_written", len(faces) + len(hits) + len(segments))
 
     # --- faces ---
-    def add_embedding(self, person_id: int, encoding: np.ndarray, source: Optional[str]) -> int:
-        cur = self.conn.cursor()
-        cur.execute(
-            "INSERT INTO faces (person_id, encoding, source, created_at, updated_at) "
-            "VALUES (?, ?, ?, datetime('now'), datetime('now'))",
-            (person_id, enc_to_blob(encoding), source)
-        )
-        self.conn.commit()
-        fid = cur.lastrowid
-        cur.close()
-        return int(fid)
+    def add_embedding(self, person_id: int, encoding: np.ndarray, source: Optional[str]) -> Optional[int]:
+        """Enfileira o encoding; o id só existe depois do flush, então retorna None."""
+        self._enqueue(self._pending_faces, (int(person_id), enc_to_blob(encoding), source))
+        return None
 
     def load_all_encodings(self) -> Tuple[np.ndarray, List[int]]:
-        rows = self.conn.execute("SELECT encoding, person_id FROM faces").fetchall()
-        if not rows:
-            return np.empty((0, 128), dtype=np.float32), []
-        encs = np.vstack([blob_to_enc(b) for (b, _) in rows])
-        pids = [int(pid) for (_, pid) in rows]
-        return encs, pids
-
-    # --- video_hits (opcional) ---
+        _, encs, pids = self.load_face_rows()
+        return encs, pids.tolist()
+
+    def load_face_rows(self, after_id: int = 0) -> FaceRows:
+        """(face_ids, encodings (N, 128), person_ids) das linhas de faces com id > `after_id`, em ordem de id."""
+        self.flush()
+        conn = self.conn
+        total, max_id = conn.execute("SELECT COUNT(*), MAX(id) FROM faces WHERE id > ?", (int(after_id),)).fetchone()
+        cur = conn.execute(
+            "SELECT id, encoding, person_id FROM faces WHERE id > ? AND id <= ? ORDER BY id",
+            (int(after_id), int(max_id or 0))
+        )
+        try:
+            return read_face_pages(cur, int(total), self.page_rows)
+        finally:
+            cur.close()
+
+    def replace_faces(self, delete_ids: Sequence[int], inserts: Sequence[Tuple[int, np.ndarray, Optional[str]]]) -> None:
+        """Remove `delete_ids` e insere `inserts` (person_id, encoding, source) numa única transação."""
+        with self._write_lock:
+            self.flush()
+            with self._writer:
+                self._writer.executemany("DELETE FROM faces WHERE id=?", [(int(i),) for i in delete_ids])
+                self._writer.executemany(
+                    "INSERT INTO faces (person_id, encoding, source, created_at, updated_at) "
+                    "VALUES (?, ?, ?, datetime('now'), datetime('now'))",
+                    [(int(pid), enc_to_blob(enc), source) for (pid, enc, source) in inserts]
+                )
+
+    def storage_bytes(self) -> int:
+        self.flush()
+        page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        return int(page_count) * int(page_size)
+
+    def vacuum(self) -> None:
+        with self._write_lock:
+            self.flush()
+            self._writer.execute("VACUUM")
+
+    def faces_watermark(self) -> Tuple[int, int]:
+        """(COUNT, MAX(id)) da tabela faces; identifica o estado salvo de um índice."""
+        self.flush()
+        count, max_id = self.conn.execute("SELECT COUNT(*), MAX(id) FROM faces").fetchone()
+        return int(count), int(max_id or 0)
+
+    # --- video_hits / video_segments (opcionais) ---
+    def delete_video_hits(self, media_id: int, start_s: float = 0.0, end_s: Optional[float] = None) -> None:
+        """Apaga hits e segmentos de um trecho do vídeo (ex.: antes de reprocessar um pedaço que falhou)."""
+        with self._write_lock:
+            self.flush()
+            for table, column in (("video_hits", "timestamp_s"), ("video_segments", "start_s")):
+                try:
+                    with self._writer:
+                        if end_s is None:
+                            self._writer.execute(
+                                f"DELETE FROM {table} WHERE media_id=? AND {column} >= ?", (media_id, float(start_s))
+                            )
+                        else:
+                            self._writer.execute(
+                                f"DELETE FROM {table} WHERE media_id=? AND {column} >= ? AND {column} < ?",
+                                (media_id, float(start_s), float(end_s))
+                            )
+                except sqlite3.OperationalError as e:
+                    if not _missing_table(e):
+                        raise
+
     def record_video_hit(
         self,
         media_id: int,
@@ -80,15 +277,25 @@ class FaceRepo:
         bbox: Tuple[int, int, int, int],  # (top, right, bottom, left)
         distance: float,
     ) -> None:
-        # Só insere se a tabela existir
-        try:
-            t, r, b, l = map(int, bbox)
-            self.conn.execute(
-                "INSERT INTO video_hits (media_id, person_id, frame_index, timestamp_s, left, top, right, bottom, distance, created_at, updated_at) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))",
-                (media_id, person_id, frame_index, float(timestamp_s), l, t, r, b, float(distance))
-            )
-            self.conn.commit()
-        except sqlite3.OperationalError:
-            # tabela não existe — ignore
-            pass
+        t, r, b, l = map(int, bbox)
+        self._enqueue(self._pending_hits, (
+            int(media_id), int(person_id), int(frame_index), float(timestamp_s), l, t, r, b, float(distance)
+        ))
+
+    def record_video_segment(
+        self,
+        media_id: int,
+        person_id: int,
+        start_frame: int,
+        end_frame: int,
+        start_s: float,
+        end_s: float,
+        hits: int,
+        best_distance: float,
+        bbox: Tuple[int, int, int, int],  # (top, right, bottom, left) do frame com a menor distância
+    ) -> None:
+        t, r, b, l = map(int, bbox)
+        self._enqueue(self._pending_segments, (
+            int(media_id), int(person_id), int(start_frame), int(end_frame), float(start_s), float(end_s),
+            int(hits), float(best_distance), l, t, r, b
+        ))
@@ -0,0 +1,251 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple
+import time
+import numpy as np
+import cv2
+from loguru import logger
+
+from .config import RecognizerConfig
+
+Location = Tuple[int, int, int, int]  # (top, right, bottom, left)
+
+
+def _fr():
+    """
+    face_recognition carrega os modelos do dlib já no import; fica para o
+    primeiro uso, e quem só mexe no banco (manage.py, merge de pedaços) não
+    paga esse custo.
+    """
+    import face_recognition
+    return face_recognition
+
+
+def detection_scale(shape: Sequence[int], cfg: RecognizerConfig) -> float:
+    """
+    Fator (<= 1) aplicado à imagem antes do detector: `cfg.detect_scale` fixo
+    e/ou o necessário para o maior lado caber em `cfg.detect_max_side`.
+    """
+    scale = float(cfg.detect_scale or 1.0)
+    if cfg.detect_max_side:
+        scale = min(scale, cfg.detect_max_side / float(max(shape[0], shape[1])))
+    return min(scale, 1.0)
+
+
+def detect_faces(image_rgb: np.ndarray, cfg: RecognizerConfig) -> List[Location]:
+    """
+    Roda o detector (HOG/CNN) numa cópia reduzida da imagem e devolve as
+    caixas já na resolução original, prontas para o encoding.
+    """
+    scale = detection_scale(image_rgb.shape, cfg)
+    if scale >= 1.0:
+        return _fr().face_locations(image_rgb, number_of_times_to_upsample=cfg.upsample, model=cfg.model)
+
+    small = cv2.resize(image_rgb, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    locations = _fr().face_locations(small, number_of_times_to_upsample=cfg.upsample, model=cfg.model)
+    return scale_locations(locations, 1.0 / scale, image_rgb.shape)
+
+
+def detect_faces_batch(images_rgb: Sequence[np.ndarray], cfg: RecognizerConfig) -> List[List[Location]]:
+    """
+    Detecção de várias imagens do mesmo tamanho. Com o modelo CNN é uma única
+    inferência para o lote (`face_recognition.batch_face_locations`); o HOG
+    não tem modo em lote e detecta uma a uma. Caixas na resolução original.
+    """
+    if len(images_rgb) == 0:
+        return []
+    shape = images_rgb[0].shape
+    if any(img.shape != shape for img in images_rgb):
+        raise ValueError("detect_faces_batch: imagens do lote precisam ter o mesmo tamanho")
+    if cfg.model != "cnn" or len(images_rgb) == 1:
+        return [detect_faces(img, cfg) for img in images_rgb]
+
+    scale = detection_scale(shape, cfg)
+    if scale < 1.0:
+        images_rgb = [cv2.resize(img, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA) for img in images_rgb]
+    batches = _fr().batch_face_locations(
+        list(images_rgb), number_of_times_to_upsample=cfg.upsample, batch_size=len(images_rgb)
+    )
+    if scale < 1.0:
+        return [scale_locations(locations, 1.0 / scale, shape) for locations in batches]
+    return [list(locations) for locations in batches]
+
+
+def scale_locations(locations, factor: float, shape: Sequence[int]) -> List[Location]:
+    """Multiplica as caixas por `factor` e recorta nos limites da imagem (h, w)."""
+    h, w = int(shape[0]), int(shape[1])
+    out: List[Location] = []
+    for loc in locations:
+        if not (isinstance(loc, tuple) and len(loc) == 4):
+            out.append(loc)  # deixa a validação de formato para quem chamou
+            continue
+        t, r, b, l = loc
+        out.append((
+            max(0, int(round(t * factor))),
+            min(w, int(round(r * factor))),
+            min(h, int(round(b * factor))),
+            max(0, int(round(l * factor))),
+        ))
+    return out
+
+
+def encode_faces(image_rgb: np.ndarray, locations: Sequence[Location]) -> List[np.ndarray]:
+    """Encodings 128-d calculados sempre na imagem em resolução original."""
+    return _fr().face_encodings(image_rgb, known_face_locations=list(locations))
+
+
+def encode_faces_batch(images_rgb: Sequence[np.ndarray], locations: Sequence[Sequence[Location]]) -> List[List[np.ndarray]]:
+    """
+    Encodings dos rostos de várias imagens numa só chamada ao dlib
+    (`compute_face_descriptor` em lote). O lote usa funções internas do
+    face_recognition; se algo falhar (dlib sem lote, API interna mudou,
+    erro do dlib), cai no encoding imagem a imagem.
+    """
+    pairs = [(img, list(locs)) for img, locs in zip(images_rgb, locations) if locs]
+    if not pairs:
+        return [[] for _ in locations]
+    try:
+        import dlib
+        from face_recognition import api
+        shapes = []
+        for img, locs in pairs:
+            dets = dlib.full_object_detections()
+            dets.extend(api._raw_face_landmarks(img, locs, model="small"))
+            shapes.append(dets)
+        descriptors = iter(api.face_encoder.compute_face_descriptor([img for img, _ in pairs], shapes, 1))
+        return [[np.array(d) for d in next(descriptors)] if locs else [] for locs in locations]
+    except Exception as e:
+        logger.debug("Encoding em lote indisponível ({}: {}); codificando imagem a imagem", type(e).__name__, e)
+        return [encode_faces(img, locs) if locs else [] for img, locs in zip(images_rgb, locations)]
+
+
+def _add_time(timings: Optional[Dict[str, float]], stage: str, t0: float) -> None:
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - t0)
+
+
+def analyze_frame(
+    frame_bgr: np.ndarray, cfg: RecognizerConfig, timings: Optional[Dict[str, float]] = None,
+) -> Tuple[List[Location], List[np.ndarray]]:
+    """
+    Detecção + encoding de todos os rostos de um frame BGR (OpenCV), sem
+    tocar no banco. Usado pelos processos do pipeline paralelo. Se `timings`
+    for passado, recebe os segundos gastos em "detect" e "encode".
+    """
+    if frame_bgr is None or frame_bgr.size == 0 or frame_bgr.ndim != 3 or frame_bgr.shape[2] != 3:
+        return [], []
+    frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+    if frame_rgb.dtype != np.uint8:
+        frame_rgb = frame_rgb.astype(np.uint8)
+    t0 = time.perf_counter()
+    locations = [loc for loc in detect_faces(frame_rgb, cfg) if isinstance(loc, tuple) and len(loc) == 4]
+    _add_time(timings, "detect", t0)
+    if not locations:
+        return [], []
+    t0 = time.perf_counter()
+    encodings = encode_faces(frame_rgb, locations)
+    _add_time(timings, "encode", t0)
+    return locations, encodings
+
+
+def load_image(image_file: str, label: str = "") -> np.ndarray:
+    """Carrega uma foto como RGB; levanta RuntimeError se não for uma imagem de 3 canais."""
+    label = label or image_file
+    image = _fr().load_image_file(image_file)
+
+    # Verificar se a imagem foi carregada corretamente
+    if image is None or image.size == 0:
+        raise RuntimeError(f"Imagem não pôde ser carregada: {label}")
+
+    # Garantir que a imagem está no formato correto (RGB)
+    if len(image.shape) != 3 or image.shape[2] != 3:
+        raise RuntimeError(f"Imagem deve ser RGB com 3 canais: {label}")
+    return image
+
+
+def analyze_image(
+    image_file: str, cfg: RecognizerConfig, label: str = "", timings: Optional[Dict[str, float]] = None,
+) -> Tuple[List[Location], List[np.ndarray]]:
+    """
+    Carrega uma foto e devolve (localizações, encodings) sem tocar no banco.
+    Roda no processo do worker ou num processo do pool de fotos; `timings`
+    recebe os segundos de "decode", "detect" e "encode".
+    """
+    label = label or image_file
+    t0 = time.perf_counter()
+    image = load_image(image_file, label)
+    _add_time(timings, "decode", t0)
+
+    try:
+        logger.debug("Processando imagem: shape={}, dtype={}", image.shape, image.dtype)
+        logger.debug("Configuração: model={}, upsample={}", cfg.model, cfg.upsample)
+
+        if cfg.model not in ["hog", "cnn"]:
+            raise ValueError(f"Modelo inválido: {cfg.model}. Use 'hog' ou 'cnn'")
+        if not isinstance(cfg.upsample, int) or cfg.upsample < 1:
+            raise ValueError(f"Upsample inválido: {cfg.upsample}. Deve ser um inteiro >= 1")
+
+        # Garantir que a imagem está no formato correto para o dlib
+        if image.dtype != np.uint8:
+            image = image.astype(np.uint8)
+
+        t0 = time.perf_counter()
+        face_locations = detect_faces(image, cfg)
+        _add_time(timings, "detect", t0)
+        logger.debug("Faces encontradas: {}", len(face_locations))
+        if not face_locations:
+            logger.info(f"Nenhuma face encontrada na imagem {label}")
+            return [], []
+
+        valid_locations = []
+        for i, loc in enumerate(face_locations):
+            if isinstance(loc, tuple) and len(loc) == 4:
+                valid_locations.append(loc)
+            else:
+                logger.warning(f"Formato inválido de localização da face {i}: {loc}")
+        if not valid_locations:
+            logger.info(f"Nenhuma localização válida de face na imagem {label}")
+            return [], []
+
+        t0 = time.perf_counter()
+        encodings = encode_faces(image, valid_locations)
+        _add_time(timings, "encode", t0)
+        logger.debug("Encodings gerados: {}", len(encodings))
+        return valid_locations, encodings
+
+    except Exception as e:
+        logger.error(f"Erro ao processar faces na imagem {label}: {str(e)}")
+        logger.error(f"Tipo de erro: {type(e).__name__}")
+        raise RuntimeError(f"Erro ao processar faces na imagem {label}: {str(e)}")
+
+
+def analyze_images_batch(
+    images_rgb: Sequence[np.ndarray], cfg: RecognizerConfig, timings: Optional[Dict[str, float]] = None,
+) -> List[Tuple[List[Location], List[np.ndarray]]]:
+    """
+    Detecção + encoding de um lote de imagens RGB do mesmo tamanho (fotos
+    agrupadas por `ImageBatcher`). `timings` recebe "detect" e "encode" do lote.
+    """
+    t0 = time.perf_counter()
+    locations = [
+        [loc for loc in locs if isinstance(loc, tuple) and len(loc) == 4]
+        for locs in detect_faces_batch(images_rgb, cfg)
+    ]
+    _add_time(timings, "detect", t0)
+    t0 = time.perf_counter()
+    encodings = encode_faces_batch(images_rgb, locations)
+    _add_time(timings, "encode", t0)
+    return list(zip(locations, encodings))
+
+
+def warm_up(cfg: RecognizerConfig) -> float:
+    """
+    Importa face_recognition/dlib e roda uma detecção e um encoding num quadro
+    sintético, para que modelos e alocações iniciais estejam prontos antes do
+    primeiro job. Retorna os segundos gastos.
+    """
+    t0 = time.perf_counter()
+    image = np.zeros((160, 160, 3), dtype=np.uint8)
+    cv2.circle(image, (80, 80), 40, (200, 170, 150), -1)
+    detect_faces(image, cfg)
+    encode_faces(image, [(40, 120, 120, 40)])
+    return time.perf_counter() - t0
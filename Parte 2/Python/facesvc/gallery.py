@@ -0,0 +1,350 @@
+from __future__ import annotations
+from typing import Dict, Optional, Tuple
+import os
+import time
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava de publicador
+    fcntl = None
+from loguru import logger
+
+from .index import IVFIndex, VectorIndex, load_index, make_index
+
+
+class EmbeddingGallery:
+    """
+    Galeria de embeddings residente em memória.
+
+    Carrega uma única vez as tabelas faces/people e mantém:
+      - um índice vetorial (exato "flat" ou aproximado "ivf") com os encodings
+      - array paralelo com os person_id de cada linha do índice
+      - mapa person_id -> name
+
+    As escritas feitas pelo serviço passam por aqui (add_person, add_embedding,
+    update_person_name), de modo que a galeria é atualizada in-place. Alterações
+    feitas por fora (ex.: Laravel renomeando/excluindo pessoas) são detectadas
+    pelo contador de mudanças do banco (quando o repositório expõe
+    `data_version`) ou, em último caso, pelo TTL.
+
+    Com `index_path`, o índice é salvo em disco junto com a marca d'água da
+    tabela faces (COUNT, MAX(id)); na próxima inicialização ele é mapeado em
+    memória e só as linhas com id acima do MAX(id) salvo vêm do banco. Se
+    linhas antigas sumiram, tudo é recarregado, reaproveitando ao menos os
+    centróides do IVF (evita retreinar).
+
+    O mesmo arquivo serve de galeria compartilhada entre os workers da
+    máquina: um único processo (o que detém `{index_path}.lock`) publica
+    versões novas em `persist`; os outros notam a troca do arquivo em
+    `ensure_fresh` e passam a ler a versão nova mapeada em memória, sem cópia
+    (as páginas ficam no cache do SO, uma vez para todos). Cada processo só
+    guarda em RAM privada as linhas mais novas que o snapshot.
+    """
+
+    def __init__(
+        self,
+        repo,
+        ttl_s: float = 30.0,
+        dim: int = 128,
+        index_kind: str = "flat",
+        index_params: Optional[dict] = None,
+        index_path: Optional[str] = None,
+    ):
+        self.repo = repo
+        self.ttl_s = ttl_s
+        self.dim = dim
+        self.index_kind = index_kind
+        self.index_params = dict(index_params or {})
+        self.index_path = index_path
+        self.index: VectorIndex = make_index(index_kind, dim=dim, **self.index_params)
+        self._pids = np.empty((0,), dtype=np.int64)
+        self._names: Dict[int, Optional[str]] = {}
+        self._counts: Dict[int, int] = {}   # linhas (protótipos) por pessoa
+        self._loaded_at: Optional[float] = None
+        self._version = None
+        self._watermark: Optional[Tuple[int, int]] = None
+        self._saved_count: Optional[int] = None   # COUNT(faces) do índice gravado em disco
+        self._watermark_stale = False   # MAX(id) desatualizado por faces gravadas em lote
+        self._snapshot_seen = None       # (inode, mtime) do snapshot carregado/publicado por último
+        self._snapshot_version = 0
+        self._publisher_fd: Optional[int] = None
+
+    # --- leitura ---
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def person_ids(self) -> np.ndarray:
+        return self._pids[:len(self.index)]
+
+    def name_of(self, person_id: int) -> Optional[str]:
+        return self._names.get(int(person_id))
+
+    def prototype_count(self, person_id: int) -> int:
+        return self._counts.get(int(person_id), 0)
+
+    def search(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Melhor linha da galeria para cada uma das K queries (K, 128).
+        Retorna (person_ids, distâncias); person_id -1 quando a galeria está vazia.
+        """
+        rows, dists = self.index.search(queries)
+        pids = np.full(rows.shape, -1, dtype=np.int64)
+        found = rows >= 0
+        pids[found] = self._pids[rows[found]]
+        return pids, dists
+
+    # --- sincronização com o banco ---
+    def reload(self) -> None:
+        """
+        Recarrega faces + people. Com índice salvo, usa o snapshot publicado
+        (mapeado em memória) e busca no banco só as linhas mais novas que ele.
+        """
+        self.flush()  # as linhas ainda no buffer do repositório precisam estar no banco
+        version = self._data_version()
+        watermark = self._faces_watermark()
+        names = dict(self.repo.load_person_names())
+        first_load = self._loaded_at is None
+        saved = self._load_saved_index()
+        restored = None
+        if saved is not None and watermark is not None:
+            restored = self._restore_saved(saved, watermark, names)
+        if restored is not None:
+            self.index, self._pids, watermark = restored
+            self._saved_count = saved[2][0]
+        else:
+            ids, encs, pids = self.repo.load_face_rows()
+            self.index = self._new_index(saved[0] if saved is not None else self.index)
+            self.index.add(np.asarray(encs, dtype=np.float32).reshape((-1, self.dim)))
+            self._pids = np.asarray(pids, dtype=np.int64)
+            if watermark is not None:
+                # a partir das linhas lidas: nada inserido depois do COUNT fica de fora da marca
+                watermark = (len(ids), int(ids[-1]) if len(ids) else 0)
+            if saved is not None or first_load:
+                self._saved_count = None  # snapshot ausente ou desatualizado: publica de novo
+        uniq, counts = np.unique(self.person_ids, return_counts=True)
+        self._counts = dict(zip(uniq.tolist(), counts.tolist()))
+        self._names = names
+        self._watermark = watermark
+        self._watermark_stale = False
+        self._loaded_at = time.monotonic()
+        self._version = version
+        if self._saved_count is None:
+            self.persist()
+
+    def ensure_fresh(self) -> None:
+        """
+        Recarrega se nunca carregou, se outro processo publicou um snapshot
+        novo, se o banco mudou por fora ou se o TTL expirou.
+        """
+        if self._loaded_at is None:
+            self.reload()
+            return
+        if self._snapshot_changed():
+            self.reload()
+            return
+        version = self._data_version()
+        if version is not None and version != self._version:
+            self.reload()
+            return
+        if self.ttl_s and time.monotonic() - self._loaded_at > self.ttl_s:
+            self.reload()
+
+    def _data_version(self):
+        fn = getattr(self.repo, "data_version", None)
+        return fn() if fn is not None else None
+
+    def _faces_watermark(self) -> Optional[Tuple[int, int]]:
+        fn = getattr(self.repo, "faces_watermark", None)
+        return tuple(fn()) if fn is not None else None
+
+    # --- snapshot compartilhado ---
+    def _snapshot_stat(self):
+        try:
+            st = os.stat(self.index_path)
+        except (OSError, TypeError):
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _snapshot_changed(self) -> bool:
+        # um stat por chamada; os.replace do publicador troca o inode
+        return bool(self.index_path) and self._snapshot_stat() != self._snapshot_seen
+
+    def _is_publisher(self) -> bool:
+        """
+        Só um processo por arquivo de índice publica snapshots: quem pega a
+        trava exclusiva `{index_path}.lock`, mantida até o processo morrer
+        (aí outro assume no próximo persist). Sem fcntl, todos publicam.
+        """
+        if self._publisher_fd is not None or fcntl is None:
+            return True
+        fd = os.open(f"{self.index_path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._publisher_fd = fd
+        logger.info("Este processo publica a galeria compartilhada em {}", self.index_path)
+        return True
+
+    def close(self) -> None:
+        """Solta a trava de publicador (outro processo assume no próximo persist)."""
+        if self._publisher_fd is not None:
+            os.close(self._publisher_fd)
+            self._publisher_fd = None
+
+    # --- persistência do índice ---
+    def _new_index(self, previous: Optional[VectorIndex]) -> VectorIndex:
+        index = make_index(self.index_kind, dim=self.dim, **self.index_params)
+        if isinstance(index, IVFIndex) and isinstance(previous, IVFIndex) and previous.is_trained:
+            # mesma distribuição de rostos: reaproveita o quantizador já treinado
+            index._set_centroids(previous.centroids)
+        return index
+
+    def _load_saved_index(self):
+        if not self.index_path:
+            return None
+        for attempt in (1, 2):
+            stat = self._snapshot_stat()
+            if stat is None:
+                return None
+            try:
+                index, extra = load_index(self.index_path, **self.index_params)
+                break
+            except FileNotFoundError:
+                # o publicador trocou o snapshot entre a leitura do .npz e a do .npy
+                if attempt == 2:
+                    return None
+            except Exception as e:
+                logger.warning("Índice salvo ignorado ({}): {}", self.index_path, e)
+                return None
+        self._snapshot_seen = stat
+        if index.kind != self.index_kind or "pids" not in extra or "watermark" not in extra:
+            return None
+        self._snapshot_version = int(extra["version"]) if "version" in extra else 0
+        return index, np.asarray(extra["pids"], dtype=np.int64), tuple(int(x) for x in extra["watermark"])
+
+    def _restore_saved(self, saved, watermark: Tuple[int, int], names: Dict[int, Optional[str]]):
+        """
+        Índice salvo + só as linhas de faces gravadas depois dele (id maior que
+        o MAX(id) do save). None quando o banco perdeu linhas desde o save
+        (exclusões, compactação) ou quando o snapshot aponta para pessoas que
+        não existem mais (fundidas/excluídas): aí é preciso recarregar tudo.
+        """
+        index, pids, mark = saved
+        if mark[0] > watermark[0] or mark[1] > watermark[1] or (mark[0] == watermark[0]) != (mark[1] == watermark[1]):
+            return None
+        if len(pids) and not np.isin(pids, np.fromiter(names.keys(), dtype=np.int64, count=len(names))).all():
+            logger.info("Snapshot da galeria aponta para pessoas removidas; recarregando do banco")
+            return None
+        if mark == watermark:
+            logger.info(
+                "Índice da galeria carregado de {} (versão {}, {} linhas)", self.index_path, self._snapshot_version, len(index)
+            )
+            return index, pids, mark
+        ids, encs, new_pids = self.repo.load_face_rows(after_id=mark[1])
+        restored = (mark[0] + len(ids), int(ids[-1]) if len(ids) else mark[1])
+        # COUNT bate só se nenhuma linha antiga sumiu (e nada entrou durante a leitura)
+        if restored != self._faces_watermark():
+            return None
+        index.add(encs)
+        logger.info(
+            "Índice da galeria carregado de {} (versão {}, {} linhas) + {} novas do banco",
+            self.index_path, self._snapshot_version, mark[0], len(ids)
+        )
+        return index, np.concatenate([pids, new_pids]), restored
+
+    def flush(self) -> None:
+        """Grava no banco as escritas ainda no buffer do repositório (write-behind)."""
+        fn = getattr(self.repo, "flush", None)
+        if fn is not None:
+            fn()
+
+    def persist(self, min_change: float = 0.05) -> None:
+        """
+        Publica o índice (nova versão do snapshot) se ainda não há arquivo ou
+        se a galeria mudou `min_change` desde o último save. Só o processo
+        publicador grava; os demais pegam a versão nova em `ensure_fresh`.
+        """
+        if not self.index_path or self._watermark is None or not self._is_publisher():
+            return
+        self.flush()
+        if self._watermark_stale:
+            # ids das faces gravadas em lote: se o banco tem exatamente as nossas linhas, o MAX(id) dele é o nosso
+            db_mark = self._faces_watermark()
+            if db_mark is not None and db_mark[0] == self._watermark[0]:
+                self._watermark = db_mark
+                self._watermark_stale = False
+        count = self._watermark[0]
+        if self._saved_count is not None and abs(count - self._saved_count) < max(1.0, min_change * self._saved_count):
+            return
+        if self._watermark_stale:
+            # outros processos gravaram junto: a marca exata sai de uma recarga (snapshot + delta)
+            self.reload()
+            if self._saved_count is not None and self._watermark[0] == self._saved_count:
+                return
+        self.index.save(
+            self.index_path,
+            pids=self.person_ids,
+            watermark=np.array(self._watermark, dtype=np.int64),
+            version=np.array(self._snapshot_version + 1, dtype=np.int64),
+        )
+        self._snapshot_version += 1
+        self._snapshot_seen = self._snapshot_stat()
+        self._saved_count = self._watermark[0]
+
+    # --- escritas (repo + atualização in-place) ---
+    def add_person(self, name: Optional[str]) -> int:
+        pid = self.repo.add_person(name)
+        self._names[pid] = name
+        return pid
+
+    def update_person_name(self, person_id: int, name: str) -> None:
+        self.repo.update_person_name(person_id, name)
+        self._names[int(person_id)] = name
+
+    def merge_person(self, src_id: int, dst_id: int) -> None:
+        """Funde `src_id` em `dst_id` no banco e nas linhas da galeria."""
+        src_id, dst_id = int(src_id), int(dst_id)
+        self.repo.reassign_person(src_id, dst_id)
+        pids = self.person_ids
+        pids[pids == src_id] = dst_id
+        self._counts[dst_id] = self._counts.get(dst_id, 0) + self._counts.pop(src_id, 0)
+        self._names.pop(src_id, None)
+        # a marca d'água de faces não muda, mas os pids do índice salvo sim: regrava no próximo persist()
+        self._saved_count = None
+
+    def centroids(self, person_ids) -> Dict[int, np.ndarray]:
+        """Média dos encodings de cada pessoa pedida que tenha linhas na galeria."""
+        wanted = np.asarray(list(person_ids), dtype=np.int64)
+        pids = self.person_ids
+        mask = np.isin(pids, wanted)
+        if not mask.any():
+            return {}
+        vecs = self.index.vectors_in_row_order()[mask]
+        sel = pids[mask]
+        return {int(p): vecs[sel == p].mean(axis=0) for p in np.unique(sel)}
+
+    def add_embedding(self, person_id: int, encoding: np.ndarray, source: Optional[str]) -> Optional[int]:
+        fid = self.repo.add_embedding(person_id, encoding, source)
+        self._append(person_id, encoding)
+        if self._watermark is not None:
+            count, max_id = self._watermark
+            if fid is None:  # gravação em lote: o id só é conhecido depois do flush
+                self._watermark = (count + 1, max_id)
+                self._watermark_stale = True
+            else:
+                self._watermark = (count + 1, max(max_id, int(fid)))
+        return fid
+
+    def _append(self, person_id: int, encoding: np.ndarray) -> None:
+        n = len(self.index)
+        if n == self._pids.shape[0]:
+            # crescimento geométrico: append amortizado O(1)
+            pids = np.empty((max(64, 2 * n),), dtype=np.int64)
+            pids[:n] = self._pids[:n]
+            self._pids = pids
+        self.index.add(np.asarray(encoding, dtype=np.float32).reshape((1, self.dim)))
+        self._pids[n] = int(person_id)
+        self._counts[int(person_id)] = self._counts.get(int(person_id), 0) + 1
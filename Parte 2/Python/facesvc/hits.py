@@ -0,0 +1,105 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from .models import BBox, MatchResult, VideoHit, VideoSegment
+
+# um hit por linha, colunas fixas: 48 bytes contra ~1 KB de VideoHit -> MatchResult -> BBox
+HIT_DTYPE = np.dtype([
+    ("frame_index", np.int64),
+    ("timestamp_s", np.float64),
+    ("person_id", np.int64),
+    ("top", np.int32),
+    ("right", np.int32),
+    ("bottom", np.int32),
+    ("left", np.int32),
+    ("distance", np.float64),
+])
+
+
+class HitBuffer:
+    """
+    Hits de um vídeo num array estruturado do NumPy (`HIT_DTYPE`) que cresce
+    por dobra. Os modelos pydantic só são criados em `to_models`, na saída,
+    em ordem de frame (hits de desconhecidos entram atrasados, quando a
+    pessoa é criada).
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._data = np.empty((max(1, capacity),), dtype=HIT_DTYPE)
+        self._n = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    def append(self, frame_index: int, timestamp_s: float, person_id: int, bbox, distance: float) -> None:
+        if self._n == self._data.shape[0]:
+            grown = np.empty((2 * self._n,), dtype=HIT_DTYPE)
+            grown[:self._n] = self._data
+            self._data = grown
+        t, r, b, l = bbox
+        self._data[self._n] = (frame_index, timestamp_s, person_id, t, r, b, l, distance)
+        self._n += 1
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._data[:self._n]
+
+    def to_models(self, media_id: int, names: Dict[int, Optional[str]]) -> List[VideoHit]:
+        out: List[VideoHit] = []
+        arr = self.array
+        for fi, ts, pid, t, r, b, l, dist in arr[np.argsort(arr["frame_index"], kind="stable")].tolist():
+            out.append(VideoHit(
+                media_id=media_id, frame_index=fi, timestamp_s=ts,
+                match=MatchResult(person_id=pid, name=names.get(pid), distance=dist,
+                                  bbox=BBox(top=t, right=r, bottom=b, left=l)),
+            ))
+        return out
+
+
+class SegmentBuilder:
+    """
+    Junta as aparições consecutivas de cada pessoa em segmentos: enquanto a
+    pessoa volta a aparecer a menos de `max_gap_s` do último frame em que foi
+    vista, o segmento se estende; senão é fechado. Guarda só um segmento
+    aberto por pessoa (memória constante, serve também ao streaming). O bbox
+    representativo é o do frame com a menor distância.
+    """
+
+    def __init__(self, max_gap_s: float = 2.0):
+        self.max_gap_s = float(max_gap_s)
+        # person_id -> [start_frame, end_frame, start_s, end_s, hits, best_distance, bbox]
+        self._open: Dict[int, list] = {}
+
+    def add(self, person_id: int, frame_index: int, timestamp_s: float, bbox: Tuple[int, int, int, int],
+            distance: float) -> Optional[VideoSegment]:
+        """Registra uma aparição; devolve o segmento anterior da pessoa, se este a fechou."""
+        closed = None
+        seg = self._open.get(person_id)
+        if seg is not None and timestamp_s - seg[3] > self.max_gap_s:
+            closed = self._close(person_id)
+            seg = None
+        if seg is None:
+            self._open[person_id] = [frame_index, frame_index, timestamp_s, timestamp_s, 1, distance, tuple(bbox)]
+            return closed
+        seg[1], seg[3] = max(seg[1], frame_index), max(seg[3], timestamp_s)
+        seg[4] += 1
+        if distance < seg[5]:
+            seg[5], seg[6] = distance, tuple(bbox)
+        return closed
+
+    def close_idle(self, now_s: float) -> List[VideoSegment]:
+        """Fecha os segmentos de quem não aparece há mais de `max_gap_s`."""
+        idle = [pid for pid, seg in self._open.items() if now_s - seg[3] > self.max_gap_s]
+        return [self._close(pid) for pid in idle]
+
+    def close_all(self) -> List[VideoSegment]:
+        segs = [self._close(pid) for pid in list(self._open)]
+        return sorted(segs, key=lambda s: (s.start_s, s.person_id))
+
+    def _close(self, person_id: int) -> VideoSegment:
+        sf, ef, ss, es, n, dist, (t, r, b, l) = self._open.pop(person_id)
+        return VideoSegment(
+            person_id=person_id, start_frame=sf, end_frame=ef, start_s=ss, end_s=es, hits=n,
+            best_distance=dist, bbox=BBox(top=t, right=r, bottom=b, left=l),
+        )
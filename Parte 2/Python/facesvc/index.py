@@ -0,0 +1,378 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+import glob
+import os
+import time
+import numpy as np
+
+from .matching import DEFAULT_CHUNK_ROWS, nearest, squared_norms
+
+
+Segment = Tuple[np.ndarray, np.ndarray, np.ndarray]  # (vetores, normas², linhas)
+
+
+class _Block:
+    """
+    Bloco de vetores que cresce por dobra (append amortizado O(1)).
+
+    Pode ter uma base somente leitura (`adopt`, ex.: arquivo mapeado em
+    memória e compartilhado entre processos); os appends vão para uma cauda
+    privada, sem copiar a base.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.vecs = np.empty((0, dim), dtype=np.float32)
+        self.sqnorms = np.empty((0,), dtype=np.float32)
+        self.rows = np.empty((0,), dtype=np.int64)
+        self.n = 0
+        self.base: Optional[Segment] = None
+
+    def __len__(self) -> int:
+        return self.n + (self.base[0].shape[0] if self.base is not None else 0)
+
+    def extend(self, vecs: np.ndarray, rows: np.ndarray) -> None:
+        k = vecs.shape[0]
+        if self.n + k > self.vecs.shape[0]:
+            cap = max(64, 2 * self.vecs.shape[0], self.n + k)
+            for attr, shape in (("vecs", (cap, self.dim)), ("sqnorms", (cap,)), ("rows", (cap,))):
+                old = getattr(self, attr)
+                new = np.empty(shape, dtype=old.dtype)
+                new[:self.n] = old[:self.n]
+                setattr(self, attr, new)
+        self.vecs[self.n:self.n + k] = vecs
+        self.sqnorms[self.n:self.n + k] = squared_norms(vecs)
+        self.rows[self.n:self.n + k] = rows
+        self.n += k
+
+    def adopt(self, vecs: np.ndarray, rows: np.ndarray) -> None:
+        """Usa `vecs` (ex.: memmap somente leitura) como base do bloco, sem copiar."""
+        self.base = (vecs, squared_norms(vecs), np.asarray(rows, dtype=np.int64))
+
+    def segments(self) -> List[Segment]:
+        segs = [self.base] if self.base is not None and self.base[0].shape[0] else []
+        if self.n:
+            segs.append((self.vecs[:self.n], self.sqnorms[:self.n], self.rows[:self.n]))
+        return segs
+
+    def search(self, queries: np.ndarray, chunk_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(linha, distância) do mais próximo de cada query entre a base e a cauda."""
+        k = queries.shape[0]
+        best_rows = np.full((k,), -1, dtype=np.int64)
+        best_d = np.full((k,), np.inf, dtype=np.float64)
+        for vecs, sqnorms, rows in self.segments():
+            idx, d = nearest(queries, vecs, sqnorms, chunk_rows)
+            better = d < best_d
+            best_d[better] = d[better]
+            best_rows[better] = rows[idx[better]]
+        return best_rows, best_d
+
+
+class VectorIndex:
+    """
+    Contrato dos índices usados pela galeria.
+
+    Cada vetor adicionado recebe como id o número da linha (ordem de inserção),
+    e `search` devolve, para cada query, (linha, distância euclidiana) do
+    vizinho mais próximo encontrado (-1/+inf se o índice estiver vazio).
+    """
+    kind = "base"
+
+    def __init__(self, dim: int = 128):
+        self.dim = dim
+        self.ntotal = 0
+
+    def __len__(self) -> int:
+        return self.ntotal
+
+    def add(self, vectors: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def search(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    def vectors_in_row_order(self) -> np.ndarray:
+        raise NotImplementedError
+
+    # --- persistência ---
+    def _state(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def _stored_vectors(self) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Vetores na ordem em que vão para o arquivo (+ arrays que descrevem essa ordem)."""
+        return self.vectors_in_row_order(), {}
+
+    def save(self, path: str, **extra: np.ndarray) -> None:
+        """
+        Grava o índice (e arrays extras, ex.: person_ids) em um .npz, de forma
+        atômica. Os vetores vão num .npy à parte (nome único por save), que
+        `load_index` mapeia em memória em vez de ler; os .npy de saves
+        anteriores são apagados depois da troca.
+        """
+        vectors_file = f"{os.path.basename(path)}.vectors-{os.getpid()}-{time.time_ns()}.npy"
+        vectors_path = os.path.join(os.path.dirname(path), vectors_file)
+        vectors, layout = self._stored_vectors()
+        np.save(vectors_path, np.ascontiguousarray(vectors, dtype=np.float32))
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            kind=np.array(self.kind),
+            dim=np.array(self.dim),
+            vectors_file=np.array(vectors_file),
+            **layout,
+            **self._state(),
+            **{f"extra_{k}": v for k, v in extra.items()},
+        )
+        os.replace(tmp, path)
+        # quem já mapeou um arquivo antigo continua lendo dele (o inode só some quando fecha)
+        for old in glob.glob(f"{glob.escape(path)}.vectors-*.npy"):
+            if old != vectors_path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+
+class FlatIndex(VectorIndex):
+    """Busca exata (força bruta em lote via GEMM). Referência para os demais índices."""
+    kind = "flat"
+
+    def __init__(self, dim: int = 128, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+        super().__init__(dim)
+        self.chunk_rows = chunk_rows
+        self._block = _Block(dim)
+
+    def add(self, vectors: np.ndarray) -> None:
+        v = np.asarray(vectors, dtype=np.float32).reshape((-1, self.dim))
+        self._block.extend(v, np.arange(self.ntotal, self.ntotal + v.shape[0], dtype=np.int64))
+        self.ntotal += v.shape[0]
+
+    def search(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        q = np.ascontiguousarray(queries, dtype=np.float32).reshape((-1, self.dim))
+        return self._block.search(q, self.chunk_rows)
+
+    def vectors_in_row_order(self) -> np.ndarray:
+        segs = self._block.segments()
+        if len(segs) == 1:
+            return segs[0][0]
+        return np.concatenate([s[0] for s in segs]) if segs else np.empty((0, self.dim), dtype=np.float32)
+
+    def _adopt(self, vectors: np.ndarray) -> None:
+        self._block = _Block(self.dim)
+        self._block.adopt(vectors, np.arange(vectors.shape[0], dtype=np.int64))
+        self.ntotal = vectors.shape[0]
+
+
+class IVFIndex(VectorIndex):
+    """
+    Índice aproximado IVF (inverted file), em NumPy puro.
+
+    Um quantizador grosso (k-means com `nlist` centróides) particiona os
+    vetores em listas; a busca só varre as `nprobe` listas cujos centróides
+    estão mais próximos da query. Enquanto não houver vetores suficientes para
+    treinar (`nlist * min_points_per_list`), funciona como busca exata.
+    """
+    kind = "ivf"
+
+    def __init__(
+        self,
+        dim: int = 128,
+        nlist: int = 256,
+        nprobe: int = 8,
+        min_points_per_list: int = 39,
+        chunk_rows: int = DEFAULT_CHUNK_ROWS,
+        seed: int = 0,
+    ):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_points_per_list = min_points_per_list
+        self.chunk_rows = chunk_rows
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self._centroid_sqnorms: Optional[np.ndarray] = None
+        self._lists: List[_Block] = [_Block(dim)]
+        self._assign = np.empty((0,), dtype=np.int32)   # lista de cada linha (buffer com folga)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    # --- treino ---
+    def train(self, vectors: np.ndarray, iters: int = 10, max_samples: int = 100_000) -> None:
+        """k-means (Lloyd) sobre uma amostra dos vetores; define os centróides."""
+        v = np.asarray(vectors, dtype=np.float32).reshape((-1, self.dim))
+        rng = np.random.default_rng(self.seed)
+        if v.shape[0] > max_samples:
+            v = v[rng.choice(v.shape[0], max_samples, replace=False)]
+        k = min(self.nlist, v.shape[0])
+        centroids = v[rng.choice(v.shape[0], k, replace=False)].copy()
+        for _ in range(iters):
+            assign, _ = nearest(v, centroids, chunk_rows=self.chunk_rows)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, v)
+            counts = np.bincount(assign, minlength=k).astype(np.float32)
+            empty = counts == 0
+            centroids[~empty] = sums[~empty] / counts[~empty, None]
+            if empty.any():
+                # lista vazia: re-semeia com pontos aleatórios
+                centroids[empty] = v[rng.choice(v.shape[0], int(empty.sum()), replace=False)]
+        self._set_centroids(centroids)
+
+    def _set_centroids(self, centroids: np.ndarray) -> None:
+        """Define os centróides e redistribui os vetores já armazenados."""
+        old = self.vectors_in_row_order() if self.ntotal else np.empty((0, self.dim), dtype=np.float32)
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self._centroid_sqnorms = squared_norms(self.centroids)
+        self._lists = [_Block(self.dim) for _ in range(self.centroids.shape[0])]
+        self.ntotal = 0
+        if old.shape[0]:
+            self.add(old)
+
+    # --- escrita ---
+    def add(self, vectors: np.ndarray) -> None:
+        v = np.asarray(vectors, dtype=np.float32).reshape((-1, self.dim))
+        if v.shape[0] == 0:
+            return
+        rows = np.arange(self.ntotal, self.ntotal + v.shape[0], dtype=np.int64)
+        if not self.is_trained:
+            self._lists[0].extend(v, rows)
+            self._record_assign(np.zeros(v.shape[0], dtype=np.int32))
+            if self.ntotal >= self.nlist * self.min_points_per_list:
+                self.train(self.vectors_in_row_order())
+            return
+        assign, _ = nearest(v, self.centroids, self._centroid_sqnorms, self.chunk_rows)
+        for lst in np.unique(assign):
+            sel = assign == lst
+            self._lists[int(lst)].extend(v[sel], rows[sel])
+        self._record_assign(assign.astype(np.int32))
+
+    def _record_assign(self, assign: np.ndarray) -> None:
+        n, k = self.ntotal, assign.shape[0]
+        if n + k > self._assign.shape[0]:
+            buf = np.empty((max(64, 2 * self._assign.shape[0], n + k),), dtype=np.int32)
+            buf[:n] = self._assign[:n]
+            self._assign = buf
+        self._assign[n:n + k] = assign
+        self.ntotal = n + k
+
+    # --- busca ---
+    def search(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        q = np.ascontiguousarray(queries, dtype=np.float32).reshape((-1, self.dim))
+        k = q.shape[0]
+        best_rows = np.full((k,), -1, dtype=np.int64)
+        best_d = np.full((k,), np.inf, dtype=np.float64)
+        if k == 0 or self.ntotal == 0:
+            return best_rows, best_d
+        if not self.is_trained:
+            return self._lists[0].search(q, self.chunk_rows)
+
+        # listas mais próximas de cada query (quantizador grosso)
+        nprobe = min(self.nprobe, self.centroids.shape[0])
+        coarse = self._centroid_sqnorms[None, :] - 2.0 * (q @ self.centroids.T)
+        probes = np.argpartition(coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        for lst in np.unique(probes):
+            b = self._lists[int(lst)]
+            if len(b) == 0:
+                continue
+            qsel = np.nonzero((probes == lst).any(axis=1))[0]
+            rows, d = b.search(q[qsel], self.chunk_rows)
+            better = d < best_d[qsel]
+            best_d[qsel[better]] = d[better]
+            best_rows[qsel[better]] = rows[better]
+        return best_rows, best_d
+
+    def vectors_in_row_order(self) -> np.ndarray:
+        out = np.empty((self.ntotal, self.dim), dtype=np.float32)
+        for b in self._lists:
+            for vecs, _, rows in b.segments():
+                out[rows] = vecs
+        return out
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        state = {
+            "nlist": np.array(self.nlist),
+            "nprobe": np.array(self.nprobe),
+            "assign": self._assign[:self.ntotal],
+        }
+        if self.is_trained:
+            state["centroids"] = self.centroids
+        return state
+
+    def _stored_vectors(self) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        if not self.is_trained:
+            return super()._stored_vectors()
+        # agrupados por lista: na carga, cada lista é uma fatia contígua do arquivo mapeado
+        order = np.argsort(self._assign[:self.ntotal], kind="stable")
+        return self.vectors_in_row_order()[order], {"stored_order": order}
+
+    @classmethod
+    def _from_state(cls, data, vectors: np.ndarray, **params) -> "IVFIndex":
+        params.setdefault("nlist", int(data["nlist"]))
+        params.setdefault("nprobe", int(data["nprobe"]))
+        idx = cls(dim=int(data["dim"]), **params)
+        if "centroids" not in data.files:
+            idx.add(vectors)
+            return idx
+        idx.centroids = np.ascontiguousarray(data["centroids"], dtype=np.float32)
+        idx._centroid_sqnorms = squared_norms(idx.centroids)
+        idx._lists = [_Block(idx.dim) for _ in range(idx.centroids.shape[0])]
+        assign = np.asarray(data["assign"], dtype=np.int32)
+        rows = np.arange(vectors.shape[0], dtype=np.int64)
+        # reconstrói as listas sem reatribuir (mesma partição que foi salva)
+        grouped = "stored_order" in data.files
+        order = np.asarray(data["stored_order"], dtype=np.int64) if grouped else np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(idx.centroids.shape[0] + 1))
+        for lst in range(idx.centroids.shape[0]):
+            a, b = bounds[lst], bounds[lst + 1]
+            if a == b:
+                continue
+            if grouped:  # a lista já está contígua no arquivo: usa a fatia sem copiar
+                idx._lists[lst].adopt(vectors[a:b], order[a:b])
+            else:
+                sel = order[a:b]
+                idx._lists[lst].extend(vectors[sel], rows[sel])
+        idx._assign = assign.copy()
+        idx.ntotal = vectors.shape[0]
+        return idx
+
+
+INDEX_KINDS = {"flat": FlatIndex, "ivf": IVFIndex}
+
+
+def make_index(kind: str, dim: int = 128, **params) -> VectorIndex:
+    try:
+        cls = INDEX_KINDS[kind]
+    except KeyError:
+        raise ValueError(f"Índice inválido: {kind}. Use um de {sorted(INDEX_KINDS)}")
+    return cls(dim=dim, **params)
+
+
+def load_index(path: str, mmap: bool = True, **params) -> Tuple[VectorIndex, Dict[str, np.ndarray]]:
+    """
+    Lê um índice salvo com `VectorIndex.save`; retorna (índice, arrays extras).
+    Com `mmap`, os índices usam o .npy de vetores mapeado em memória, sem
+    copiar: a carga é quase instantânea e processos na mesma máquina
+    compartilham as páginas do arquivo (os appends posteriores ficam numa
+    cauda privada de cada processo).
+    """
+    with np.load(path, allow_pickle=False) as data:
+        kind = str(data["kind"])
+        if "vectors_file" in data.files:
+            vectors_path = os.path.join(os.path.dirname(path), str(data["vectors_file"]))
+            vectors = np.load(vectors_path, mmap_mode="r" if mmap else None, allow_pickle=False)
+        else:  # formato antigo: vetores dentro do .npz
+            vectors = np.ascontiguousarray(data["vectors"], dtype=np.float32)
+        if vectors.dtype != np.float32 or vectors.ndim != 2 or vectors.shape[1] != int(data["dim"]):
+            raise ValueError(f"vetores salvos inválidos: {vectors.dtype} {vectors.shape}")
+        extra = {k[len("extra_"):]: data[k] for k in data.files if k.startswith("extra_")}
+        if kind == "ivf":
+            idx: VectorIndex = IVFIndex._from_state(data, vectors, **params)
+        else:
+            idx = make_index(kind, dim=int(data["dim"]), **params)
+            if isinstance(idx, FlatIndex):
+                idx._adopt(vectors)
+            else:
+                idx.add(vectors)
+    return idx, extra
@@ -0,0 +1,210 @@
+from __future__ import annotations
+from typing import List, Optional
+import json
+import os
+import socket
+import threading
+import time
+from loguru import logger
+import redis
+
+
+class ReliableQueue:
+    """
+    Consumo confiável da lista Redis em que o Laravel publica os jobs.
+
+    Em vez de BRPOP (o job some do Redis no pop), cada job é movido
+    atomicamente para a lista de processamento deste worker e só sai de lá
+    no `ack`. A ordem é de chegada (FIFO): o Laravel faz RPUSH e o job sai
+    do começo da lista (BLMOVE LEFT; em Redis < 6.2, LPOP + LPUSH num script,
+    consultado a cada `idle_poll_s`). As chaves:
+
+      - {queue}                         fila de entrada (a mesma do Laravel)
+      - {queue}:processing:{worker_id}  jobs em andamento neste worker
+      - {queue}:heartbeat:{worker_id}   expira se o worker morrer
+      - {queue}:workers                 workers conhecidos (para o reaper)
+      - {queue}:delayed                 zset de retentativas (score = quando voltar)
+      - {queue}:dead                    dead-letter: jobs que esgotaram as tentativas
+
+    Um worker sem heartbeat tem os jobs da lista de processamento devolvidos
+    à fila por `reap` (contando como tentativa). Falhas voltam com backoff
+    exponencial até `max_attempts`; a contagem viaja no próprio payload JSON.
+    """
+
+    def __init__(
+        self,
+        r,
+        queue_key: str,
+        worker_id: Optional[str] = None,
+        heartbeat_ttl_s: float = 30.0,
+        max_attempts: int = 3,
+        backoff_s: float = 10.0,
+        backoff_max_s: float = 600.0,
+        idle_poll_s: float = 0.2,
+    ):
+        self.r = r
+        self.queue_key = queue_key
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat_ttl_s = heartbeat_ttl_s
+        self.max_attempts = max_attempts
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        self.idle_poll_s = idle_poll_s
+        self.processing_key = self._processing_key(self.worker_id)
+        self.delayed_key = f"{queue_key}:delayed"
+        self.dead_key = f"{queue_key}:dead"
+        self._workers_key = f"{queue_key}:workers"
+        self._use_blmove = True
+        self._use_lmove = True
+        self._hb_stop = threading.Event()
+        self._hb_thread: Optional[threading.Thread] = None
+
+    def _processing_key(self, worker_id: str) -> str:
+        return f"{self.queue_key}:processing:{worker_id}"
+
+    def _heartbeat_key(self, worker_id: str) -> str:
+        return f"{self.queue_key}:heartbeat:{worker_id}"
+
+    # --- consumo ---
+    def pop(self, timeout: float = 5) -> Optional[str]:
+        """Próximo job da fila, já na lista de processamento."""
+        if self._use_blmove:
+            try:
+                return self.r.blmove(self.queue_key, self.processing_key, timeout, src="LEFT", dest="LEFT")
+            except redis.exceptions.ResponseError as e:
+                if "unknown command" not in str(e).lower():
+                    raise
+                logger.info(f"Redis sem BLMOVE; consultando a fila a cada {self.idle_poll_s:.1f}s")
+                self._use_blmove = False
+        deadline = time.monotonic() + timeout
+        while True:
+            raw = self._move(self.queue_key)
+            if raw is not None or time.monotonic() >= deadline:
+                return raw
+            time.sleep(self.idle_poll_s)
+
+    def _move(self, key: str) -> Optional[str]:
+        """Move o primeiro job de `key` para a lista de processamento, sem bloquear."""
+        if self._use_lmove:
+            try:
+                return self.r.lmove(key, self.processing_key, src="LEFT", dest="LEFT")
+            except redis.exceptions.ResponseError as e:
+                if "unknown command" not in str(e).lower():
+                    raise
+                logger.info("Redis sem LMOVE; usando LPOP + LPUSH num script")
+                self._use_lmove = False
+        return self.r.eval(_LPOP_LPUSH, 2, key, self.processing_key)
+
+    def ack(self, raw: str) -> None:
+        self.r.lrem(self.processing_key, 1, raw)
+
+    def retry(self, raw: str, error: str) -> bool:
+        """
+        Tira o job da lista de processamento e agenda nova tentativa com backoff.
+        Retorna False quando as tentativas acabaram e o job foi para o dead-letter.
+        """
+        return self._requeue(raw, error, source=self.processing_key)
+
+    def _requeue(self, raw: str, error: str, source: Optional[str]) -> bool:
+        try:
+            job = json.loads(raw)
+            attempts = int(job.get("attempts", 0)) + 1
+        except (ValueError, AttributeError):
+            job, attempts = None, self.max_attempts  # payload ilegível: não adianta repetir
+
+        pipe = self.r.pipeline()
+        if source:
+            pipe.lrem(source, 1, raw)
+        if job is None or attempts >= self.max_attempts:
+            pipe.lpush(self.dead_key, json.dumps({
+                "payload": raw, "error": error, "attempts": attempts,
+                "worker": self.worker_id, "failed_at": time.time(),
+            }))
+            pipe.execute()
+            logger.error(f"Job enviado ao dead-letter {self.dead_key} após {attempts} tentativas: {error}")
+            return False
+        job["attempts"] = attempts
+        delay = min(self.backoff_max_s, self.backoff_s * 2 ** (attempts - 1))
+        pipe.zadd(self.delayed_key, {json.dumps(job): time.time() + delay})
+        pipe.execute()
+        logger.warning(f"Job reagendado em {delay:.1f}s (tentativa {attempts + 1}/{self.max_attempts}): {error}")
+        return True
+
+    def promote_delayed(self, limit: int = 100) -> int:
+        """Devolve à fila as retentativas cujo backoff já passou."""
+        due = self.r.zrangebyscore(self.delayed_key, "-inf", time.time(), start=0, num=limit)
+        moved = 0
+        for raw in due:
+            if self.r.zrem(self.delayed_key, raw):  # só quem remove empurra (vários workers)
+                self.r.rpush(self._ready_key(raw), raw)
+                moved += 1
+        return moved
+
+    def _ready_key(self, raw: str) -> str:
+        """Fila para onde volta um job (retentativa ou órfão)."""
+        return self.queue_key
+
+    def depth(self) -> int:
+        """Jobs esperando na fila (sem as retentativas agendadas)."""
+        return int(self.r.llen(self.queue_key))
+
+    def worker_count(self) -> int:
+        """Workers registrados (os mortos só saem no próximo reap); no mínimo 1."""
+        return max(1, int(self.r.scard(self._workers_key)))
+
+    # --- heartbeat / reaper ---
+    def heartbeat(self) -> None:
+        pipe = self.r.pipeline()
+        pipe.set(self._heartbeat_key(self.worker_id), time.time(), ex=max(1, int(self.heartbeat_ttl_s)))
+        pipe.sadd(self._workers_key, self.worker_id)
+        pipe.execute()
+
+    def start_heartbeat(self) -> None:
+        self.heartbeat()
+
+        def beat():
+            while not self._hb_stop.wait(self.heartbeat_ttl_s / 3):
+                try:
+                    self.heartbeat()
+                except redis.exceptions.RedisError as e:
+                    logger.warning(f"Falha no heartbeat: {e}")
+
+        self._hb_thread = threading.Thread(target=beat, name="queue-heartbeat", daemon=True)
+        self._hb_thread.start()
+
+    def stop_heartbeat(self) -> None:
+        self._hb_stop.set()
+        if self._hb_thread is not None:
+            self._hb_thread.join()
+
+    def reap(self) -> List[str]:
+        """
+        Devolve à fila os jobs de workers cujo heartbeat expirou. Só um worker
+        varre por vez (trava com expiração). Retorna os payloads que esgotaram
+        as tentativas e foram para o dead-letter, para o chamador avisar o Laravel.
+        """
+        lock_ttl = max(1, int(self.heartbeat_ttl_s / 2))
+        if not self.r.set(f"{self.queue_key}:reaper", self.worker_id, nx=True, ex=lock_ttl):
+            return []
+        dead: List[str] = []
+        for worker_id in self.r.smembers(self._workers_key):
+            if worker_id == self.worker_id or self.r.exists(self._heartbeat_key(worker_id)):
+                continue
+            source = self._processing_key(worker_id)
+            while True:
+                raw = self.r.lindex(source, -1)
+                if raw is None:
+                    break
+                logger.warning(f"Job órfão do worker {worker_id} encontrado")
+                if not self._requeue(raw, f"worker {worker_id} parou de responder", source=source):
+                    dead.append(raw)
+            self.r.srem(self._workers_key, worker_id)
+        return dead
+
+
+# LMOVE LEFT LEFT para Redis < 6.2, atômico
+_LPOP_LPUSH = """
+local v = redis.call('LPOP', KEYS[1])
+if v then redis.call('LPUSH', KEYS[2], v) end
+return v
+"""
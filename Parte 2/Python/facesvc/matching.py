@@ -0,0 +1,58 @@
+from __future__ import annotations
+from typing import Optional, Tuple
+import numpy as np
+
+# Linhas da galeria processadas por vez: limita o temporário (K, chunk) de distâncias
+DEFAULT_CHUNK_ROWS = 65536
+
+
+def squared_norms(vectors: np.ndarray) -> np.ndarray:
+    """||v||² de cada linha, em float32."""
+    v = np.asarray(vectors, dtype=np.float32)
+    return np.einsum("ij,ij->i", v, v)
+
+
+def nearest(
+    queries: np.ndarray,
+    gallery: np.ndarray,
+    gallery_sqnorms: Optional[np.ndarray] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vizinho mais próximo (distância euclidiana) de cada query na galeria.
+
+    Usa ||a-b||² = ||a||² + ||b||² - 2·a·b, de modo que cada bloco da galeria
+    custa uma única multiplicação de matrizes (K x 128) @ (128 x chunk).
+    Retorna (índices, distâncias) com shape (K,); com galeria vazia os índices
+    são -1 e as distâncias +inf.
+    """
+    q = np.ascontiguousarray(queries, dtype=np.float32)
+    if q.ndim == 1:
+        q = q.reshape((1, -1))
+    k = q.shape[0]
+    best_idx = np.full((k,), -1, dtype=np.int64)
+    best_sq = np.full((k,), np.inf, dtype=np.float32)
+    n = gallery.shape[0]
+    if k == 0 or n == 0:
+        return best_idx, best_sq.astype(np.float64)
+
+    if gallery_sqnorms is None:
+        gallery_sqnorms = squared_norms(gallery)
+    q_sq = squared_norms(q)[:, None]
+    rows = np.arange(k)
+
+    for start in range(0, n, max(1, int(chunk_rows))):
+        block = gallery[start:start + chunk_rows]
+        d2 = q @ block.T            # (K, chunk)
+        d2 *= -2.0
+        d2 += q_sq
+        d2 += gallery_sqnorms[start:start + chunk_rows][None, :]
+        idx = np.argmin(d2, axis=1)
+        vals = d2[rows, idx]
+        better = vals < best_sq
+        best_sq[better] = vals[better]
+        best_idx[better] = idx[better] + start
+
+    # erros de arredondamento podem dar valores levemente negativos
+    np.maximum(best_sq, 0.0, out=best_sq)
+    return best_idx, np.sqrt(best_sq).astype(np.float64)
@@ -0,0 +1,279 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+import bisect
+import json
+import os
+import threading
+import time
+from loguru import logger
+
+# limites (s) dos histogramas de latência: de ~1 ms (matching) a uma hora (espera na fila com backlog)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0,
+                   900.0, 3600.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")  # noqa: E731
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+class Histogram:
+    """Histograma cumulativo no formato do Prometheus (contagem por limite, soma e total)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # o último é o +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        acc = 0
+        for le, n in zip(self.buckets + (float("inf"),), self.counts):
+            acc += n
+            yield le, acc
+
+    def quantile(self, q: float) -> float:
+        """Estimativa por interpolação linear dentro do bucket, como o histogram_quantile do Prometheus."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        lower, acc = 0.0, 0
+        for le, n in zip(self.buckets, self.counts):
+            if n and acc + n >= rank:
+                return lower + (le - lower) * (rank - acc) / n
+            acc += n
+            lower = le
+        return lower  # caiu no +Inf: o maior limite finito
+
+
+class JobStats:
+    """Resumo de um job: tempo total por estágio e contadores, enviado junto com o callback."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, list] = {}     # estágio -> [segundos, vezes]
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()         # o decodificador do pipeline grava de outra thread
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            s = self.stages.setdefault(stage, [0.0, 0])
+            s[0] += seconds
+            s[1] += 1
+
+    def add(self, name: str, value: float = 1.0) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0.0) + value
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "elapsed_s": round(time.perf_counter() - self.started, 4),
+                "stages": {k: {"seconds": round(v[0], 4), "count": v[1]} for k, v in sorted(self.stages.items())},
+                "counters": {k: (int(v) if float(v).is_integer() else v) for k, v in sorted(self.counters.items())},
+            }
+
+
+class Metrics:
+    """
+    Contadores e histogramas de latência por estágio do worker, no processo.
+
+    - `inc(nome)`: contador `{prefix}_{nome}_total` (frames amostrados,
+      rostos detectados, pessoas novas, jobs por status...)
+    - `observe(estágio, s)` / `timer(estágio)`: histograma
+      `{prefix}_stage_seconds{stage=...}` (decode, detect, encode, match,
+      db_write, fetch, callback, queue_wait...)
+
+    O que acontece dentro de `job()` também é somado no `JobStats` da thread
+    atual, que vira o resumo por job do callback. Estágios que rodam em
+    processos do pool chegam aqui pelos tempos que o filho devolve.
+    `render()` gera o texto do Prometheus e `snapshot()` o mesmo em JSON.
+    """
+
+    def __init__(self, prefix: str = "facesvc", buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._hists: Dict[Tuple[str, Labels], Histogram] = {}
+        self._local = threading.local()
+        self.started = time.time()
+
+    # --- registro ---
+    def inc(self, name: str, value: float = 1.0, job: Optional[JobStats] = None, **labels) -> None:
+        with self._lock:
+            key = (name, _labels(labels))
+            self._counters[key] = self._counters.get(key, 0.0) + value
+        job = job or self.current_job()
+        if job is not None:
+            job.add(name, value)
+
+    def observe(self, stage: str, seconds: float, job: Optional[JobStats] = None, **labels) -> None:
+        key = (stage, _labels(labels))
+        with self._lock:
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = self._hists[key] = Histogram(self.buckets)
+            hist.observe(seconds)
+        job = job or self.current_job()
+        if job is not None:
+            job.add_time(stage, seconds)
+
+    @contextmanager
+    def timer(self, stage: str, **labels) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0, **labels)
+
+    def timed_iter(self, items: Iterable, stage: str, counter: Optional[str] = None) -> Iterator:
+        """
+        Repassa os itens de `items` medindo quanto cada um levou para ser
+        produzido (ex.: decodificação de frames) e contando-os em `counter`.
+        O job é fixado aqui, então o iterador pode ser consumido noutra thread.
+        """
+        job = self.current_job()
+
+        def gen():
+            it = iter(items)
+            try:
+                while True:
+                    t0 = time.perf_counter()
+                    try:
+                        item = next(it)
+                    except StopIteration:
+                        return
+                    self.observe(stage, time.perf_counter() - t0, job=job)
+                    if counter:
+                        self.inc(counter, job=job)
+                    yield item
+            finally:
+                close = getattr(it, "close", None)
+                if close is not None:
+                    close()
+        return gen()
+
+    def record_timings(self, timings: Optional[Dict[str, float]]) -> None:
+        """Tempos por estágio devolvidos por um processo do pool."""
+        for stage, seconds in (timings or {}).items():
+            self.observe(stage, seconds)
+
+    # --- resumo por job ---
+    @contextmanager
+    def job(self) -> Iterator[JobStats]:
+        stats = JobStats()
+        prev = getattr(self._local, "job", None)
+        self._local.job = stats
+        try:
+            yield stats
+        finally:
+            self._local.job = prev
+
+    def current_job(self) -> Optional[JobStats]:
+        return getattr(self._local, "job", None)
+
+    # --- exportação ---
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            hists = [
+                {"stage": stage, "labels": dict(labels), "count": h.count, "sum": round(h.sum, 6),
+                 "p50": round(h.quantile(0.5), 6), "p99": round(h.quantile(0.99), 6),
+                 "buckets": {str(le): n for le, n in h.cumulative()}}
+                for (stage, labels), h in sorted(self._hists.items())
+            ]
+        return {"time": time.time(), "uptime_s": round(time.time() - self.started, 1),
+                "counters": counters, "stages": hists}
+
+    def render(self) -> str:
+        """Texto no formato de exposição do Prometheus (version 0.0.4)."""
+        p = self.prefix
+        lines = []
+        with self._lock:
+            by_name: Dict[str, list] = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                by_name.setdefault(name, []).append((labels, value))
+            for name, series in by_name.items():
+                lines.append(f"# TYPE {p}_{name}_total counter")
+                lines.extend(f"{p}_{name}_total{_fmt_labels(labels)} {value:g}" for labels, value in series)
+
+            lines.append(f"# TYPE {p}_stage_seconds histogram")
+            for (stage, labels), h in sorted(self._hists.items()):
+                base = (("stage", stage),) + labels
+                for le, n in h.cumulative():
+                    le_s = "+Inf" if le == float("inf") else f"{le:g}"
+                    lines.append(f"{p}_stage_seconds_bucket{_fmt_labels(base, (('le', le_s),))} {n}")
+                lines.append(f"{p}_stage_seconds_sum{_fmt_labels(base)} {h.sum:.6f}")
+                lines.append(f"{p}_stage_seconds_count{_fmt_labels(base)} {h.count}")
+        lines.append(f"# TYPE {p}_uptime_seconds gauge")
+        lines.append(f"{p}_uptime_seconds {time.time() - self.started:.1f}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Sobe `GET /metrics` (Prometheus) e `GET /metrics.json` numa thread daemon."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body, ctype = json.dumps(metrics.snapshot()).encode(), "application/json"
+                elif self.path.startswith("/metrics"):
+                    body, ctype = metrics.render().encode(), "text/plain; version=0.0.4; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # sem uma linha de log por scrape
+
+        server = ThreadingHTTPServer((host, int(port)), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"Métricas em http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+    def dump_every(self, path: str, interval_s: float) -> threading.Thread:
+        """Grava `snapshot()` em `path` (JSON, troca atômica) a cada `interval_s` segundos."""
+        def loop():
+            while True:
+                time.sleep(interval_s)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                try:
+                    with open(tmp, "w") as f:
+                        json.dump(self.snapshot(), f)
+                    os.replace(tmp, path)
+                except OSError as e:
+                    logger.warning(f"Não foi possível gravar as métricas em {path}: {e}")
+
+        t = threading.Thread(target=loop, name="metrics-dump", daemon=True)
+        t.start()
+        return t
+
+
+# registro do processo: FaceService, repositórios e worker gravam aqui
+metrics = Metrics()
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
-from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field, PrivateAttr
 
 class BBox(BaseModel):
     top: int
@@ -26,9 +26,92 @@ class VideoHit(BaseModel):
     timestamp_s: float
     match: MatchResult
 
+class VideoSegment(BaseModel):
+    """Aparição contínua de uma pessoa no vídeo (hits consecutivos agregados)."""
+    person_id: int
+    name: Optional[str] = None
+    start_frame: int
+    end_frame: int
+    start_s: float
+    end_s: float
+    hits: int                 # frames amostrados em que a pessoa foi vista no segmento
+    best_distance: float
+    bbox: BBox                # caixa do frame com a menor distância
+
+class VideoSettings(BaseModel):
+    """Configuração em vigor a partir de um frame, num vídeo com prazo (`facesvc.adaptive`)."""
+    from_frame: int
+    from_s: float
+    level: int                # degrau de custo (0 = configuração do worker)
+    model: str
+    upsample: int
+    detect_scale: float
+    min_interval_s: float     # intervalo mínimo entre frames analisados (0 = todos os amostrados)
+    frames: int = 0           # frames analisados com esta configuração
+
+class VideoBudget(BaseModel):
+    deadline_s: float
+    elapsed_s: float
+    met: bool
+    settings: List[VideoSettings] = Field(default_factory=list)
+
 class VideoProcessingResult(BaseModel):
     media_id: int
     media_path: str
     fps: float
     frame_skip: int
-    hits: List[VideoHit] = Field(default_factory=list)
+    sampling: str = "read"
+    start_s: float = 0.0
+    end_s: Optional[float] = None
+    hits: List[VideoHit] = Field(default_factory=list)   # vazio com raw_hits=False
+    segments: List[VideoSegment] = Field(default_factory=list)
+    new_person_ids: List[int] = Field(default_factory=list)  # pessoas anônimas criadas neste processamento
+    budget: Optional[VideoBudget] = None   # só com prazo: configurações usadas ao longo do vídeo
+
+class PersonSummary(BaseModel):
+    person_id: int
+    name: Optional[str]
+    hits: int = 0
+    first_s: float
+    last_s: float
+    best_distance: float
+
+class VideoSummary(BaseModel):
+    """
+    Resumo de um vídeo processado em modo streaming (`FaceService.stream_video`):
+    os hits vão direto para video_hits e aqui ficam só contagens por pessoa,
+    então o tamanho não cresce com a duração do vídeo.
+    """
+    media_id: int
+    media_path: str
+    fps: float = 0.0
+    frame_skip: int = 0
+    sampling: str = "read"
+    duration_s: Optional[float] = None
+    position_s: float = 0.0          # timestamp do último frame processado
+    frames_processed: int = 0
+    hits: int = 0
+    segments: int = 0
+    people: List[PersonSummary] = Field(default_factory=list)
+    new_person_ids: List[int] = Field(default_factory=list)
+    budget: Optional[VideoBudget] = None
+    _by_person: Dict[int, PersonSummary] = PrivateAttr(default_factory=dict)
+
+    def add_hit(self, person_id: int, name: Optional[str], timestamp_s: float, distance: float) -> None:
+        self.hits += 1
+        p = self._by_person.get(person_id)
+        if p is None:
+            p = PersonSummary(person_id=person_id, name=name, first_s=timestamp_s,
+                              last_s=timestamp_s, best_distance=distance)
+            self._by_person[person_id] = p
+            self.people.append(p)
+        p.hits += 1
+        p.last_s = max(p.last_s, timestamp_s)
+        p.best_distance = min(p.best_distance, distance)
+        p.name = p.name or name
+
+    def progress(self) -> Optional[float]:
+        """Fração do vídeo já processada (None se a duração é desconhecida)."""
+        if not self.duration_s:
+            return None
+        return min(1.0, self.position_s / self.duration_s)
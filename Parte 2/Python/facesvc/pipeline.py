@@ -0,0 +1,256 @@
+from __future__ import annotations
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+from typing import Dict, Iterator, List, Optional, Tuple
+import queue
+import threading
+import time
+import numpy as np
+from loguru import logger
+
+from .config import RecognizerConfig
+from .detection import Location, analyze_frame, analyze_image, analyze_images_batch, load_image
+from .metrics import metrics
+
+# (frame_index, timestamp_s, locations, encodings); listas vazias em frames sem rosto
+AnalyzedFrame = Tuple[int, float, List[Location], List[np.ndarray]]
+
+_DONE = object()
+
+# --- lado do processo filho ---
+_worker_cfg: Optional[RecognizerConfig] = None
+
+
+def _init_worker(cfg: RecognizerConfig) -> None:
+    global _worker_cfg
+    _worker_cfg = cfg
+
+
+def _analyze_slot(shm_name: str, shape: Tuple[int, ...]):
+    """Lê o frame direto do buffer compartilhado (sem pickle do array) e analisa."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frame = None
+    timings: dict = {}
+    try:
+        frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        locations, encodings = analyze_frame(frame, _worker_cfg, timings)
+        return locations, [np.asarray(e, dtype=np.float64) for e in encodings], None, timings
+    except Exception as e:
+        return [], [], f"{type(e).__name__}: {e}", timings
+    finally:
+        del frame
+        shm.close()
+
+
+def _analyze_image(image_file: str, label: str):
+    timings: dict = {}
+    locations, encodings = analyze_image(image_file, _worker_cfg, label, timings)
+    return locations, encodings, timings
+
+
+def _spawn_pool(cfg: RecognizerConfig, workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=get_context("spawn"), initializer=_init_worker, initargs=(cfg,)
+    )
+
+
+class _Slot:
+    """Buffer de frame em memória compartilhada, reaproveitado entre frames."""
+
+    def __init__(self):
+        self.shm: Optional[shared_memory.SharedMemory] = None
+
+    def write(self, frame: np.ndarray) -> Tuple[str, Tuple[int, ...]]:
+        if self.shm is None or self.shm.size < frame.nbytes:
+            self.release()
+            self.shm = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=self.shm.buf)[...] = frame
+        return self.shm.name, frame.shape
+
+    def release(self) -> None:
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class ParallelFrameAnalyzer:
+    """
+    Pipeline de vídeo em três estágios:
+
+      1. decodificação (thread): lê os frames amostrados e copia cada um para
+         um slot livre de memória compartilhada; o número de slots limita
+         quantos frames estão em voo (fila limitada / backpressure)
+      2. análise (pool de processos): detecção + encoding lendo o slot
+      3. escrita (quem itera `analyze`): recebe os resultados na ordem dos
+         frames e faz matching/gravação, exatamente como no caminho sequencial;
+         frames sem rosto (ou com erro) também chegam, com listas vazias, para
+         o progresso andar nos trechos vazios
+
+    O pool usa `spawn` (não herda threads nem a conexão do banco) e é mantido
+    entre jobs; chame `close()` ao encerrar.
+    """
+
+    def __init__(self, cfg: RecognizerConfig, workers: int, slots: Optional[int] = None):
+        self.cfg = cfg
+        self.workers = workers
+        self.n_slots = slots or 2 * workers
+        self._pool = _spawn_pool(cfg, workers)
+
+    def analyze(self, frames, video_path: str = "") -> Iterator[AnalyzedFrame]:
+        slots = [_Slot() for _ in range(self.n_slots)]
+        free: "queue.Queue[int]" = queue.Queue()
+        for i in range(self.n_slots):
+            free.put(i)
+        pending: "queue.Queue" = queue.Queue()
+        stop = threading.Event()
+
+        def decode():
+            try:
+                for frame_idx, timestamp_s, frame_bgr in frames:
+                    slot = free.get()
+                    if stop.is_set():
+                        break
+                    frame = np.ascontiguousarray(frame_bgr, dtype=np.uint8)
+                    name, shape = slots[slot].write(frame)
+                    fut: Future = self._pool.submit(_analyze_slot, name, shape)
+                    pending.put((frame_idx, timestamp_s, slot, fut))
+                pending.put(_DONE)
+            except BaseException as e:  # repassa o erro para o estágio de escrita
+                pending.put(e)
+
+        decoder = threading.Thread(target=decode, name="video-decode", daemon=True)
+        decoder.start()
+        try:
+            while True:
+                item = pending.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                frame_idx, timestamp_s, slot, fut = item
+                locations, encodings, error, timings = fut.result()
+                free.put(slot)
+                metrics.record_timings(timings)
+                if error:
+                    logger.warning(f"Erro ao processar faces no frame {frame_idx} do vídeo {video_path}: {error}")
+                    locations, encodings = [], []
+                yield frame_idx, timestamp_s, locations, encodings
+        finally:
+            stop.set()
+            for i in range(self.n_slots):
+                free.put(i)  # destrava o decodificador se estiver esperando slot
+            decoder.join()
+            # espera os frames em voo antes de liberar os buffers
+            while not pending.empty():
+                item = pending.get_nowait()
+                if isinstance(item, tuple) and not item[3].cancel():
+                    item[3].exception()
+            for s in slots:
+                s.release()
+            if hasattr(frames, "close"):
+                frames.close()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+class ImageAnalyzerPool:
+    """
+    Detecção + encoding de fotos num pool de processos (`spawn`), para que
+    vários jobs concorrentes usem vários núcleos. O processo filho lê o arquivo
+    direto do disco; só caixas e encodings voltam pelo pipe.
+    """
+
+    def __init__(self, cfg: RecognizerConfig, workers: int):
+        self.cfg = cfg
+        self.workers = workers
+        self._pool = _spawn_pool(cfg, workers)
+
+    def analyze(self, image_file: str, label: str = ""):
+        locations, encodings, timings = self._pool.submit(_analyze_image, image_file, label).result()
+        metrics.record_timings(timings)
+        return locations, encodings
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+class ImageBatcher:
+    """
+    Junta fotos de jobs concorrentes em lotes para a detecção em lote (CNN).
+
+    Cada job decodifica a própria foto e a entrega aqui; uma thread espera até
+    `wait_ms` por mais fotos (no máximo `batch_size`), agrupa por tamanho e
+    roda detecção + encoding de cada grupo numa chamada. O tamanho real dos
+    lotes fica limitado ao número de jobs simultâneos do worker.
+
+    Por tamanho de lote, registra `detect_batch_images_total{batch_size}` e o
+    tempo de `detect`/`encode` com o mesmo label: imagens/s de cada tamanho é
+    a razão entre os dois.
+    """
+
+    def __init__(self, cfg: RecognizerConfig, batch_size: int, wait_ms: float = 50.0):
+        self.cfg = cfg
+        self.batch_size = max(1, int(batch_size))
+        self.wait_s = max(0.0, wait_ms) / 1000.0
+        self._requests: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="image-batcher", daemon=True)
+        self._thread.start()
+
+    def analyze(self, image_file: str, label: str = ""):
+        t0 = time.perf_counter()
+        image = load_image(image_file, label)
+        metrics.observe("decode", time.perf_counter() - t0)
+        fut: Future = Future()
+        self._requests.put((np.ascontiguousarray(image, dtype=np.uint8), fut))
+        with metrics.timer("batch"):
+            return fut.result()
+
+    def _collect(self) -> Optional[list]:
+        first = self._requests.get()
+        if first is _DONE:
+            return None
+        pending = [first]
+        deadline = time.monotonic() + self.wait_s
+        while len(pending) < self.batch_size:
+            try:
+                item = self._requests.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _DONE:
+                self._requests.put(_DONE)  # encerra depois de atender o que já chegou
+                break
+            pending.append(item)
+        return pending
+
+    def _loop(self) -> None:
+        while True:
+            pending = self._collect()
+            if pending is None:
+                return
+            groups: Dict[Tuple[int, ...], list] = {}
+            for image, fut in pending:
+                groups.setdefault(image.shape, []).append((image, fut))
+            for group in groups.values():
+                self._run(group)
+
+    def _run(self, group: list) -> None:
+        images = [image for image, _ in group]
+        timings: Dict[str, float] = {}
+        try:
+            results = analyze_images_batch(images, self.cfg, timings)
+        except Exception as e:
+            for _, fut in group:
+                fut.set_exception(e)
+            return
+        n = len(group)
+        metrics.inc("detect_batch_images", n, batch_size=n)
+        for stage, seconds in timings.items():
+            metrics.observe(stage, seconds, batch_size=n)
+        for (_, fut), (locations, encodings) in zip(group, results):
+            fut.set_result((locations, encodings))
+
+    def close(self) -> None:
+        self._requests.put(_DONE)
+        self._thread.join(timeout=5)
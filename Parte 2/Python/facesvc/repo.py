@@ -0,0 +1,115 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Protocol, Sequence, Tuple
+import os
+import numpy as np
+
+Bbox = Tuple[int, int, int, int]  # (top, right, bottom, left)
+
+
+# Helpers p/ BLOB <-> numpy (mesmo formato nos dois bancos: 128 float32)
+def enc_to_blob(encoding: np.ndarray) -> bytes:
+    enc32 = encoding.astype(np.float32, copy=False)
+    return enc32.tobytes(order="C")
+
+
+def blob_to_enc(blob: bytes) -> np.ndarray:
+    arr = np.frombuffer(blob, dtype=np.float32)
+    return arr.reshape((128,))
+
+
+FaceRows = Tuple[np.ndarray, np.ndarray, np.ndarray]  # (face_ids, encodings (N, 128), person_ids)
+
+
+def read_face_pages(cursor, total: int, page_rows: int = 10_000, dim: int = 128) -> FaceRows:
+    """
+    Lê (id, encoding, person_id) de um cursor já executado, `page_rows` linhas
+    por vez, direto em arrays pré-alocados para `total` linhas: os BLOBs de
+    cada página são concatenados e convertidos com um único `np.frombuffer`,
+    sem um array NumPy por linha nem o `fetchall()` inteiro na memória.
+    """
+    ids = np.empty((total,), dtype=np.int64)
+    encs = np.empty((total, dim), dtype=np.float32)
+    pids = np.empty((total,), dtype=np.int64)
+    n = 0
+    while True:
+        rows = cursor.fetchmany(page_rows)
+        if not rows:
+            break
+        k = len(rows)
+        if n + k > ids.shape[0]:  # linhas inseridas depois do COUNT
+            cap = max(2 * ids.shape[0], n + k)
+            ids, pids = np.resize(ids, (cap,)), np.resize(pids, (cap,))
+            grown = np.empty((cap, dim), dtype=np.float32)
+            grown[:n] = encs[:n]
+            encs = grown
+        fids, blobs, people = zip(*rows)
+        buf = b"".join(blobs)
+        if len(buf) != k * dim * 4:
+            raise ValueError(f"faces.encoding com tamanho inesperado (esperado {dim} float32 por linha)")
+        ids[n:n + k] = fids
+        encs[n:n + k] = np.frombuffer(buf, dtype=np.float32).reshape((k, dim))
+        pids[n:n + k] = people
+        n += k
+    return ids[:n], encs[:n], pids[:n]
+
+
+class FaceRepository(Protocol):
+    """
+    Contrato comum dos repositórios de rostos (SQLite em `db_sqlite`, MySQL em
+    `db`), sobre as tabelas do Laravel people / faces / video_hits / video_segments.
+
+    Todos os métodos podem ser chamados de várias threads. faces, video_hits e
+    video_segments são write-behind (veja `flush`). Métodos opcionais, procurados com getattr
+    por quem usa: `data_version()` (muda quando outro processo grava) e
+    `vacuum()`.
+    """
+
+    # --- people ---
+    def add_person(self, name: Optional[str]) -> int: ...
+    def person_name(self, person_id: int) -> Optional[str]: ...
+    def update_person_name(self, person_id: int, name: str) -> None: ...
+    def load_person_names(self) -> Dict[int, Optional[str]]: ...
+    def reassign_person(self, src_id: int, dst_id: int) -> None: ...
+
+    # --- buffer de escrita ---
+    def maybe_flush(self) -> None: ...
+    def flush(self) -> None: ...
+
+    # --- faces ---
+    def add_embedding(self, person_id: int, encoding: np.ndarray, source: Optional[str]) -> Optional[int]: ...
+    def load_all_encodings(self) -> Tuple[np.ndarray, List[int]]: ...
+    def load_face_rows(self, after_id: int = 0) -> FaceRows: ...
+    def replace_faces(self, delete_ids: Sequence[int], inserts: Sequence[Tuple[int, np.ndarray, Optional[str]]]) -> None: ...
+    def storage_bytes(self) -> int: ...
+    def faces_watermark(self) -> Tuple[int, int]: ...
+
+    # --- video_hits / video_segments ---
+    def delete_video_hits(self, media_id: int, start_s: float = 0.0, end_s: Optional[float] = None) -> None: ...
+    def record_video_hit(
+        self, media_id: int, person_id: int, frame_index: int, timestamp_s: float, bbox: Bbox, distance: float,
+    ) -> None: ...
+    def record_video_segment(
+        self, media_id: int, person_id: int, start_frame: int, end_frame: int, start_s: float, end_s: float,
+        hits: int, best_distance: float, bbox: Bbox,
+    ) -> None: ...
+
+    def close(self) -> None: ...
+
+
+def open_repo(backend: Optional[str] = None, sqlite_path: Optional[str] = None, **kwargs) -> FaceRepository:
+    """
+    Abre o repositório escolhido por `backend` ou pela env FACE_DB
+    (sqlite | mysql; padrão sqlite). O driver só é importado aqui, então uma
+    instalação só com SQLite não precisa do mysql-connector.
+    """
+    backend = (backend or os.getenv("FACE_DB", "sqlite")).strip().lower()
+    if backend == "sqlite":
+        if not sqlite_path:
+            raise ValueError("FACE_DB=sqlite exige o caminho do arquivo (SQLITE_PATH)")
+        from .db_sqlite import FaceRepo as SQLiteRepo
+        kwargs.pop("pool_size", None)
+        return SQLiteRepo(sqlite_path, **kwargs)
+    if backend == "mysql":
+        from .db import FaceRepo as MySQLRepo
+        return MySQLRepo(**kwargs)
+    raise ValueError(f"FACE_DB desconhecido: {backend!r} (use sqlite ou mysql)")
@@ -0,0 +1,194 @@
+from __future__ import annotations
+from typing import Iterator, List, Optional, Tuple
+import math
+import os
+import queue
+import re
+import subprocess
+import threading
+import numpy as np
+import cv2
+
+# (frame_index, timestamp_s, frame_bgr)
+SampledFrame = Tuple[int, float, np.ndarray]
+
+STRATEGIES = ("read", "grab", "time", "keyframe", "ffmpeg")
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFMPEG_PTS_TIMEOUT_S = 30.0   # espera máxima pelo pts de um frame já lido do stdout
+
+_PTS_RE = re.compile(r"pts_time:\s*([0-9.eE+-]+)")
+
+
+def sample_frames(
+    cap: cv2.VideoCapture,
+    path: str,
+    strategy: str = "read",
+    frame_skip: int = 5,
+    samples_per_second: Optional[float] = None,
+    start_s: float = 0.0,
+    end_s: Optional[float] = None,
+) -> Iterator[SampledFrame]:
+    """
+    Itera sobre os frames amostrados de um vídeo, conforme a estratégia:
+
+      - "read":     decodifica e converte todo frame, descarta `frame_skip` a cada `frame_skip + 1`
+      - "grab":     mesmo passo, mas usa `cap.grab()` nos frames descartados (sem retrieve/conversão)
+      - "time":     `samples_per_second` amostras por segundo de vídeo, independente do fps (grab)
+      - "keyframe": só keyframes (I-frames); o ffmpeg nem decodifica os demais (-skip_frame nokey)
+      - "ffmpeg":   decodificação no ffmpeg com filtro `fps`, frames crus via pipe
+
+    `cap` já aberto fornece fps e resolução; as estratégias via ffmpeg abrem o arquivo de novo.
+
+    Com `start_s`/`end_s`, só o trecho [start_s, end_s) é amostrado (um pedaço
+    de vídeo longo); índices e timestamps continuam relativos ao vídeo inteiro
+    e o passo de amostragem fica alinhado ao início do arquivo, de modo que os
+    pedaços juntos amostram os mesmos frames que uma passada única.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Estratégia de amostragem inválida: {strategy}. Use uma de {STRATEGIES}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    start_frame = max(0, int(round(start_s * fps)))
+    end_frame = int(round(end_s * fps)) if end_s is not None else None
+
+    if strategy in ("read", "grab", "time") and start_frame > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    if strategy == "read":
+        yield from _sample_read(cap, fps, frame_skip, start_frame, end_frame)
+    elif strategy == "grab":
+        yield from _sample_grab(cap, fps, frame_skip + 1.0, start_frame, end_frame)
+    elif strategy == "time":
+        yield from _sample_grab(cap, fps, fps / _rate(samples_per_second, fps, frame_skip), start_frame, end_frame)
+    else:
+        w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if strategy == "keyframe":
+            frames = _sample_ffmpeg(path, fps, w, h, input_args=["-skip_frame", "nokey"], filters=[],
+                                    start_s=start_s, end_s=end_s)
+        else:
+            rate = _rate(samples_per_second, fps, frame_skip)
+            # o filtro fps só emite uma amostra ao ver o frame seguinte: lê uma margem além do fim
+            frames = _sample_ffmpeg(path, fps, w, h, input_args=[], filters=[f"fps={rate:.6f}"],
+                                    start_s=start_s, end_s=end_s + 2.0 / rate if end_s is not None else None)
+        for frame_idx, ts, frame in frames:
+            # o seek do ffmpeg é por keyframe; descarta o que cair fora do trecho
+            if frame_idx < start_frame:
+                continue
+            if end_frame is not None and frame_idx >= end_frame:
+                break
+            yield frame_idx, ts, frame
+
+
+def sample_interval_s(strategy: str, fps: float, frame_skip: int, samples_per_second: Optional[float] = None) -> float:
+    """Segundos de vídeo entre dois frames amostrados (estimativa para keyframe: depende do GOP)."""
+    if strategy in ("read", "grab"):
+        return (frame_skip + 1) / fps
+    if strategy == "keyframe":
+        return 2.0
+    return 1.0 / _rate(samples_per_second, fps, frame_skip)
+
+
+def _rate(samples_per_second: Optional[float], fps: float, frame_skip: int) -> float:
+    """Amostras/s pedidas ou, na falta, as equivalentes ao frame_skip."""
+    if samples_per_second and samples_per_second > 0:
+        return min(float(samples_per_second), fps)
+    return fps / (frame_skip + 1)
+
+
+def _sample_read(
+    cap: cv2.VideoCapture, fps: float, frame_skip: int, start_frame: int = 0, end_frame: Optional[int] = None
+) -> Iterator[SampledFrame]:
+    frame_idx = start_frame - 1
+    while end_frame is None or frame_idx + 1 < end_frame:
+        ok, frame_bgr = cap.read()
+        if not ok:
+            break
+        frame_idx += 1
+        if frame_skip > 0 and (frame_idx % (frame_skip + 1) != 0):
+            continue
+        yield frame_idx, frame_idx / fps, frame_bgr
+
+
+def _sample_grab(
+    cap: cv2.VideoCapture, fps: float, step: float, start_frame: int = 0, end_frame: Optional[int] = None
+) -> Iterator[SampledFrame]:
+    """Avança com grab() e só faz retrieve() quando o índice alcança o próximo alvo (passo fracionário)."""
+    step = max(1.0, step)
+    frame_idx = start_frame - 1
+    # primeiro alvo >= start_frame na grade k * step contada desde o frame 0
+    next_target = math.ceil(start_frame / step - 1e-9) * step
+    while (end_frame is None or frame_idx + 1 < end_frame) and cap.grab():
+        frame_idx += 1
+        if frame_idx + 1e-6 < next_target:
+            continue
+        next_target += step
+        ok, frame_bgr = cap.retrieve()
+        if not ok:
+            continue
+        yield frame_idx, frame_idx / fps, frame_bgr
+
+
+def _sample_ffmpeg(
+    path: str, fps: float, w: int, h: int, input_args: List[str], filters: List[str],
+    start_s: float = 0.0, end_s: Optional[float] = None,
+) -> Iterator[SampledFrame]:
+    """
+    Decodifica com ffmpeg e lê frames BGR crus do stdout. O filtro `showinfo`
+    imprime o pts de cada frame no stderr, lido por uma thread, de onde vem o
+    timestamp (e o índice do frame original) de cada amostra.
+
+    Trechos usam seek na entrada com `-copyts`, para que o pts continue
+    sendo o do arquivo inteiro (e o filtro `fps` mantenha a mesma grade).
+    """
+    if start_s > 0 or end_s is not None:
+        seek = ["-copyts"]
+        if start_s > 0:
+            seek += ["-ss", f"{start_s:.6f}"]
+        if end_s is not None:
+            seek += ["-to", f"{end_s:.6f}"]
+        input_args = seek + input_args
+    # scale garante o mesmo tamanho reportado pelo OpenCV (ex.: vídeos com rotação)
+    vf = ",".join(filters + [f"scale={w}:{h}", "showinfo"])
+    cmd = [
+        FFMPEG_BIN, "-hide_banner", "-nostats", "-loglevel", "info",
+        *input_args, "-i", path,
+        "-map", "0:v:0", "-vf", vf, "-fps_mode", "passthrough",
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=w * h * 3)
+    pts: "queue.Queue[Optional[float]]" = queue.Queue()
+
+    def read_stderr():
+        for line in iter(proc.stderr.readline, b""):
+            if b"Parsed_showinfo" in line:
+                m = _PTS_RE.search(line.decode("utf-8", "replace"))
+                if m:
+                    pts.put(float(m.group(1)))
+        pts.put(None)
+
+    reader = threading.Thread(target=read_stderr, daemon=True)
+    reader.start()
+    frame_bytes = w * h * 3
+    try:
+        while True:
+            buf = proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                break
+            try:
+                ts = pts.get(timeout=FFMPEG_PTS_TIMEOUT_S)
+            except queue.Empty:
+                # ffmpeg travado ou sem as linhas do showinfo: o finally encerra o processo
+                raise RuntimeError(
+                    f"ffmpeg não informou o timestamp do frame em {FFMPEG_PTS_TIMEOUT_S:g}s: {path}"
+                ) from None
+            if ts is None:
+                break
+            frame = np.frombuffer(buf, dtype=np.uint8).reshape((h, w, 3))
+            yield int(round(ts * fps)), ts, frame
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        reader.join(timeout=5)
@@ -0,0 +1,130 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+import json
+import time
+
+from .jobqueue import ReliableQueue
+
+DEFAULT_CLASS = "default"   # a fila base (LARAVEL_QUEUE_KEY): payloads sem classe
+
+
+@dataclass(frozen=True)
+class QueueClass:
+    """Uma classe de prioridade: lista Redis própria e peso no escalonamento."""
+    name: str
+    key: str
+    weight: float
+
+
+def class_key(base_key: str, name: Optional[str]) -> str:
+    return base_key if not name or name == DEFAULT_CLASS else f"{base_key}:{name}"
+
+
+def parse_classes(spec: str, base_key: str) -> List[QueueClass]:
+    """
+    "photo:8,short:3,long:1" -> classes em `{base_key}:{nome}` (a fila que o
+    `dispatchRaw` usa com `queue: 'face:{nome}'`). A fila base entra sempre,
+    como `default`, com peso 1 se não vier na lista.
+    """
+    classes: Dict[str, QueueClass] = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, _, weight = item.partition(":")
+        name = name.strip()
+        classes[name] = QueueClass(name, class_key(base_key, name), float(weight or 1.0))
+    classes.setdefault(DEFAULT_CLASS, QueueClass(DEFAULT_CLASS, base_key, 1.0))
+    return list(classes.values())
+
+
+def queued_at(job: dict) -> Optional[float]:
+    """`queued_at` (ISO 8601, posto pelo `dispatchRaw`) como epoch; None se ausente ou sem fuso."""
+    raw = job.get("queued_at")
+    if not raw:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return ts.timestamp() if ts.tzinfo is not None else None
+
+
+def pick(classes: Sequence[QueueClass], waits: Sequence[Optional[float]], aging_s: float) -> List[int]:
+    """
+    Ordem em que as classes com job devem ser tentadas: maior
+    `peso × (1 + espera / aging_s)` primeiro, onde espera é a do job mais
+    antigo da classe (None = classe vazia). Com aging, um job de classe leve
+    esperando o bastante passa à frente de jobs novos de classes pesadas.
+    """
+    scored = []
+    for i, (cls, wait) in enumerate(zip(classes, waits)):
+        if wait is None:
+            continue
+        age = max(0.0, wait) / aging_s if aging_s > 0 else 0.0
+        scored.append((cls.weight * (1.0 + age), -i))
+    return [-i for _, i in sorted(scored, reverse=True)]
+
+
+class PriorityQueue(ReliableQueue):
+    """
+    `ReliableQueue` lendo de várias filas de classe (fotos, vídeos curtos,
+    vídeos longos...) em vez de uma só. A cada `pop`, lê o job mais antigo
+    de cada classe (LINDEX, um round-trip) e move (LMOVE) o da classe de
+    maior prioridade com aging (`pick`) para a lista de processamento. Dentro
+    de uma classe a ordem é a da fila base. Sem job em nenhuma, tenta de novo
+    a cada `idle_poll_s` até o timeout.
+
+    Processamento, heartbeat, retentativas e dead-letter continuam nas chaves
+    da fila base; retentativas voltam para a fila da classe do payload.
+    """
+
+    def __init__(self, r, queue_key: str, classes: Sequence[QueueClass], aging_s: float = 60.0, **kwargs):
+        super().__init__(r, queue_key, **kwargs)
+        self.classes = list(classes)
+        self.aging_s = aging_s
+
+    def pop(self, timeout: float = 5) -> Optional[str]:
+        deadline = time.monotonic() + timeout
+        while True:
+            raw = self._pop_ready()
+            if raw is not None or time.monotonic() >= deadline:
+                return raw
+            time.sleep(self.idle_poll_s)
+
+    def _pop_ready(self) -> Optional[str]:
+        pipe = self.r.pipeline(transaction=False)
+        for c in self.classes:
+            pipe.lindex(c.key, 0)
+        heads = pipe.execute()
+        now = time.time()
+        waits = []
+        for head in heads:
+            if head is None:
+                waits.append(None)
+                continue
+            try:
+                t = queued_at(json.loads(head))
+            except (ValueError, AttributeError):
+                t = None
+            waits.append(now - t if t is not None else 0.0)
+        for i in pick(self.classes, waits, self.aging_s):
+            # outro worker pode ter levado o job lido; aí vem o seguinte, ou a próxima classe
+            raw = self._move(self.classes[i].key)
+            if raw is not None:
+                return raw
+        return None
+
+    def depth(self) -> int:
+        pipe = self.r.pipeline(transaction=False)
+        for c in self.classes:
+            pipe.llen(c.key)
+        return int(sum(pipe.execute()))
+
+    def _ready_key(self, raw: str) -> str:
+        # pela classe do payload, mesmo que este worker não a consuma (dedicado a outras)
+        try:
+            name = json.loads(raw).get("class")
+        except (ValueError, AttributeError):
+            name = None
+        return class_key(self.queue_key, name if isinstance(name, str) else None)
+
@@ -1,19 +1,45 @@
 from __future__ import annotations
-from typing import List, Optional, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+import threading
 import numpy as np
-import face_recognition
 import cv2
 from loguru import logger
 
+from .adaptive import DeadlineController
+from .cache import AnalysisCache, VideoAnalysis
+from .clustering import UnknownCluster, UnknownFaceBuffer
 from .config import RecognizerConfig
-from .models import BBox, MatchResult, DetectionResult, VideoHit, VideoProcessingResult
-from .db import FaceRepo
+from .models import BBox, MatchResult, DetectionResult, VideoHit, VideoProcessingResult, VideoSegment, VideoSummary
+from .repo import FaceRepository
+from .detection import analyze_image, detect_faces, detect_faces_batch, encode_faces, encode_faces_batch
+from .gallery import EmbeddingGallery
+from .hits import HitBuffer, SegmentBuilder
+from .metrics import metrics
+from .pipeline import ImageAnalyzerPool, ImageBatcher, ParallelFrameAnalyzer
+from .sampling import sample_frames, sample_interval_s
+from .tracking import IoUTracker
 
 
 class FaceService:
-    def __init__(self, repo: FaceRepo, cfg: RecognizerConfig):
+    def __init__(self, repo: FaceRepository, cfg: RecognizerConfig):
         self.repo = repo
         self.cfg = cfg
+        index_params = {"nlist": cfg.ivf_nlist, "nprobe": cfg.ivf_nprobe} if cfg.index == "ivf" else {}
+        self.gallery = EmbeddingGallery(
+            repo,
+            ttl_s=cfg.gallery_ttl_s,
+            index_kind=cfg.index,
+            index_params=index_params,
+            index_path=cfg.index_path,
+        )
+        self.cache = AnalysisCache(cfg.cache_dir, cfg.cache_max_bytes) if cfg.cache_dir else None
+        self._pipeline: Optional[ParallelFrameAnalyzer] = None
+        self._images: Optional[ImageAnalyzerPool] = None
+        self._batcher: Optional[ImageBatcher] = None
+        # serializa matching + escritas (galeria e repo) quando vários jobs rodam em threads
+        self.write_lock = threading.RLock()
+        self._pools_lock = threading.Lock()
 
     @staticmethod
     def _bgr_to_rgb(frame):
@@ -32,108 +58,249 @@ class FaceService:
     def _locations_to_bboxes(face_locations):
         return [BBox(top=t, right=r, bottom=b, left=l) for (t, r, b, l) in face_locations]
 
+    def _best_matches(self, encodings) -> List[Tuple[Optional[int], Optional[str], float]]:
+        """
+        Casa K encodings de uma vez (um frame ou uma foto) contra a galeria.
+        Retorna, para cada um, (person_id, name, distância); person_id/name são
+        None quando a melhor distância passa do threshold.
+        """
+        if len(encodings) == 0:
+            return []
+        self.gallery.ensure_fresh()
+        queries = np.asarray(encodings, dtype=np.float32).reshape((len(encodings), -1))
+        with metrics.timer("match"):
+            pids, dists = self.gallery.search(queries)
+        metrics.inc("faces_matched", sum(1 for d in dists.tolist() if d <= self.cfg.threshold))
+        out: List[Tuple[Optional[int], Optional[str], float]] = []
+        for pid, dist in zip(pids.tolist(), dists.tolist()):
+            if pid >= 0 and dist <= self.cfg.threshold:
+                out.append((pid, self.gallery.name_of(pid), dist))
+            else:
+                out.append((None, None, dist))
+        return out
+
     def _best_match(self, encoding: np.ndarray):
-        db_encs, person_ids = self.repo.load_all_encodings()
-        if db_encs.shape[0] == 0:
-            return None, None, float("inf")
-        dists = np.linalg.norm(db_encs - encoding.astype(np.float32), axis=1)
-        idx = int(np.argmin(dists))
-        best_dist = float(dists[idx])
-        best_pid = person_ids[idx]
-        name = self.repo.person_name(best_pid)
-        if best_dist <= self.cfg.threshold:
-            return best_pid, name, best_dist
-        return None, None, best_dist
+        return self._best_matches([encoding])[0]
+
+    def _store_embedding(
+        self, person_id: Optional[int], encoding: np.ndarray, dist: float, source: str, store_matched: bool = True,
+    ) -> int:
+        """
+        Persiste o encoding de um rosto casado (ou de uma pessoa nova) e
+        retorna o person_id final.
+
+        Com `cfg.consolidate`, cada pessoa fica representada por no máximo
+        `cfg.max_prototypes` linhas em faces: um rosto a menos de
+        `cfg.prototype_radius` do protótipo mais próximo já está coberto e
+        não é gravado. Com `store_matched=False` (mídia repetida, vinda do
+        cache) rostos casados nunca são gravados: já estão na galeria.
+        """
+        if person_id is None:
+            person_id = self.gallery.add_person(None)
+            self.gallery.add_embedding(person_id, encoding, source)
+            metrics.inc("people_created")
+            return person_id
+        if not store_matched:
+            return person_id
+        if self.cfg.consolidate and (
+            dist <= self.cfg.prototype_radius
+            or self.gallery.prototype_count(person_id) >= self.cfg.max_prototypes
+        ):
+            return person_id
+        self.gallery.add_embedding(person_id, encoding, source)
+        return person_id
 
     def process_image(self, media_id: int, image_path: str) -> DetectionResult:
-        image = face_recognition.load_image_file(f"../storage/app/public/{image_path}")
-        
-        # Verificar se a imagem foi carregada corretamente
-        if image is None or image.size == 0:
-            raise RuntimeError(f"Imagem não pôde ser carregada: {image_path}")
-        
-        # Garantir que a imagem está no formato correto (RGB)
-        if len(image.shape) != 3 or image.shape[2] != 3:
-            raise RuntimeError(f"Imagem deve ser RGB com 3 canais: {image_path}")
-        
-        try:
-            # Debug: verificar formato da imagem
-            logger.debug(f"Processando imagem: shape={image.shape}, dtype={image.dtype}")
-            logger.debug(f"Configuração: model={self.cfg.model}, upsample={self.cfg.upsample}")
-            
-            # Validar modelo
-            if self.cfg.model not in ["hog", "cnn"]:
-                raise ValueError(f"Modelo inválido: {self.cfg.model}. Use 'hog' ou 'cnn'")
-            
-            # Validar upsample
-            if not isinstance(self.cfg.upsample, int) or self.cfg.upsample < 1:
-                raise ValueError(f"Upsample inválido: {self.cfg.upsample}. Deve ser um inteiro >= 1")
-            
-            # Garantir que a imagem está no formato correto para o dlib
-            if image.dtype != np.uint8:
-                image = image.astype(np.uint8)
-                logger.debug(f"Convertido dtype para uint8: {image.dtype}")
-            
-            face_locations = face_recognition.face_locations(image, number_of_times_to_upsample=self.cfg.upsample, model=self.cfg.model)
-            logger.debug(f"Faces encontradas: {len(face_locations)}")
-            
-            # Verificar se há faces antes de tentar gerar encodings
-            if not face_locations:
-                logger.info(f"Nenhuma face encontrada na imagem {image_path}")
-                return DetectionResult(media_id=media_id, media_path=image_path, detections=[])
-            
-            # Verificar formato das localizações das faces
-            valid_locations = []
-            for i, loc in enumerate(face_locations):
-                if isinstance(loc, tuple) and len(loc) == 4:
-                    valid_locations.append(loc)
-                else:
-                    logger.warning(f"Formato inválido de localização da face {i}: {loc}")
-            
-            if not valid_locations:
-                logger.info(f"Nenhuma localização válida de face na imagem {image_path}")
-                return DetectionResult(media_id=media_id, media_path=image_path, detections=[])
-            
-            encodings = face_recognition.face_encodings(image, known_face_locations=valid_locations)
-            logger.debug(f"Encodings gerados: {len(encodings)}")
-            
-        except Exception as e:
-            logger.error(f"Erro ao processar faces na imagem {image_path}: {str(e)}")
-            logger.error(f"Tipo de erro: {type(e).__name__}")
-            raise RuntimeError(f"Erro ao processar faces na imagem {image_path}: {str(e)}")
+        image_file = f"../storage/app/public/{image_path}"
+        cache_key = self._cache_key(image_file, "image")
+        cached = self.cache.get_image(cache_key) if cache_key else None
+        if cached is not None:
+            logger.info(f"Análise da imagem reaproveitada do cache: {image_path}")
+            metrics.inc("cache_hits", kind="image")
+            valid_locations, encodings = cached
+        else:
+            if self.cfg.detect_batch > 1:
+                # fotos de jobs simultâneos detectadas/codificadas num lote só
+                valid_locations, encodings = self._image_batcher().analyze(image_file, image_path)
+            elif self.cfg.image_workers > 1:
+                # detecção + encoding num processo do pool; vários jobs de foto em paralelo
+                valid_locations, encodings = self._image_pool().analyze(image_file, image_path)
+            else:
+                timings: dict = {}
+                valid_locations, encodings = analyze_image(image_file, self.cfg, image_path, timings)
+                metrics.record_timings(timings)
+            if cache_key:
+                self.cache.put_image(cache_key, valid_locations, encodings)
+        metrics.inc("faces_detected", len(valid_locations))
+        if not valid_locations:
+            return DetectionResult(media_id=media_id, media_path=image_path, detections=[])
+
+        with self.write_lock:
+            try:
+                detections = self._record_image(image_path, valid_locations, encodings, store_matched=cached is None)
+            finally:
+                self.gallery.flush()
+        return DetectionResult(media_id=media_id, media_path=image_path, detections=detections)
 
+    def _record_image(self, image_path: str, valid_locations, encodings, store_matched: bool = True) -> List[MatchResult]:
+        """Estágio de escrita de uma foto: matching em lote e gravação dos embeddings."""
         detections: List[MatchResult] = []
-        for loc, enc in zip(valid_locations, encodings):
-            person_id, name, dist = self._best_match(enc)
-            source = f"image:{image_path}"
-            if person_id is None:
-                person_id = self.repo.add_person(None)
-                self.repo.add_embedding(person_id, enc, source)
-            else:
-                self.repo.add_embedding(person_id, enc, source)
+        matches = self._best_matches(encodings)
+        for loc, enc, (person_id, name, dist) in zip(valid_locations, encodings, matches):
+            person_id = self._store_embedding(person_id, enc, dist, f"image:{image_path}", store_matched)
 
             bbox = self._locations_to_bboxes([loc])[0]
             detections.append(MatchResult(person_id=person_id, name=name, distance=dist, bbox=bbox))
+        return detections
 
-        return DetectionResult(media_id=media_id, media_path=image_path, detections=detections)
+    def process_video(
+        self,
+        media_id: int,
+        video_path: str,
+        frame_skip: int = 5,
+        sampling: str = "read",
+        samples_per_second: Optional[float] = None,
+        start_s: float = 0.0,
+        end_s: Optional[float] = None,
+        deadline_s: Optional[float] = None,
+    ) -> VideoProcessingResult:
+        """
+        Processa o vídeo inteiro ou só o trecho [start_s, end_s) (um pedaço de
+        um vídeo longo dividido entre workers); frame_index/timestamp_s dos
+        hits são sempre relativos ao vídeo inteiro. Com `deadline_s`, o custo
+        por frame é ajustado durante o vídeo para terminar nesse tempo
+        (`DeadlineController`) e o resultado traz as configurações usadas em `budget`.
+        """
+        try:
+            run = None
+            for run in self._video_steps(
+                media_id, video_path, frame_skip, sampling, samples_per_second, start_s, end_s, deadline_s=deadline_s,
+            ):
+                pass
+            return run.result
+        finally:
+            # fim do job ou erro no meio: o que já foi reconhecido vai para o banco
+            self.flush()
 
-    def process_video(self, media_id: int, video_path: str, frame_skip: int = 5) -> VideoProcessingResult:
-        cap = cv2.VideoCapture(f"../storage/app/public/{video_path}")
+    def stream_video(
+        self,
+        media_id: int,
+        video_path: str,
+        frame_skip: int = 5,
+        sampling: str = "read",
+        samples_per_second: Optional[float] = None,
+        start_s: float = 0.0,
+        end_s: Optional[float] = None,
+        summary: Optional[VideoSummary] = None,
+        deadline_s: Optional[float] = None,
+    ) -> Iterator[List[VideoHit]]:
+        """
+        Como `process_video`, mas gera, a cada frame processado, a lista (às
+        vezes vazia) dos hits daquele frame, sem acumulá-los: os hits vão para
+        video_hits pelo repositório e a memória não cresce com a duração do
+        vídeo. Hits de um desconhecido saem atrasados, no passo em que o
+        grupo dele vira pessoa. `summary`, se passado, é atualizado a cada passo (posição,
+        contagens por pessoa) e serve para callbacks de progresso e o final.
+        """
+        try:
+            for run in self._video_steps(
+                media_id, video_path, frame_skip, sampling, samples_per_second, start_s, end_s,
+                keep_hits=False, summary=summary, deadline_s=deadline_s,
+            ):
+                hits, run.emitted = run.emitted, []
+                yield hits
+        finally:
+            self.flush()
+
+    def _video_steps(
+        self, media_id, video_path, frame_skip, sampling, samples_per_second, start_s, end_s,
+        keep_hits: bool = True, summary: Optional[VideoSummary] = None, deadline_s: Optional[float] = None,
+    ) -> Iterator["_VideoRun"]:
+        """
+        Processa o vídeo gerando o `_VideoRun` uma vez logo após abri-lo e
+        depois de cada frame processado; quem consome decide o que fazer com
+        os hits do passo (`run.emitted`, quando `keep_hits=False`).
+        """
+        video_file = f"../storage/app/public/{video_path}"
+        cache_key = self._cache_key(
+            video_file, "video", frame_skip=int(frame_skip), sampling=sampling,
+            samples_per_second=samples_per_second, start_s=float(start_s), end_s=end_s,
+        )
+        cached = self.cache.get_video(cache_key) if cache_key else None
+        if cached is not None:
+            # mesmo arquivo e mesmos parâmetros: refaz só tracking/matching/gravação, sem abrir o vídeo
+            logger.info(f"Análise do vídeo reaproveitada do cache: {video_path} ({len(cached.frames)} frames com rosto)")
+            metrics.inc("cache_hits", kind="video")
+            run = self._new_video_run(
+                media_id, video_path, cached.fps, frame_skip, sampling, start_s, end_s, samples_per_second,
+            )
+            run.repeat = True
+            run.stream(keep_hits, summary)
+            yield run
+            replay = _CachedVideoReplay(cached, video_file)
+            try:
+                for pos, (frame_idx, timestamp_s, locations) in enumerate(cached.frames):
+                    self._consume_frame(
+                        run, frame_idx, timestamp_s, locations,
+                        lambda idx, pos=pos: replay.encodings(pos, idx, self._encode_timed),
+                    )
+                    yield run
+            finally:
+                replay.close()
+            self._finish_video(run)
+            yield run
+            return
+
+        cap = cv2.VideoCapture(video_file)
         if not cap.isOpened():
             raise RuntimeError(f"Não foi possível abrir o vídeo: {video_path}")
 
         fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-        result = VideoProcessingResult(media_id=media_id, media_path=video_path, fps=float(fps), frame_skip=int(frame_skip))
-
-        frame_idx = -1
-        while True:
-            ok, frame_bgr = cap.read()
-            if not ok:
-                break
-            frame_idx += 1
-            if frame_skip > 0 and (frame_idx % (frame_skip + 1) != 0):
-                continue
+        run = self._new_video_run(media_id, video_path, fps, frame_skip, sampling, start_s, end_s, samples_per_second)
+        if cache_key and not deadline_s:
+            # com prazo a análise pode sair degradada: não serve de cache para jobs sem prazo
+            run.analysis = VideoAnalysis(fps=float(fps))
+        run.stream(keep_hits, summary)
+        frame_count = float(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0.0)
+        duration_s = frame_count / fps if frame_count > 0 else None
+        if summary is not None:
+            summary.duration_s = duration_s
+        yield run
+        frames = metrics.timed_iter(sample_frames(
+            cap, video_file, strategy=sampling, frame_skip=frame_skip, samples_per_second=samples_per_second,
+            start_s=start_s, end_s=end_s,
+        ), "decode", counter="frames_sampled")
+        if deadline_s:
+            run.deadline = DeadlineController(
+                self.cfg, deadline_s, sample_interval_s(sampling, fps, frame_skip, samples_per_second),
+                start_s=start_s, end_s=end_s if end_s is not None else duration_s,
+                detector=self.cfg.video_workers <= 1,   # o pool de processos detecta com a configuração fixa
+            )
+            frames = run.deadline.pace(frames)
+        if self.cfg.video_workers > 1:
+            # detecção + encoding num pool de processos; matching e escrita aqui, na ordem dos frames
+            for frame_idx, timestamp_s, valid_locations, encodings in self._video_pipeline().analyze(frames, video_path):
+                if valid_locations:
+                    self._consume_frame(
+                        run, frame_idx, timestamp_s, valid_locations,
+                        lambda idx, encs=encodings: [encs[i] for i in idx],
+                    )
+                elif summary is not None:
+                    summary.position_s = timestamp_s  # o progresso anda também em trechos sem rosto
+                yield run
+            self._finish_video(run, cap, cache_key)
+            yield run
+            return
+        if self.cfg.detect_batch > 1:
+            yield from self._batched_video_steps(run, frames)
+            self._finish_video(run, cap, cache_key)
+            yield run
+            return
 
+        for frame_idx, timestamp_s, frame_bgr in frames:
+            if summary is not None:
+                summary.position_s = timestamp_s
+            yield run  # também nos frames sem rosto: o progresso anda em trechos vazios
             frame_rgb = self._bgr_to_rgb(frame_bgr)
             
             # Verificar se o frame foi convertido corretamente
@@ -146,7 +313,7 @@ class FaceService:
             
             try:
                 # Debug: verificar formato do frame
-                logger.debug(f"Processando frame {frame_idx}: shape={frame_rgb.shape}, dtype={frame_rgb.dtype}")
+                logger.debug("Processando frame {}: shape={}, dtype={}", frame_idx, frame_rgb.shape, frame_rgb.dtype)
                 
                 # Validar modelo
                 if self.cfg.model not in ["hog", "cnn"]:
@@ -156,13 +323,14 @@ class FaceService:
                 # Garantir que o frame está no formato correto para o dlib
                 if frame_rgb.dtype != np.uint8:
                     frame_rgb = frame_rgb.astype(np.uint8)
-                    logger.debug(f"Convertido dtype do frame {frame_idx} para uint8: {frame_rgb.dtype}")
+                    logger.debug("Convertido dtype do frame {} para uint8: {}", frame_idx, frame_rgb.dtype)
                 
-                face_locations = face_recognition.face_locations(frame_rgb, number_of_times_to_upsample=self.cfg.upsample, model=self.cfg.model)
+                with metrics.timer("detect"):
+                    face_locations = detect_faces(frame_rgb, self._detect_cfg(run))
                 if not face_locations:
                     continue
 
-                logger.debug(f"Faces encontradas no frame {frame_idx}: {len(face_locations)}")
+                logger.debug("Faces encontradas no frame {}: {}", frame_idx, len(face_locations))
                 
                 # Verificar formato das localizações das faces
                 valid_locations = []
@@ -173,50 +341,395 @@ class FaceService:
                         logger.warning(f"Formato inválido de localização da face {i} no frame {frame_idx}: {loc}")
                 
                 if not valid_locations:
-                    logger.debug(f"Nenhuma localização válida de face no frame {frame_idx}")
+                    logger.debug("Nenhuma localização válida de face no frame {}", frame_idx)
                     continue
-                
-                encodings = face_recognition.face_encodings(frame_rgb, known_face_locations=valid_locations)
-                logger.debug(f"Encodings gerados no frame {frame_idx}: {len(encodings)}")
-                
+
             except Exception as e:
                 logger.warning(f"Erro ao processar faces no frame {frame_idx} do vídeo {video_path}: {str(e)}")
                 logger.warning(f"Tipo de erro: {type(e).__name__}")
                 continue
-            timestamp_s = frame_idx / fps
-
-            for loc, enc in zip(valid_locations, encodings):
-                person_id, name, dist = self._best_match(enc)
-                source = f"video:{video_path}@{timestamp_s:.2f}s"
-                if person_id is None:
-                    person_id = self.repo.add_person(None)
-                    self.repo.add_embedding(person_id, enc, source)
+
+            self._consume_frame(
+                run, frame_idx, timestamp_s, valid_locations,
+                lambda idx: self._encode_timed(frame_rgb, [valid_locations[i] for i in idx]),
+            )
+
+        self._finish_video(run, cap, cache_key)
+        yield run
+
+    def _batched_video_steps(self, run: "_VideoRun", frames) -> Iterator["_VideoRun"]:
+        """
+        Caminho sequencial com detecção em lote: junta `cfg.detect_batch`
+        frames amostrados do mesmo tamanho e detecta todos numa chamada. Sem
+        tracking, os rostos do lote também são codificados de uma vez; com
+        tracking, o encoding continua por frame (só o que o tracker pedir).
+        """
+        batch = []
+        for frame_idx, timestamp_s, frame_bgr in frames:
+            frame_rgb = self._bgr_to_rgb(frame_bgr)
+            if frame_rgb is None:
+                continue
+            if batch and frame_rgb.shape != batch[0][2].shape:
+                yield from self._consume_batch(run, batch)
+                batch = []
+            batch.append((frame_idx, timestamp_s, np.ascontiguousarray(frame_rgb, dtype=np.uint8)))
+            if len(batch) >= self.cfg.detect_batch:
+                yield from self._consume_batch(run, batch)
+                batch = []
+        if batch:
+            yield from self._consume_batch(run, batch)
+
+    def _consume_batch(self, run: "_VideoRun", batch) -> Iterator["_VideoRun"]:
+        images = [frame_rgb for _, _, frame_rgb in batch]
+        n = len(batch)
+        try:
+            with metrics.timer("detect", batch_size=n):
+                found = detect_faces_batch(images, self._detect_cfg(run))
+        except Exception as e:
+            logger.warning(f"Erro ao detectar faces no lote de {n} frames do vídeo {run.video_path}: {str(e)}")
+            found = [[] for _ in batch]
+        metrics.inc("detect_batch_images", n, batch_size=n)
+        locations = [[loc for loc in locs if isinstance(loc, tuple) and len(loc) == 4] for locs in found]
+
+        encoded = None
+        if run.tracker is None and any(locations):
+            try:
+                with metrics.timer("encode", batch_size=n):
+                    encoded = encode_faces_batch(images, locations)
+            except Exception as e:
+                logger.warning(f"Erro ao codificar o lote de {n} frames do vídeo {run.video_path}: {str(e)}")
+                encoded = None
+
+        for j, ((frame_idx, timestamp_s, frame_rgb), locs) in enumerate(zip(batch, locations)):
+            if run.summary is not None:
+                run.summary.position_s = timestamp_s
+            if locs:
+                if encoded is not None:
+                    encode = lambda idx, encs=encoded[j]: [encs[i] for i in idx]  # noqa: E731
                 else:
-                    self.repo.add_embedding(person_id, enc, source)
-
-                bbox = self._locations_to_bboxes([loc])[0]
-                # persistir hit (se a tabela existir)
-                try:
-                    self.repo.record_video_hit(
-                        media_id=media_id,
-                        person_id=person_id,
-                        frame_index=frame_idx,
-                        timestamp_s=timestamp_s,
-                        bbox=(bbox.top, bbox.right, bbox.bottom, bbox.left),
-                        distance=dist,
-                    )
-                except Exception:
-                    # tabela pode não existir; ignore se não quiser usar agora
-                    pass
-
-                result.hits.append(
-                    VideoHit(
-                        media_id=media_id,
-                        frame_index=frame_idx,
-                        timestamp_s=timestamp_s,
-                        match=MatchResult(person_id=person_id, name=name, distance=dist, bbox=bbox),
-                    )
+                    encode = lambda idx, rgb=frame_rgb, locs=locs: self._encode_timed(rgb, [locs[i] for i in idx])  # noqa: E731
+                self._consume_frame(run, frame_idx, timestamp_s, locs, encode)
+            yield run
+
+    def _detect_cfg(self, run: "_VideoRun") -> RecognizerConfig:
+        return run.deadline.detect_cfg if run.deadline is not None else self.cfg
+
+    @staticmethod
+    def _encode_timed(frame_rgb, locations):
+        with metrics.timer("encode"):
+            return encode_faces(frame_rgb, locations)
+
+    def _new_video_run(
+        self, media_id, video_path, fps, frame_skip, sampling, start_s, end_s, samples_per_second=None,
+    ) -> "_VideoRun":
+        result = VideoProcessingResult(
+            media_id=media_id, media_path=video_path, fps=float(fps), frame_skip=int(frame_skip), sampling=sampling,
+            start_s=float(start_s), end_s=end_s,
+        )
+        # Com tracking, rostos que seguem no mesmo lugar herdam a identidade do
+        # track e só são recodificados quando a caixa muda ou o encoding vence.
+        tracker = None
+        if self.cfg.track:
+            step = round(sample_interval_s(sampling, fps, frame_skip, samples_per_second) * fps)
+            tracker = IoUTracker(iou_threshold=self.cfg.track_iou, frame_step=step)
+        max_age_frames = int(round(self.cfg.track_reencode_s * fps))
+        # Rostos sem match esperam juntar unknown_min_faces parecidos antes de virar pessoa
+        unknown = None
+        if self.cfg.unknown_min_faces > 1:
+            unknown = UnknownFaceBuffer(
+                radius=self.cfg.unknown_radius or self.cfg.threshold,
+                min_faces=self.cfg.unknown_min_faces, ttl_s=self.cfg.unknown_ttl_s,
+            )
+        return _VideoRun(media_id=media_id, video_path=video_path, result=result,
+                         tracker=tracker, max_age_frames=max_age_frames,
+                         segments=SegmentBuilder(self.cfg.segment_gap_s), unknown=unknown)
+
+    def _finish_video(self, run: "_VideoRun", cap=None, cache_key: Optional[str] = None) -> None:
+        if cap is not None:
+            cap.release()
+        if cache_key and run.analysis is not None:
+            self.cache.put_video(cache_key, run.analysis)
+        if run.unknown is not None:
+            self._drop_unknown(run, run.unknown.drain())
+        self._record_segments(run, run.segments.close_all())
+        if run.keep_hits and self.cfg.raw_hits:
+            run.result.hits = run.hits.to_models(run.media_id, run.names)
+        if run.deadline is not None:
+            run.result.budget = run.deadline.report()
+            if run.summary is not None:
+                run.summary.budget = run.result.budget
+
+    def _promote_unknown(self, run: "_VideoRun", cluster: UnknownCluster) -> None:
+        """Cria a pessoa de um grupo de desconhecidos e grava os rostos e hits que estavam esperando."""
+        person_id = None
+        for enc, (frame_idx, timestamp_s, loc, dist, track) in zip(cluster.encodings, cluster.items):
+            source = f"video:{run.video_path}@{timestamp_s:.2f}s"
+            if person_id is None:
+                person_id = self._store_embedding(None, enc, dist, source)
+                run.result.new_person_ids.append(person_id)
+                if run.summary is not None:
+                    run.summary.new_person_ids.append(person_id)
+            else:
+                d = float(np.linalg.norm(enc - cluster.encodings[0]))
+                self._store_embedding(person_id, enc, d, source, store_matched=not run.repeat)
+            self._record_hit(run, frame_idx, timestamp_s, person_id, None, loc, dist, track)
+        logger.debug("Desconhecido agrupado em pessoa nova {}: {} rostos", person_id, len(cluster))
+
+    def _drop_unknown(self, run: "_VideoRun", clusters: List[UnknownCluster]) -> None:
+        faces = sum(len(c) for c in clusters)
+        if faces:
+            metrics.inc("unknown_faces_dropped", faces)
+            logger.debug("{} rostos desconhecidos descartados (grupos com menos de {}) | media_id={}",
+                         faces, self.cfg.unknown_min_faces, run.media_id)
+
+    def _record_hit(self, run: "_VideoRun", frame_idx: int, timestamp_s: float, person_id: int, name: Optional[str],
+                    loc, dist: float, track=None) -> None:
+        if track is not None:
+            track.person_id, track.name, track.distance = person_id, name, dist
+            track.encoded_bbox, track.encoded_frame = tuple(loc), frame_idx
+
+        if self.cfg.raw_hits:
+            # persistir hit (se a tabela existir)
+            try:
+                self.repo.record_video_hit(
+                    media_id=run.media_id,
+                    person_id=person_id,
+                    frame_index=frame_idx,
+                    timestamp_s=timestamp_s,
+                    bbox=tuple(loc),
+                    distance=dist,
+                )
+            except Exception:
+                # tabela pode não existir; ignore se não quiser usar agora
+                pass
+
+        run.add_hit(frame_idx, timestamp_s, person_id, name, loc, dist, raw=self.cfg.raw_hits)
+        self._extend_segment(run, person_id, frame_idx, timestamp_s, loc, dist)
+
+    def _extend_segment(self, run: "_VideoRun", person_id: int, frame_idx: int, timestamp_s: float, loc, dist: float):
+        closed = run.segments.add(person_id, frame_idx, timestamp_s, loc, dist)
+        if closed is not None:
+            self._record_segments(run, [closed])
+
+    def _record_segments(self, run: "_VideoRun", segments: List[VideoSegment]) -> None:
+        """Grava os segmentos fechados em video_segments e os junta ao resultado (ou ao resumo, no streaming)."""
+        for seg in segments:
+            seg.name = run.names.get(seg.person_id)
+            try:
+                self.repo.record_video_segment(
+                    media_id=run.media_id, person_id=seg.person_id,
+                    start_frame=seg.start_frame, end_frame=seg.end_frame, start_s=seg.start_s, end_s=seg.end_s,
+                    hits=seg.hits, best_distance=seg.best_distance,
+                    bbox=(seg.bbox.top, seg.bbox.right, seg.bbox.bottom, seg.bbox.left),
                 )
+            except Exception:
+                pass  # tabela video_segments pode não existir
+            if run.keep_hits:
+                run.result.segments.append(seg)
+            if run.summary is not None:
+                run.summary.segments += 1
+
+    def _cache_key(self, path: str, kind: str, **params) -> Optional[str]:
+        """Chave do cache de análise para o arquivo; None sem cache ou se o arquivo não pôde ser lido."""
+        if self.cache is None:
+            return None
+        try:
+            return self.cache.key(path, self.cfg, kind, **params)
+        except OSError:
+            return None  # o caminho normal reporta o erro de leitura
+
+    def flush(self) -> None:
+        """Grava no banco as escritas ainda no buffer do repositório."""
+        with self.write_lock:
+            self.gallery.flush()
+
+    def video_duration_s(self, video_path: str) -> float:
+        """Duração do vídeo (frames / fps), usada para decidir se ele é dividido em pedaços."""
+        cap = cv2.VideoCapture(f"../storage/app/public/{video_path}")
+        if not cap.isOpened():
+            raise RuntimeError(f"Não foi possível abrir o vídeo: {video_path}")
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            return float(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0.0) / fps
+        finally:
+            cap.release()
+
+    def _consume_frame(self, run: "_VideoRun", frame_idx: int, timestamp_s: float, valid_locations, encode) -> None:
+        """
+        Estágio de escrita de um frame: tracking, encoding (via `encode(índices)`),
+        matching em lote, gravação dos embeddings e dos hits. Sempre chamado na
+        ordem dos frames, seja no caminho sequencial ou no paralelo. Tracking e
+        encoding são do próprio vídeo; só matching e gravação pegam `write_lock`.
+        """
+        pos = run.analysis.add_frame(frame_idx, timestamp_s, valid_locations) if run.analysis is not None else None
+        if run.summary is not None:
+            run.summary.position_s = timestamp_s
+            run.summary.frames_processed += 1
+        metrics.inc("frames_with_faces")
+        metrics.inc("faces_detected", len(valid_locations))
+        self._record_segments(run, run.segments.close_idle(timestamp_s))
+        if run.unknown is not None:
+            self._drop_unknown(run, run.unknown.expire(timestamp_s))
+        tracker = run.tracker
+        tracks = tracker.update(frame_idx, valid_locations) if tracker else [None] * len(valid_locations)
+        if tracker:
+            to_encode = [
+                i for i, tr in enumerate(tracks)
+                if tracker.needs_encoding(tr, frame_idx, self.cfg.track_reencode_iou, run.max_age_frames)
+            ]
+            # rostos que seguem no track sem recodificar continuam estendendo o segmento da pessoa
+            skip = set(to_encode)
+            for i, tr in enumerate(tracks):
+                if i not in skip and tr.person_id is not None:
+                    self._extend_segment(run, tr.person_id, frame_idx, timestamp_s, valid_locations[i], tr.distance)
+            if not to_encode:
+                return
+        else:
+            to_encode = list(range(len(valid_locations)))
+
+        try:
+            encodings = encode(to_encode)
+            logger.debug("Encodings gerados no frame {}: {}", frame_idx, len(encodings))
+        except Exception as e:
+            logger.warning(f"Erro ao processar faces no frame {frame_idx} do vídeo {run.video_path}: {str(e)}")
+            logger.warning(f"Tipo de erro: {type(e).__name__}")
+            return
+        metrics.inc("faces_encoded", len(encodings))
+        if pos is not None:
+            run.analysis.add_encodings(pos, to_encode, encodings)
+
+        with self.write_lock:
+            matches = self._best_matches(encodings)
+            for i, enc, (person_id, name, dist) in zip(to_encode, encodings, matches):
+                loc = valid_locations[i]
+                if person_id is None and run.unknown is not None:
+                    # hit e rosto ficam esperando no grupo até ele virar pessoa (ou ser descartado)
+                    cluster = run.unknown.add(enc, frame_idx, timestamp_s, (frame_idx, timestamp_s, loc, dist, tracks[i]))
+                    if cluster is not None:
+                        self._promote_unknown(run, cluster)
+                    continue
+                is_new = person_id is None
+                person_id = self._store_embedding(
+                    person_id, enc, dist, f"video:{run.video_path}@{timestamp_s:.2f}s", store_matched=not run.repeat
+                )
+                if is_new:
+                    run.result.new_person_ids.append(person_id)
+                    if run.summary is not None:
+                        run.summary.new_person_ids.append(person_id)
+                self._record_hit(run, frame_idx, timestamp_s, person_id, name, loc, dist, tracks[i])
+
+    def _video_pipeline(self) -> ParallelFrameAnalyzer:
+        # o pool de processos é criado uma vez e reaproveitado entre jobs
+        with self._pools_lock:
+            if self._pipeline is None:
+                self._pipeline = ParallelFrameAnalyzer(self.cfg, workers=self.cfg.video_workers)
+            return self._pipeline
+
+    def _image_batcher(self) -> ImageBatcher:
+        with self._pools_lock:
+            if self._batcher is None:
+                self._batcher = ImageBatcher(self.cfg, self.cfg.detect_batch, self.cfg.batch_wait_ms)
+            return self._batcher
+
+    def _image_pool(self) -> ImageAnalyzerPool:
+        with self._pools_lock:
+            if self._images is None:
+                self._images = ImageAnalyzerPool(self.cfg, workers=self.cfg.image_workers)
+            return self._images
+
+    def close(self) -> None:
+        if self._pipeline is not None:
+            self._pipeline.close()
+            self._pipeline = None
+        if self._images is not None:
+            self._images.close()
+            self._images = None
+        if self._batcher is not None:
+            self._batcher.close()
+            self._batcher = None
+        self.gallery.close()
+
+
+class _CachedVideoReplay:
+    """
+    Encodings de uma análise em cache durante a reprodução. Com tracking o
+    cache só tem os rostos que a execução original codificou; se a reprodução
+    pedir outro (o tracker decide pelo estado da galeria atual), o frame é lido
+    do vídeo e só os rostos que faltam são codificados.
+    """
+
+    def __init__(self, cached: VideoAnalysis, video_file: str):
+        self.cached = cached
+        self.video_file = video_file
+        self._cap = None
+
+    def encodings(self, pos: int, idx, encode) -> list:
+        missing = [i for i in idx if (pos, i) not in self.cached.encodings]
+        if missing:
+            frame_idx, _, locations = self.cached.frames[pos]
+            metrics.inc("cache_misses", kind="video_frame")
+            frame_rgb = self._read_frame(frame_idx)
+            self.cached.add_encodings(pos, missing, encode(frame_rgb, [locations[i] for i in missing]))
+        return [self.cached.encodings[(pos, i)] for i in idx]
+
+    def _read_frame(self, frame_idx: int) -> np.ndarray:
+        if self._cap is None:
+            self._cap = cv2.VideoCapture(self.video_file)
+        if not self._cap.isOpened():
+            raise RuntimeError(f"Não foi possível abrir o vídeo para completar o cache: {self.video_file}")
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+        ok, frame_bgr = self._cap.read()
+        frame_rgb = FaceService._bgr_to_rgb(frame_bgr) if ok else None
+        if frame_rgb is None:
+            raise RuntimeError(f"Frame {frame_idx} ilegível ao completar o cache: {self.video_file}")
+        return np.ascontiguousarray(frame_rgb, dtype=np.uint8)
+
+    def close(self) -> None:
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+@dataclass
+class _VideoRun:
+    """Estado de um process_video compartilhado entre os frames."""
+    media_id: int
+    video_path: str
+    result: VideoProcessingResult
+    tracker: Optional[IoUTracker]
+    max_age_frames: int
+    analysis: Optional[VideoAnalysis] = None   # o que vai para o cache de análise ao terminar
+    repeat: bool = False                       # reprodução do cache: não grava rostos já conhecidos
+    keep_hits: bool = True                     # False = streaming: hits do passo ficam só em `emitted`
+    emitted: List[VideoHit] = field(default_factory=list)
+    summary: Optional[VideoSummary] = None
+    hits: HitBuffer = field(default_factory=HitBuffer)   # hits do vídeo inteiro (modo não streaming)
+    segments: SegmentBuilder = field(default_factory=SegmentBuilder)
+    names: Dict[int, Optional[str]] = field(default_factory=dict)
+    unknown: Optional[UnknownFaceBuffer] = None   # desconhecidos ainda sem pessoa
+    deadline: Optional[DeadlineController] = None   # só em vídeos com prazo
+
+    def stream(self, keep_hits: bool, summary: Optional[VideoSummary]) -> None:
+        self.keep_hits = keep_hits
+        self.summary = summary
+        if summary is not None:
+            r = self.result
+            summary.fps, summary.frame_skip, summary.sampling = r.fps, r.frame_skip, r.sampling
 
-        cap.release()
-        return result
+    def add_hit(self, frame_index: int, timestamp_s: float, person_id: int, name: Optional[str], loc, distance: float,
+                raw: bool = True) -> None:
+        if name or person_id not in self.names:
+            self.names[person_id] = name
+        if self.summary is not None:
+            self.summary.add_hit(person_id, name, timestamp_s, distance)
+        if not raw:
+            return
+        if self.keep_hits:
+            self.hits.append(frame_index, timestamp_s, person_id, loc, distance)
+        else:
+            t, r, b, l = loc
+            self.emitted.append(VideoHit(
+                media_id=self.media_id, frame_index=frame_index, timestamp_s=timestamp_s,
+                match=MatchResult(person_id=person_id, name=name, distance=distance,
+                                  bbox=BBox(top=t, right=r, bottom=b, left=l)),
+            ))
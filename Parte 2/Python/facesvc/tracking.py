@@ -0,0 +1,101 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+Box = Tuple[int, int, int, int]  # (top, right, bottom, left), igual ao face_recognition
+
+
+def iou(a: Box, b: Box) -> float:
+    """Intersection-over-union de duas caixas (top, right, bottom, left)."""
+    at, ar, ab, al = a
+    bt, br, bb, bl = b
+    ih = min(ab, bb) - max(at, bt)
+    iw = min(ar, br) - max(al, bl)
+    if ih <= 0 or iw <= 0:
+        return 0.0
+    inter = ih * iw
+    union = (ab - at) * (ar - al) + (bb - bt) * (br - bl) - inter
+    return inter / union if union > 0 else 0.0
+
+
+@dataclass
+class Track:
+    track_id: int
+    bbox: Box
+    last_seen: int                  # último frame em que a caixa foi associada
+    person_id: Optional[int] = None
+    name: Optional[str] = None
+    distance: float = float("inf")
+    encoded_bbox: Optional[Box] = None
+    encoded_frame: int = -1         # último frame em que o rosto foi (re)codificado
+    missed: int = 0                 # frames amostrados seguidos sem detecção
+
+
+class IoUTracker:
+    """
+    Rastreador simples por IoU entre caixas de frames amostrados consecutivos.
+
+    A cada frame, cada detecção é associada (guloso, maior IoU primeiro) ao
+    track ativo com IoU >= `iou_threshold`; detecções sem par abrem tracks
+    novos, e tracks sem detecção por mais de `max_missed` frames amostrados
+    são encerrados. Frames sem rosto em geral nem chegam aqui, então a
+    ausência também é medida pelo salto de `frame_idx`: `frame_step` é a
+    distância, em frames do vídeo, entre dois frames amostrados.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_missed: int = 2, frame_step: int = 1):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.frame_step = max(1, int(frame_step))
+        self.tracks: List[Track] = []
+        self._next_id = 1
+
+    def update(self, frame_idx: int, boxes: Sequence[Box]) -> List[Track]:
+        """Associa as caixas do frame aos tracks; retorna o track de cada caixa, na mesma ordem."""
+        max_gap = (self.max_missed + 1) * self.frame_step
+        self.tracks = [tr for tr in self.tracks if frame_idx - tr.last_seen <= max_gap]
+        pairs = []
+        for ti, tr in enumerate(self.tracks):
+            for bi, box in enumerate(boxes):
+                score = iou(tr.bbox, box)
+                if score >= self.iou_threshold:
+                    pairs.append((score, ti, bi))
+        pairs.sort(reverse=True)
+
+        assigned: List[Optional[Track]] = [None] * len(boxes)
+        used_tracks = set()
+        for _, ti, bi in pairs:
+            if ti in used_tracks or assigned[bi] is not None:
+                continue
+            tr = self.tracks[ti]
+            tr.bbox = tuple(boxes[bi])
+            tr.last_seen = frame_idx
+            tr.missed = 0
+            assigned[bi] = tr
+            used_tracks.add(ti)
+
+        survivors = []
+        for ti, tr in enumerate(self.tracks):
+            if ti not in used_tracks:
+                tr.missed += 1
+                if tr.missed > self.max_missed:
+                    continue
+            survivors.append(tr)
+        self.tracks = survivors
+
+        for bi, box in enumerate(boxes):
+            if assigned[bi] is None:
+                tr = Track(track_id=self._next_id, bbox=tuple(box), last_seen=frame_idx)
+                self._next_id += 1
+                self.tracks.append(tr)
+                assigned[bi] = tr
+        return assigned
+
+    @staticmethod
+    def needs_encoding(tr: Track, frame_idx: int, reencode_iou: float, max_age_frames: int) -> bool:
+        """Track novo, caixa que mudou muito desde o último encoding, ou encoding vencido."""
+        if tr.person_id is None or tr.encoded_bbox is None:
+            return True
+        if iou(tr.bbox, tr.encoded_bbox) < reencode_iou:
+            return True
+        return max_age_frames > 0 and frame_idx - tr.encoded_frame >= max_age_frames
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Comandos offline de manutenção do banco de rostos.
+
+    python manage.py compact [--max-prototypes 8] [--radius 0.35] [--dry-run]
+    python manage.py merge-unknown [--radius 0.5] [--threshold 0.6] [--min-overlap 0.5] [--dry-run]
+"""
+import argparse
+import json
+
+from facesvc.clustering import merge_anonymous_people
+from facesvc.compaction import compact_faces
+from facesvc.repo import FaceRepository
+from worker import open_face_repo
+
+
+def cmd_compact(repo: FaceRepository, args) -> dict:
+    report = compact_faces(
+        repo,
+        max_prototypes=args.max_prototypes,
+        radius=args.radius,
+        dry_run=args.dry_run,
+        vacuum=not args.no_vacuum,
+    )
+    return report.to_dict()
+
+
+def cmd_merge_unknown(repo: FaceRepository, args) -> dict:
+    report = merge_anonymous_people(
+        repo,
+        radius=args.radius,
+        threshold=args.threshold,
+        min_overlap=args.min_overlap,
+        dry_run=args.dry_run,
+    )
+    return report.to_dict()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("compact", help="reduz cada pessoa a centróide + exemplares diversos")
+    p.add_argument("--max-prototypes", type=int, default=8)
+    p.add_argument("--radius", type=float, default=0.35)
+    p.add_argument("--dry-run", action="store_true", help="só calcula o relatório, sem alterar o banco")
+    p.add_argument("--no-vacuum", action="store_true", help="não roda VACUUM depois de compactar")
+    p.set_defaults(func=cmd_compact)
+
+    p = sub.add_parser("merge-unknown", help="funde pessoas anônimas cujos rostos se sobrepõem")
+    p.add_argument("--radius", type=float, default=0.5, help="distância máxima entre os centróides")
+    p.add_argument("--threshold", type=float, default=0.6, help="distância de match entre rostos")
+    p.add_argument("--min-overlap", type=float, default=0.5, help="fração mínima de rostos com match na outra pessoa")
+    p.add_argument("--dry-run", action="store_true", help="só lista as fusões, sem alterar o banco")
+    p.set_defaults(func=cmd_merge_unknown)
+
+    args = ap.parse_args()
+    repo, _ = open_face_repo()
+    try:
+        print(json.dumps(args.func(repo, args), indent=2))
+    finally:
+        repo.close()
+
+
+if __name__ == "__main__":
+    main()
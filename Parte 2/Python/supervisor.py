@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Supervisor dos workers: carrega e aquece os modelos do dlib uma vez e faz
+fork de WORKER_PROCESSES workers já prontos, que compartilham essas páginas
+(copy-on-write) em vez de cada um importar e carregar tudo de novo.
+
+Um worker que morre é substituído por outro fork do mesmo pai aquecido, sem
+pagar a partida a frio. SIGTERM/SIGINT são repassados aos workers.
+
+    python supervisor.py
+
+Só funciona onde há os.fork (Linux/macOS); no resto, rode worker.py direto.
+"""
+import time
+T0 = time.perf_counter()
+
+import gc
+import os
+import signal
+from typing import Dict
+
+from loguru import logger
+
+import worker
+from facesvc.detection import warm_up
+
+WORKER_PROCESSES = max(1, int(os.getenv("WORKER_PROCESSES", "2")))
+WORKER_RESTART_BACKOFF_S = float(os.getenv("WORKER_RESTART_BACKOFF_S", "5"))
+
+
+def prepare() -> None:
+    """
+    No pai, antes dos forks: modelos carregados e exercitados, e snapshot da
+    galeria publicado para os filhos só mapearem. Nada de conexões, threads
+    ou trava de publicador fica aberto para ser herdado.
+    """
+    svc = worker.open_service()
+    try:
+        warm = warm_up(svc.cfg)
+        svc.gallery.reload()
+    finally:
+        svc.close()
+        svc.repo.close()
+    logger.info(f"Modelos aquecidos em {warm:.2f}s | pai pronto em {time.perf_counter() - T0:.2f}s")
+
+
+def spawn(slot: int) -> int:
+    """Faz fork de um worker; no filho, nunca retorna."""
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 0
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        worker.PROCESS_T0 = time.perf_counter()
+        if worker.WORKER_ID:
+            # id novo a cada fork: a lista de processamento do filho morto fica para o reap
+            worker.WORKER_ID = f"{worker.WORKER_ID}-{slot}-{os.getpid()}"
+        if worker.METRICS_PORT:
+            worker.METRICS_PORT += slot
+        if worker.METRICS_JSON_PATH:
+            worker.METRICS_JSON_PATH = f"{worker.METRICS_JSON_PATH}.{slot}"
+        worker.main()
+    except KeyboardInterrupt:
+        pass
+    except BaseException as e:
+        logger.exception(f"Worker {slot} falhou: {e}")
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def main() -> None:
+    if not hasattr(os, "fork"):
+        raise SystemExit("supervisor.py precisa de os.fork; rode worker.py diretamente")
+    prepare()
+    # objetos do pai fora do coletor: o GC dos filhos não os toca e as páginas continuam compartilhadas
+    gc.freeze()
+
+    children: Dict[int, int] = {}   # pid -> slot
+    stopping = False
+
+    def stop(signum, _frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(WORKER_PROCESSES):
+        children[spawn(slot)] = slot
+    logger.info(f"Supervisor iniciado | workers={WORKER_PROCESSES} pids={sorted(children)}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        slot = children.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        logger.warning(
+            f"Worker {slot} (pid {pid}) saiu com código {os.waitstatus_to_exitcode(status)}; "
+            f"novo fork em {WORKER_RESTART_BACKOFF_S:g}s"
+        )
+        time.sleep(WORKER_RESTART_BACKOFF_S)
+        if not stopping:
+            children[spawn(slot)] = slot
+    logger.info("Supervisor encerrado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Fixtures dos testes do worker: banco SQLite com o esquema das migrations do
+Laravel, vídeo sintético em storage/app/public e um detector determinístico
+no lugar do face_recognition (tests/stubs/face_recognition: um rosto por
+quadrado colorido; o encoding é a cor média), para os testes não dependerem
+do dlib nem de fotos reais.
+
+    cd Python && python -m pytest -q tests
+"""
+from __future__ import annotations
+import sqlite3
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+PYTHON_DIR = Path(__file__).resolve().parents[1]
+STUBS_DIR = Path(__file__).resolve().parent / "stubs"
+# stubs/ na frente: o face_recognition de mentira ganha do instalado, também
+# nos processos `spawn` dos pools (que herdam o sys.path do pai)
+for path in (PYTHON_DIR, STUBS_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from face_recognition import BOX, SIZE  # noqa: E402
+from facesvc import detection  # noqa: E402
+from facesvc.config import RecognizerConfig  # noqa: E402
+from facesvc.db_sqlite import FaceRepo  # noqa: E402
+from facesvc.service import FaceService  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE people (id INTEGER PRIMARY KEY AUTOINCREMENT, name VARCHAR, thumbnail_path VARCHAR,
+                     created_at DATETIME, updated_at DATETIME);
+CREATE TABLE faces (id INTEGER PRIMARY KEY AUTOINCREMENT, person_id INTEGER NOT NULL, encoding BLOB NOT NULL,
+                    source VARCHAR, created_at DATETIME, updated_at DATETIME);
+CREATE TABLE video_hits (id INTEGER PRIMARY KEY AUTOINCREMENT, media_id INTEGER NOT NULL, person_id INTEGER NOT NULL,
+                         frame_index INTEGER NOT NULL, timestamp_s NUMERIC NOT NULL, left INTEGER NOT NULL,
+                         top INTEGER NOT NULL, right INTEGER NOT NULL, bottom INTEGER NOT NULL, distance FLOAT NOT NULL,
+                         created_at DATETIME, updated_at DATETIME);
+CREATE TABLE video_segments (id INTEGER PRIMARY KEY AUTOINCREMENT, media_id INTEGER NOT NULL,
+                             person_id INTEGER NOT NULL, start_frame INTEGER NOT NULL, end_frame INTEGER NOT NULL,
+                             start_s NUMERIC NOT NULL, end_s NUMERIC NOT NULL, hits INTEGER NOT NULL,
+                             best_distance FLOAT NOT NULL, left INTEGER NOT NULL, top INTEGER NOT NULL,
+                             right INTEGER NOT NULL, bottom INTEGER NOT NULL, created_at DATETIME, updated_at DATETIME);
+"""
+
+
+@pytest.fixture
+def fake_detector():
+    fr = detection._fr()
+    assert Path(fr.__file__).parent.parent == STUBS_DIR
+    return fr
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Raiz com storage/app/public; o cwd é Python/, como no worker (caminhos `../storage/...`)."""
+    (tmp_path / "storage" / "app" / "public").mkdir(parents=True)
+    (tmp_path / "Python").mkdir()
+    monkeypatch.chdir(tmp_path / "Python")
+    return tmp_path
+
+
+def write_video(root: Path, name: str, colors, fps: float = 25.0) -> str:
+    """Um trecho de 1 s por cor; None = frames pretos (sem rosto)."""
+    out = cv2.VideoWriter(str(root / "storage" / "app" / "public" / name), cv2.VideoWriter_fourcc(*"mp4v"),
+                          fps, (SIZE[1], SIZE[0]))
+    t, r, b, l = BOX
+    for color in colors:
+        frame = np.zeros((SIZE[0], SIZE[1], 3), np.uint8)
+        if color is not None:
+            frame[t:b, l:r] = color
+        for _ in range(int(fps)):
+            out.write(frame)
+    out.release()
+    return name
+
+
+@pytest.fixture
+def video(workdir):
+    return write_video(workdir, "v.mp4", [(200, 40, 40), (200, 40, 40), (40, 200, 40), (40, 40, 200)])
+
+
+@pytest.fixture
+def db_path(workdir):
+    path = workdir / "faces.sqlite"
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.close()
+    return str(path)
+
+
+@pytest.fixture
+def service(db_path, workdir, fake_detector):
+    repo = FaceRepo(db_path)
+    svc = FaceService(repo, RecognizerConfig(index_path=str(workdir / "faces.flat-index.npz")))
+    yield svc
+    svc.close()
+    repo.close()
+
+
+def count_rows(db_path: str, table: str, media_id: int) -> int:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE media_id=?", (media_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def new_service(workdir: Path, name: str, **cfg) -> FaceService:
+    """Serviço com banco e índice próprios, para cada configuração partir da mesma galeria vazia."""
+    path = workdir / f"{name}.sqlite"
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.close()
+    return FaceService(FaceRepo(str(path)), RecognizerConfig(index_path=str(workdir / f"{name}.npz"), **cfg))
+
+
+def close(svc: FaceService) -> None:
+    svc.close()
+    svc.repo.close()
@@ -0,0 +1,30 @@
+"""
+face_recognition de mentira para os testes: um "rosto" é o retângulo BOX
+(proporcional ao tamanho da imagem) quando não está preto, e o encoding é a
+cor média dele. É um pacote de verdade no sys.path, e não um monkeypatch,
+para valer também nos processos `spawn` dos pools de vídeo e de fotos.
+"""
+import cv2
+import numpy as np
+
+SIZE = (240, 320)              # (altura, largura) dos frames sintéticos
+BOX = (60, 160, 120, 100)      # (top, right, bottom, left) do "rosto"
+
+
+def face_locations(image, number_of_times_to_upsample=1, model="hog"):
+    h, w = image.shape[:2]
+    t, r, b, l = (int(v * h / SIZE[0]) if i % 2 == 0 else int(v * w / SIZE[1]) for i, v in enumerate(BOX))
+    return [(t, r, b, l)] if image[t:b, l:r].mean() > 10 else []
+
+
+def batch_face_locations(images, number_of_times_to_upsample=1, batch_size=128):
+    return [face_locations(image) for image in images]
+
+
+def face_encodings(face_image, known_face_locations=None, num_jitters=1, model="small"):
+    return [np.resize(face_image[t:b, l:r].reshape(-1, 3).mean(axis=0) / 255.0, 128)
+            for t, r, b, l in known_face_locations]
+
+
+def load_image_file(file, mode="RGB"):
+    return cv2.cvtColor(cv2.imread(file), cv2.COLOR_BGR2RGB)
@@ -0,0 +1,42 @@
+from facesvc.config import RecognizerConfig
+from facesvc.db_sqlite import FaceRepo
+from facesvc.metrics import metrics
+from facesvc.service import FaceService
+
+from conftest import count_rows
+
+
+def video_frame_misses() -> int:
+    counters = metrics.snapshot()["counters"]
+    return sum(c["value"] for c in counters if c["name"] == "cache_misses" and c["labels"].get("kind") == "video_frame")
+
+
+def test_replay_encodes_faces_missing_from_cache(workdir, db_path, video, fake_detector, monkeypatch):
+    repo = FaceRepo(db_path)
+    cfg = RecognizerConfig(track=True, unknown_min_faces=1, cache_dir=str(workdir / "cache"),
+                           index_path=str(workdir / "faces.flat-index.npz"))
+    svc = FaceService(repo, cfg)
+    try:
+        svc.process_video(1, video, frame_skip=5)       # grava a análise no cache
+        full = svc.process_video(2, video, frame_skip=5)
+
+        # entrada de cache gravada por uma execução que codificou menos rostos
+        get_video = svc.cache.get_video
+
+        def partial(key):
+            cached = get_video(key)
+            for k in list(cached.encodings)[::2]:
+                del cached.encodings[k]
+            return cached
+
+        monkeypatch.setattr(svc.cache, "get_video", partial)
+        misses = video_frame_misses()
+        replay = svc.process_video(3, video, frame_skip=5)
+    finally:
+        svc.close()
+        repo.close()
+
+    assert video_frame_misses() > misses
+    assert [(h.frame_index, h.match.person_id) for h in replay.hits] == \
+        [(h.frame_index, h.match.person_id) for h in full.hits]
+    assert count_rows(db_path, "video_hits", 3) == count_rows(db_path, "video_hits", 2) > 0
@@ -0,0 +1,53 @@
+import sys
+import threading
+
+import pytest
+
+from facesvc.chunking import ChunkCoordinator
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def coordinator(server) -> ChunkCoordinator:
+    return ChunkCoordinator(fakeredis.FakeRedis(server=server, decode_responses=True), "q")
+
+
+def test_only_one_worker_claims_a_chunk(server):
+    # troca de thread quase a cada instrução: força as intercalações entre ler e gravar o estado
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    workers = [coordinator(server) for _ in range(4)]
+    n = 100
+    workers[0].create(1, [(float(i), float(i + 1)) for i in range(n)], {"path": "v.mp4"})
+    claimed = [[] for _ in workers]
+    barrier = threading.Barrier(len(workers))
+
+    def run(k):
+        barrier.wait()
+        for step in range(n):
+            if workers[k].claim(1, step):
+                claimed[k].append(step)
+
+    threads = [threading.Thread(target=run, args=(k,)) for k in range(len(workers))]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert sorted(s for steps in claimed for s in steps) == list(range(n))
+
+
+def test_expired_lease_is_claimed_once(server):
+    a, b = coordinator(server), coordinator(server)
+    a.create(1, [(0.0, 1.0)], {"path": "v.mp4"})
+    assert a.claim(1, 0)
+    a.r.hset(a._key(1), "lease:0", 0)   # worker a morreu: lease vencido
+    assert b.claim(1, 0)
+    assert not a.claim(1, 0)
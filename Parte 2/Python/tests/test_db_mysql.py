@@ -0,0 +1,104 @@
+import mysql.connector
+import pytest
+
+from facesvc.db import FaceRepo
+
+
+class StubCursor:
+    def __init__(self, cnx):
+        self.cnx = cnx
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        if self.cnx.fail:
+            self.cnx.alive = False
+            raise self.cnx.fail
+        self.cnx.statements.append(sql)
+        self.lastrowid = 7
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class StubConnection:
+    """Conexão do mysql.connector reduzida ao que o FaceRepo usa."""
+    def __init__(self, fail=None):
+        self.fail = fail
+        self.alive = True
+        self.closed = False
+        self.statements = []
+
+    def cursor(self, prepared=False):
+        return StubCursor(self)
+
+    def is_connected(self):
+        return self.alive and not self.closed
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    """FaceRepo cujas conexões novas saem, em ordem, de `repo.stubs`."""
+    repo = FaceRepo(pool_size=2)
+    repo.stubs = []
+    repo.opened = []
+
+    def connect():
+        cnx = repo.stubs.pop(0) if repo.stubs else StubConnection()
+        repo.opened.append(cnx)
+        return cnx
+
+    monkeypatch.setattr(repo, "_connect", connect)
+    return repo
+
+
+def dropped():
+    return StubConnection(fail=mysql.connector.errors.OperationalError("MySQL server has gone away"))
+
+
+def test_dropped_connection_is_retried_once_on_a_new_one(repo):
+    repo.stubs = [dropped()]
+    assert repo._execute("UPDATE people SET name=%s WHERE id=%s", ("a", 1)) == 7
+    first, second = repo.opened
+    assert first.closed and first not in repo._open          # a conexão quebrada foi descartada
+    assert second.statements == ["UPDATE people SET name=%s WHERE id=%s"]
+
+    assert repo._query("SELECT 1") == [(1,)]
+    assert len(repo.opened) == 2                               # a conexão boa voltou para o pool
+
+
+def test_second_drop_is_raised(repo):
+    repo.stubs = [dropped(), dropped()]
+    with pytest.raises(mysql.connector.errors.OperationalError):
+        repo._query("SELECT 1")
+    assert len(repo.opened) == 2 and repo._open == []
+
+
+def test_close_closes_every_open_connection(repo):
+    with repo._connection() as a, repo._connection() as b:
+        pass
+    assert not a.closed and not b.closed
+    repo.close()
+    assert a.closed and b.closed and repo._open == []
+
+
+def test_delete_video_hits_without_hits_table(repo):
+    repo.stubs = [StubConnection(fail=mysql.connector.errors.ProgrammingError(
+        msg="Table 'laravel.video_hits' doesn't exist", errno=1146))]
+    repo._has_segments_table = False
+    repo.delete_video_hits(5)
+    assert repo._has_hits_table is False
+    repo.delete_video_hits(5)   # sem a tabela não tenta de novo
+    assert repo.opened[0].statements == []
+
+
+def test_delete_video_hits_raises_other_errors(repo):
+    repo.stubs = [StubConnection(fail=mysql.connector.errors.ProgrammingError(msg="syntax", errno=1064))]
+    with pytest.raises(mysql.connector.errors.ProgrammingError):
+        repo.delete_video_hits(5)
+    assert repo._has_hits_table is True
@@ -0,0 +1,44 @@
+import sqlite3
+
+import pytest
+
+from facesvc.db_sqlite import FaceRepo
+
+from conftest import count_rows
+
+
+def record(repo: FaceRepo, media_id: int) -> None:
+    repo.record_video_hit(media_id, 1, 0, 0.0, (10, 20, 30, 0), 0.3)
+    repo.record_video_segment(media_id, 1, 0, 5, 0.0, 0.2, 2, 0.3, (10, 20, 30, 0))
+
+
+def test_locked_database_keeps_buffered_rows(db_path):
+    repo = FaceRepo(db_path, batch_rows=1000, batch_ms=1e9)
+    repo._writer.execute("PRAGMA busy_timeout=50")
+    record(repo, 1)
+    other = sqlite3.connect(db_path)
+    other.execute("BEGIN EXCLUSIVE")
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            repo.flush()
+    finally:
+        other.rollback()
+        other.close()
+    assert repo._has_hits_table and repo._has_segments_table
+
+    repo.flush()
+    assert count_rows(db_path, "video_hits", 1) == 1
+    assert count_rows(db_path, "video_segments", 1) == 1
+    repo.close()
+
+
+def test_missing_optional_table_is_disabled(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("DROP TABLE video_segments")
+    conn.close()
+    repo = FaceRepo(db_path, batch_rows=1000, batch_ms=1e9)
+    record(repo, 1)
+    repo.flush()
+    assert repo._has_hits_table and not repo._has_segments_table
+    assert count_rows(db_path, "video_hits", 1) == 1
+    repo.close()
@@ -0,0 +1,46 @@
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from facesvc.detection import encode_faces, encode_faces_batch
+
+from conftest import BOX, SIZE
+
+
+def images():
+    t, r, b, l = BOX
+    out = []
+    for color in [(200, 40, 40), None, (40, 200, 40)]:
+        image = np.zeros((SIZE[0], SIZE[1], 3), np.uint8)
+        if color is not None:
+            image[t:b, l:r] = color
+        out.append(image)
+    return out, [[BOX], [], [BOX]]
+
+
+def no_batch_api(monkeypatch, fr):
+    """O stub não tem face_recognition.api (nem o dlib está instalado)."""
+
+
+def broken_dlib(monkeypatch, fr):
+    """dlib e face_recognition.api presentes, mas o descritor em lote falha como o dlib falha."""
+    def compute_face_descriptor(*args):
+        raise RuntimeError("Error while calling cudaMalloc")
+
+    monkeypatch.setitem(sys.modules, "dlib", SimpleNamespace(full_object_detections=list))
+    monkeypatch.setattr(fr, "api", SimpleNamespace(
+        _raw_face_landmarks=lambda img, locs, model="small": list(locs),
+        face_encoder=SimpleNamespace(compute_face_descriptor=compute_face_descriptor),
+    ), raising=False)
+
+
+@pytest.mark.parametrize("setup", [no_batch_api, broken_dlib])
+def test_batch_falls_back_to_per_image_encodings(fake_detector, monkeypatch, setup):
+    setup(monkeypatch, fake_detector)
+    imgs, locations = images()
+    batched = encode_faces_batch(imgs, locations)
+    expected = [encode_faces(img, locs) if locs else [] for img, locs in zip(imgs, locations)]
+    assert [len(encs) for encs in batched] == [1, 0, 1]
+    assert all(np.array_equal(a, b) for got, exp in zip(batched, expected) for a, b in zip(got, exp))
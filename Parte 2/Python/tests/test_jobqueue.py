@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+import worker
+from facesvc.chunking import ChunkCoordinator
+from facesvc.jobqueue import ReliableQueue
+from facesvc.scheduling import PriorityQueue, parse_classes
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def r():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_reap_requeues_orphans_and_returns_dead_lettered(r):
+    dead = ReliableQueue(r, "q", worker_id="morto", max_attempts=3)
+    alive = ReliableQueue(r, "q", worker_id="vivo", max_attempts=3)
+    r.rpush("q", json.dumps({"media_id": 1, "attempts": 2}), json.dumps({"media_id": 2}))
+    dead.heartbeat()
+    assert dead.pop(timeout=1) and dead.pop(timeout=1)
+    r.delete(dead._heartbeat_key("morto"))   # o worker morreu sem renovar o heartbeat
+
+    failed = alive.reap()
+
+    assert [json.loads(raw)["media_id"] for raw in failed] == [1]
+    assert r.llen("q:processing:morto") == 0
+    assert r.llen("q:dead") == 1
+    assert [json.loads(raw)["media_id"] for raw in r.zrange("q:delayed", 0, -1)] == [2]
+
+
+def test_dead_lettered_orphan_gets_failed_callback(r, monkeypatch):
+    posted = []
+    monkeypatch.setattr(worker, "post_processed", lambda media_id, out: posted.append((media_id, out["status"])))
+    dead = ReliableQueue(r, "q", worker_id="morto", max_attempts=1)
+    r.rpush("q", json.dumps({"media_id": 7}), json.dumps({"media_id": 8, "chunk": 0}))
+    dead.heartbeat()
+    dead.pop(timeout=1), dead.pop(timeout=1)
+    r.delete(dead._heartbeat_key("morto"))
+
+    for raw in ReliableQueue(r, "q", worker_id="vivo", max_attempts=1).reap():
+        worker.notify_failed(raw, "worker parou de responder")
+
+    # pedaços de vídeo ficam com o ChunkCoordinator, que falha a mídia inteira
+    assert posted == [(7, "failed")]
+
+
+
+def single_queue(r):
+    return ReliableQueue(r, "q", worker_id="w"), "q"
+
+
+def class_queue(r):
+    return PriorityQueue(r, "q", parse_classes("photo:8", "q"), worker_id="w"), "q:photo"
+
+
+@pytest.mark.parametrize("make", [single_queue, class_queue])
+def test_jobs_come_out_in_arrival_order(r, make):
+    queue, key = make(r)
+    for media_id in range(3):
+        r.rpush(key, json.dumps({"media_id": media_id}))   # como o pushRaw do Laravel
+    assert [json.loads(queue.pop(timeout=1))["media_id"] for _ in range(3)] == [0, 1, 2]
+
+
+@pytest.mark.parametrize("make", [single_queue, class_queue])
+def test_order_is_kept_without_lmove(r, make, monkeypatch):
+    queue, key = make(r)
+    queue._use_blmove = queue._use_lmove = False   # Redis < 6.2: o script LPOP + LPUSH
+    scripted = []
+    monkeypatch.setattr(r, "eval", lambda script, n, src, dst: scripted.append(src) or r.lmove(src, dst, "LEFT", "LEFT"))
+    for media_id in range(3):
+        r.rpush(key, json.dumps({"media_id": media_id}))
+    assert [json.loads(queue.pop(timeout=1))["media_id"] for _ in range(3)] == [0, 1, 2]
+    assert scripted == [key] * 3
+    assert queue.pop(timeout=0.3) is None
+
+
+def test_chunks_come_out_in_order(r):
+    ChunkCoordinator(r, "q").create(9, [(0.0, 10.0), (10.0, 20.0), (20.0, None)], {})
+    queue = ReliableQueue(r, "q", worker_id="w")
+    assert [json.loads(queue.pop(timeout=1))["chunk"] for _ in range(3)] == [0, 1, 2]
@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+import pytest
+
+from facesvc.models import VideoSummary
+
+from conftest import BOX, SIZE, close, new_service, write_video
+
+
+def process_video(workdir, video: str, name: str, **cfg):
+    svc = new_service(workdir, name, **cfg)
+    try:
+        result = svc.process_video(1, video, frame_skip=3)
+    finally:
+        close(svc)
+    hits = [(h.frame_index, h.timestamp_s, h.match.person_id, h.match.bbox, h.match.distance) for h in result.hits]
+    return hits, result.segments
+
+
+@pytest.fixture
+def clip(workdir):
+    return write_video(workdir, "clip.mp4", [(200, 40, 40), None, (40, 200, 40), (200, 40, 40), (40, 40, 200)])
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+@pytest.mark.parametrize("extra", [{}, {"track": True}, {"detect_scale": 0.5}, {"track": True, "detect_scale": 0.5}])
+def test_parallel_video_matches_sequential(workdir, clip, fake_detector, workers, extra):
+    expected = process_video(workdir, clip, "seq", **extra)
+    assert expected[0] and expected[1]
+    assert process_video(workdir, clip, "par", video_workers=workers, **extra) == expected
+
+
+def test_image_pool_matches_sequential(workdir, fake_detector):
+    t, r, b, l = BOX
+    images = []
+    for i, color in enumerate([(200, 40, 40), (40, 200, 40), (0, 0, 0), (200, 40, 40)]):
+        image = np.zeros((SIZE[0], SIZE[1], 3), np.uint8)
+        image[t:b, l:r] = color
+        cv2.imwrite(str(workdir / "storage" / "app" / "public" / f"{i}.png"), image)
+        images.append(f"{i}.png")
+
+    def detections(name, **cfg):
+        svc = new_service(workdir, name, **cfg)
+        try:
+            return [svc.process_image(i, path).detections for i, path in enumerate(images)]
+        finally:
+            close(svc)
+
+    expected = detections("seq")
+    assert sum(map(len, expected)) == 3
+    assert detections("pool", image_workers=2) == expected
+
+
+@pytest.mark.parametrize("cfg", [{}, {"detect_batch": 4}, {"video_workers": 2}])
+def test_progress_reaches_end_of_faceless_tail(workdir, fake_detector, cfg):
+    clip = write_video(workdir, "tail.mp4", [(200, 40, 40), None, None, None])   # 1 s de rosto + 3 s pretos
+    svc = new_service(workdir, "tail", **cfg)
+    summary = VideoSummary(media_id=1, media_path=clip)
+    try:
+        for _ in svc.stream_video(1, clip, frame_skip=3, summary=summary):
+            pass
+    finally:
+        close(svc)
+    assert summary.hits > 0
+    assert summary.position_s == pytest.approx(3.84)
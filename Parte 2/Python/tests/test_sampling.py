@@ -0,0 +1,32 @@
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+from facesvc import sampling
+
+
+def test_ffmpeg_without_pts_raises_and_stops_the_process(tmp_path, monkeypatch):
+    # "ffmpeg" que entrega um frame no stdout e trava sem imprimir o showinfo
+    pid_file = tmp_path / "pid"
+    fake = tmp_path / "ffmpeg"
+    fake.write_text(
+        f"#!{sys.executable}\n"
+        "import os, sys, time\n"
+        f"open({str(pid_file)!r}, 'w').write(str(os.getpid()))\n"
+        "sys.stdout.buffer.write(bytes(4 * 2 * 3)); sys.stdout.flush()\n"
+        "time.sleep(60)\n"
+    )
+    fake.chmod(fake.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(sampling, "FFMPEG_BIN", str(fake))
+    monkeypatch.setattr(sampling, "FFMPEG_PTS_TIMEOUT_S", 0.3)
+
+    frames = sampling._sample_ffmpeg("v.mp4", 25.0, 4, 2, input_args=[], filters=[])
+    t0 = time.monotonic()
+    with pytest.raises(RuntimeError, match="timestamp"):
+        next(frames)
+    assert time.monotonic() - t0 < 10
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
@@ -0,0 +1,34 @@
+from facesvc.config import RecognizerConfig
+from facesvc.db_sqlite import FaceRepo
+from facesvc.service import FaceService
+from facesvc.tracking import IoUTracker
+
+from conftest import write_video
+
+BOX = (60, 160, 120, 100)
+
+
+def test_track_expires_across_a_gap_without_detections():
+    tracker = IoUTracker(max_missed=2, frame_step=6)
+    (first,) = tracker.update(0, [BOX])
+    (same,) = tracker.update(18, [BOX])       # 2 frames amostrados sem rosto no meio
+    (later,) = tracker.update(18 + 24, [BOX])  # 3 sem rosto: o track já tinha vencido
+    assert same is first
+    assert later is not first
+
+
+def test_new_face_after_empty_stretch_is_reencoded(workdir, db_path, fake_detector):
+    video = write_video(workdir, "gap.mp4", [(200, 40, 40), None, None, (40, 40, 200)])
+    repo = FaceRepo(db_path)
+    cfg = RecognizerConfig(track=True, track_reencode_s=10.0, unknown_min_faces=1,
+                           index_path=str(workdir / "faces.flat-index.npz"))
+    svc = FaceService(repo, cfg)
+    try:
+        res = svc.process_video(1, video, frame_skip=5)
+    finally:
+        svc.close()
+        repo.close()
+    before = {h.match.person_id for h in res.hits if h.timestamp_s < 1.0}
+    after = {h.match.person_id for h in res.hits if h.timestamp_s >= 3.0}
+    assert len(before) == 1 and len(after) == 1
+    assert before != after
@@ -0,0 +1,43 @@
+import pytest
+
+from facesvc.metrics import metrics
+
+from conftest import close, new_service, write_video
+
+RED, BLUE = (200, 40, 40), (40, 40, 200)
+
+
+def dropped_faces() -> int:
+    return sum(c["value"] for c in metrics.snapshot()["counters"] if c["name"] == "unknown_faces_dropped")
+
+
+@pytest.fixture
+def clip(workdir):
+    # um frame amostrado por segundo: vermelho em 0 s e 1 s; azul em 2 s e de novo só em 5 s
+    return write_video(workdir, "unknown.mp4", [RED, RED, BLUE, None, None, BLUE])
+
+
+def test_clusters_promote_and_expire(workdir, clip, fake_detector):
+    svc = new_service(workdir, "unknown", unknown_min_faces=2, unknown_ttl_s=1.5)
+    before = dropped_faces()
+    try:
+        result = svc.process_video(1, clip, frame_skip=24)
+    finally:
+        close(svc)
+    # vermelho juntou 2 rostos e virou pessoa, com os dois hits que esperavam;
+    # o azul de 2 s expirou antes do de 5 s, que sobrou sozinho no fim do vídeo
+    assert len(result.new_person_ids) == 1
+    assert [(h.timestamp_s, h.match.person_id) for h in result.hits] == [(0.0, result.new_person_ids[0]),
+                                                                         (1.0, result.new_person_ids[0])]
+    assert dropped_faces() - before == 2
+
+
+def test_clustering_is_off_by_default(workdir, clip, fake_detector):
+    svc = new_service(workdir, "default")
+    try:
+        result = svc.process_video(1, clip, frame_skip=24)
+    finally:
+        close(svc)
+    assert svc.cfg.unknown_min_faces == 1
+    assert len(result.new_person_ids) == 2
+    assert len(result.hits) == 4
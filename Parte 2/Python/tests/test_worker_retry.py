@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import worker
+from facesvc import service as service_module
+
+from conftest import count_rows
+
+
+class Crash(RuntimeError):
+    pass
+
+
+@pytest.fixture
+def callbacks(monkeypatch, video):
+    posted = []
+    monkeypatch.setattr(worker, "fetch_media", lambda media_id: {"type": "video", "path": video, "meta": {}})
+    monkeypatch.setattr(worker, "post_processed", lambda media_id, out: posted.append((media_id, out)))
+    monkeypatch.setattr(worker, "post_progress", lambda media_id, summary: None)
+    return posted
+
+
+def crash_after(monkeypatch, frames: int) -> None:
+    """A próxima amostragem de frames falha depois de `frames` frames (as seguintes seguem normais)."""
+    original = service_module.sample_frames
+    state = {"armed": True}
+
+    def sample_frames(*args, **kwargs):
+        armed, state["armed"] = state["armed"], False
+        for i, item in enumerate(original(*args, **kwargs)):
+            if armed and i == frames:
+                raise Crash("decodificação interrompida")
+            yield item
+
+    monkeypatch.setattr(service_module, "sample_frames", sample_frames)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_retried_video_job_does_not_duplicate_rows(service, db_path, callbacks, monkeypatch, stream):
+    monkeypatch.setattr(worker, "VIDEO_STREAM", stream)
+    monkeypatch.setattr(worker, "VIDEO_CHUNK_S", 0)
+
+    worker.handle_job(service, None, json.dumps({"media_id": 1}))
+    expected = count_rows(db_path, "video_hits", 1), count_rows(db_path, "video_segments", 1)
+    assert expected[0] > 0 and expected[1] > 0
+
+    crash_after(monkeypatch, 12)
+    with pytest.raises(Crash):
+        worker.handle_job(service, None, json.dumps({"media_id": 2}))
+    assert count_rows(db_path, "video_hits", 2) > 0   # a tentativa que falhou chegou a gravar
+
+    worker.handle_job(service, None, json.dumps({"media_id": 2, "attempts": 1}))
+    assert (count_rows(db_path, "video_hits", 2), count_rows(db_path, "video_segments", 2)) == expected
+    assert [media_id for media_id, _ in callbacks] == [1, 2]
@@ -1,15 +1,25 @@
 #!/usr/bin/env python3
+import time
+PROCESS_T0 = time.perf_counter()  # antes dos imports pesados: base do tempo de partida até o primeiro job
+
 import os
 import json
-import time
-from typing import Any, Dict
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
 
 import redis
 import requests
 from loguru import logger
 
+from facesvc.chunking import MERGE, ChunkCoordinator, merge_chunk_results, plan_chunks
 from facesvc.config import RecognizerConfig
-from facesvc.db_sqlite import FaceRepo
+from facesvc.detection import warm_up
+from facesvc.jobqueue import ReliableQueue
+from facesvc.metrics import metrics
+from facesvc.models import VideoSummary
+from facesvc.repo import FaceRepository, open_repo
+from facesvc.scheduling import DEFAULT_CLASS, PriorityQueue, class_key, parse_classes, queued_at
 from facesvc.service import FaceService
 
 from pathlib import Path
@@ -54,28 +64,100 @@ def resolve_sqlite_path() -> str:
     return str((PROJECT_ROOT / p).resolve())
 
 
+def open_face_repo(**kwargs) -> Tuple[FaceRepository, str]:
+    """
+    Abre o repositório escolhido por FACE_DB. Retorna também a base do nome
+    do índice salvo da galeria (ao lado do SQLite, ou em Python/ para MySQL).
+    """
+    if FACE_DB == "sqlite":
+        sqlite_path = resolve_sqlite_path()
+        logger.info(f"Usando SQLite em: {sqlite_path}")
+        return open_repo("sqlite", sqlite_path=sqlite_path, **kwargs), sqlite_path
+    database = os.getenv("DB_DATABASE", "laravel")
+    logger.info(f"Usando MySQL em: {os.getenv('DB_HOST', '127.0.0.1')}/{database} | pool={DB_POOL_SIZE}")
+    return open_repo(FACE_DB, pool_size=DB_POOL_SIZE, **kwargs), str(BASE_DIR / f"{FACE_DB}-{database}")
+
+
 # ------------------------
 # Configuração via env
 # ------------------------
 REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
 QUEUE_KEY = os.getenv("LARAVEL_QUEUE_KEY", "queues:face")  # ex.: queues:default
+QUEUE_CLASSES = os.getenv("QUEUE_CLASSES", "photo:8,short:3,long:1").strip()  # classe:peso; vazio = só QUEUE_KEY
+WORKER_CLASSES = [c.strip() for c in os.getenv("WORKER_CLASSES", "").split(",") if c.strip()]  # vazio = todas
+QUEUE_AGING_S = float(os.getenv("QUEUE_AGING_S", "60"))  # espera que dobra a prioridade de um job
+CHUNK_CLASS = os.getenv("CHUNK_CLASS", "long")  # fila dos pedaços de vídeos longos
 LARAVEL_API_BASE = os.getenv("LARAVEL_API_BASE", "http://localhost:8000/api")
 CALLBACK_TOKEN = os.getenv("CALLBACK_TOKEN")  # se precisar autenticar
 
 THRESHOLD = float(os.getenv("FACE_THRESHOLD", "0.6"))
 MODEL = os.getenv("FACE_MODEL", "hog")
 UPSAMPLE = int(os.getenv("FACE_UPSAMPLE", "1"))
+DETECT_SCALE = float(os.getenv("FACE_DETECT_SCALE", "1.0"))
+DETECT_MAX_SIDE = int(os.getenv("FACE_DETECT_MAX_SIDE", "0")) or None
+GALLERY_TTL = float(os.getenv("GALLERY_TTL", "30"))
+FACE_INDEX = os.getenv("FACE_INDEX", "flat")  # flat | ivf
+FACE_INDEX_PATH = os.getenv("FACE_INDEX_PATH", "").strip()  # vazio = ao lado do SQLite
+IVF_NLIST = int(os.getenv("IVF_NLIST", "256"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+FACE_CONSOLIDATE = os.getenv("FACE_CONSOLIDATE", "0") == "1"
+PROTOTYPE_RADIUS = float(os.getenv("PROTOTYPE_RADIUS", "0.35"))
+MAX_PROTOTYPES = int(os.getenv("MAX_PROTOTYPES", "8"))
+FACE_TRACK = os.getenv("FACE_TRACK", "0") == "1"
+TRACK_REENCODE_S = float(os.getenv("TRACK_REENCODE_S", "2.0"))
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", "1"))
+REPO_BATCH_ROWS = int(os.getenv("REPO_BATCH_ROWS", "500"))  # 1 = um commit por linha
+REPO_BATCH_MS = float(os.getenv("REPO_BATCH_MS", "200"))
+DETECT_BATCH = int(os.getenv("DETECT_BATCH", "1"))  # >1: detecção/encoding em lotes (use com FACE_MODEL=cnn)
+BATCH_WAIT_MS = float(os.getenv("BATCH_WAIT_MS", "50"))  # espera máxima de uma foto por outras para o lote
+FACE_CACHE_DIR = os.getenv("FACE_CACHE_DIR", "").strip()  # vazio = sem cache de análise
+FACE_CACHE_MB = float(os.getenv("FACE_CACHE_MB", "2048"))
+WORKER_CONCURRENCY = max(1, int(os.getenv("WORKER_CONCURRENCY", "1")))  # jobs simultâneos por worker
+FACE_DB = os.getenv("FACE_DB", "sqlite").strip().lower()  # sqlite | mysql (usa DB_HOST, DB_DATABASE...)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "0")) or WORKER_CONCURRENCY + 1  # conexões MySQL
 
 FRAME_SKIP_DEFAULT = int(os.getenv("FRAME_SKIP", "5"))
+FRAME_SAMPLING_DEFAULT = os.getenv("FRAME_SAMPLING", "grab")  # read | grab | time | keyframe | ffmpeg
+SAMPLES_PER_SECOND_DEFAULT = float(os.getenv("SAMPLES_PER_SECOND", "0")) or None
+VIDEO_CHUNK_S = float(os.getenv("VIDEO_CHUNK_S", "0"))  # 0 = não divide vídeos longos
+VIDEO_STREAM = os.getenv("VIDEO_STREAM", "0") == "1"  # hits direto em video_hits; callback final só com resumo
+VIDEO_PROGRESS_S = float(os.getenv("VIDEO_PROGRESS_S", "10"))  # intervalo dos callbacks de progresso (0 = sem)
+VIDEO_RAW_HITS = os.getenv("VIDEO_RAW_HITS", "1") == "1"  # 0 = só segmentos (sem uma linha por frame em video_hits)
+SEGMENT_GAP_S = float(os.getenv("SEGMENT_GAP_S", "2.0"))  # ausência que fecha um segmento de aparição
+UNKNOWN_MIN_FACES = int(os.getenv("UNKNOWN_MIN_FACES", "1"))  # >1 liga o agrupamento de desconhecidos (só vídeo)
+UNKNOWN_RADIUS = float(os.getenv("UNKNOWN_RADIUS", "0")) or None  # 0 = usa FACE_THRESHOLD
+UNKNOWN_TTL_S = float(os.getenv("UNKNOWN_TTL_S", "5"))
+VIDEO_DEADLINE_S = float(os.getenv("VIDEO_DEADLINE_S", "0"))  # prazo padrão por vídeo (0 = sem)
+QUEUE_DRAIN_S = float(os.getenv("QUEUE_DRAIN_S", "0"))  # >0: prazo por vídeo para esvaziar a fila nesse tempo
+VIDEO_DEADLINE_MIN_S = float(os.getenv("VIDEO_DEADLINE_MIN_S", "30"))  # piso do prazo derivado da fila
+CHUNK_LEASE_S = float(os.getenv("CHUNK_LEASE_S", "120"))
+CHUNK_MAX_ATTEMPTS = int(os.getenv("CHUNK_MAX_ATTEMPTS", "3"))
+WORKER_ID = os.getenv("WORKER_ID", "").strip() or None  # vazio = hostname:pid
+JOB_HEARTBEAT_S = float(os.getenv("JOB_HEARTBEAT_S", "30"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF_S = float(os.getenv("JOB_RETRY_BACKOFF_S", "10"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = sem endpoint /metrics
+METRICS_JSON_PATH = os.getenv("METRICS_JSON_PATH", "").strip()  # vazio = sem dump periódico
+METRICS_DUMP_S = float(os.getenv("METRICS_DUMP_S", "60"))
+WORKER_WARMUP = os.getenv("WORKER_WARMUP", "1") == "1"  # carrega modelos e galeria antes do primeiro job
 
 # Endpoints REST (ajuste conforme suas rotas)
 API_MEDIA_SHOW = f"{LARAVEL_API_BASE}/media/{{media_id}}"
 API_MEDIA_UPDATE = f"{LARAVEL_API_BASE}/media/{{media_id}}/processed"
+API_MEDIA_PROGRESS = f"{LARAVEL_API_BASE}/media/{{media_id}}/progress"
+
+_http = threading.local()
 
-session = requests.Session()
-session.headers.update({"Accept": "application/json"})
-if CALLBACK_TOKEN:
-    session.headers.update({"Authorization": f"Bearer {CALLBACK_TOKEN}"})
+def http_session() -> requests.Session:
+    """Uma Session por thread de job (requests.Session não é thread-safe)."""
+    session = getattr(_http, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update({"Accept": "application/json"})
+        if CALLBACK_TOKEN:
+            session.headers.update({"Authorization": f"Bearer {CALLBACK_TOKEN}"})
+        _http.session = session
+    return session
 
 # ------------------------
 # Helpers
@@ -93,98 +175,378 @@ def decode_laravel_job(raw_payload: str) -> Dict[str, Any]:
     # se for o caso, você pode extrair 'media_id' de lá. Aqui assumo 'data.media_id'.
     return data
 
+def media_id_of(raw_payload: str) -> int:
+    """media_id de um payload cru ({'media_id': ...}, ou {'data': {'media_id': ...}} no formato Laravel); 0 se não houver."""
+    try:
+        job = json.loads(raw_payload)
+        return int(job.get("media_id") or (job.get("data") or {}).get("media_id") or 0)
+    except Exception:
+        return 0
+
 def fetch_media(media_id: int) -> Dict[str, Any]:
     url = API_MEDIA_SHOW.format(media_id=media_id)
-    r = session.get(url, timeout=30)
+    with metrics.timer("fetch"):
+        r = http_session().get(url, timeout=30)
     r.raise_for_status()
     return r.json()
 
 def post_processed(media_id: int, payload: dict) -> None:
     url = f"{LARAVEL_API_BASE}/media/{media_id}/processed"
     safe_payload = _json_safe(payload)
-    print(safe_payload)
+    logger.debug("Callback processed | media_id={} payload={}", media_id, safe_payload)
     # opcional: garanta Content-Type json (requests define se usar json=)
-    r = session.post(url, json=safe_payload, timeout=60)
-
+    with metrics.timer("callback"):
+        r = http_session().post(url, json=safe_payload, timeout=60)
 
     try:
         detail = r.json()
     except Exception:
         detail = r.text
 
-    print(detail)
-    
+    logger.debug("Resposta do callback | media_id={} status={} corpo={}", media_id, r.status_code, detail)
+
     if r.status_code >= 400:
         # log útil para debug
         raise RuntimeError(f"Callback falhou {r.status_code}: {detail}")
 
+def post_progress(media_id: int, summary: VideoSummary) -> None:
+    """Callback de progresso de um vídeo em streaming; falhas só geram aviso."""
+    payload = {
+        "progress": summary.progress(),
+        "position_s": summary.position_s,
+        "frames_processed": summary.frames_processed,
+        "hits": summary.hits,
+        "people": len(summary.people),
+    }
+    try:
+        with metrics.timer("progress"):
+            r = http_session().post(API_MEDIA_PROGRESS.format(media_id=media_id), json=_json_safe(payload), timeout=10)
+        if r.status_code >= 400:
+            logger.warning(f"Callback de progresso recusado {r.status_code} | media_id={media_id}")
+    except requests.RequestException as e:
+        logger.warning(f"Callback de progresso falhou | media_id={media_id}: {e}")
+
+def stream_video_job(svc: FaceService, media_id: int, path: str, frame_skip: int, sampling, samples_per_second,
+                     deadline_s: Optional[float] = None) -> dict:
+    """
+    Vídeo em modo streaming: os hits vão para video_hits conforme saem, o
+    Laravel recebe progresso a cada VIDEO_PROGRESS_S e o callback final leva
+    só o resumo (contagens por pessoa), não a lista de hits.
+    """
+    summary = VideoSummary(media_id=media_id, media_path=path)
+    last = time.monotonic()
+    for _ in svc.stream_video(
+        media_id, path, frame_skip=frame_skip,
+        sampling=sampling, samples_per_second=samples_per_second, summary=summary, deadline_s=deadline_s,
+    ):
+        if VIDEO_PROGRESS_S > 0 and time.monotonic() - last >= VIDEO_PROGRESS_S:
+            post_progress(media_id, summary)
+            last = time.monotonic()
+    return {
+        "status": "processed",
+        "streamed": True,
+        "fps": summary.fps,
+        "frame_skip": summary.frame_skip,
+        "summary": summary.model_dump(),
+    }
+
+def video_output(res) -> dict:
+    out = {
+        "status": "processed",
+        "fps": res.fps,
+        "frame_skip": res.frame_skip,
+        "hits": [h.model_dump() for h in res.hits],
+        "segments": [s.model_dump() for s in res.segments],
+    }
+    if res.budget is not None:
+        out["budget"] = res.budget.model_dump()
+    return out
+
+def video_deadline(meta: Dict[str, Any], queue: Optional[ReliableQueue]) -> Optional[float]:
+    """
+    Prazo (s) de um vídeo: `deadline_s` do meta da mídia; senão o menor entre
+    VIDEO_DEADLINE_S e o que QUEUE_DRAIN_S deixa para cada job da fila,
+    dividida entre os workers. None = sem prazo.
+    """
+    if meta.get("deadline_s"):
+        return float(meta["deadline_s"])
+    options = [VIDEO_DEADLINE_S] if VIDEO_DEADLINE_S > 0 else []
+    if QUEUE_DRAIN_S > 0 and queue is not None:
+        depth, workers = queue.depth(), queue.worker_count()
+        if depth:
+            options.append(max(VIDEO_DEADLINE_MIN_S, QUEUE_DRAIN_S * workers / (depth + workers)))
+    return min(options) if options else None
+
+def record_queue_wait(data: Dict[str, Any]) -> None:
+    """Tempo entre o dispatch no Laravel (`queued_at`, ISO 8601) e o início do job, por classe de fila."""
+    queued = queued_at(data)
+    if queued is not None:
+        metrics.observe("queue_wait", max(0.0, time.time() - queued), queue=data.get("class") or DEFAULT_CLASS)
+
+def open_queue(r) -> ReliableQueue:
+    """Fila única (QUEUE_CLASSES vazio) ou filas por classe com prioridade e aging."""
+    kwargs = dict(
+        worker_id=WORKER_ID, heartbeat_ttl_s=JOB_HEARTBEAT_S,
+        max_attempts=JOB_MAX_ATTEMPTS, backoff_s=JOB_RETRY_BACKOFF_S,
+    )
+    if not QUEUE_CLASSES:
+        return ReliableQueue(r, QUEUE_KEY, **kwargs)
+    classes = parse_classes(QUEUE_CLASSES, QUEUE_KEY)
+    if WORKER_CLASSES:
+        classes = [c for c in classes if c.name in WORKER_CLASSES]
+        if not classes:
+            raise ValueError(f"WORKER_CLASSES={','.join(WORKER_CLASSES)} não corresponde a nenhuma classe de QUEUE_CLASSES")
+    logger.info("Filas: " + ", ".join(f"{c.key} (peso {c.weight:g})" for c in classes))
+    return PriorityQueue(r, QUEUE_KEY, classes, aging_s=QUEUE_AGING_S, **kwargs)
+
+def open_chunks(r) -> ChunkCoordinator:
+    if not QUEUE_CLASSES:
+        return ChunkCoordinator(r, QUEUE_KEY, lease_s=CHUNK_LEASE_S, max_attempts=CHUNK_MAX_ATTEMPTS)
+    return ChunkCoordinator(
+        r, class_key(QUEUE_KEY, CHUNK_CLASS), lease_s=CHUNK_LEASE_S, max_attempts=CHUNK_MAX_ATTEMPTS,
+        job_class=CHUNK_CLASS,
+    )
+
+def handle_chunk(svc: FaceService, chunks: ChunkCoordinator, media_id: int, step) -> None:
+    """Processa um pedaço de vídeo longo (ou a junção final) criado por `ChunkCoordinator.create`."""
+    params = chunks.params(media_id)
+    if params is None or not chunks.claim(media_id, step):
+        logger.info(f"Pedaço {step} ignorado (já concluído ou mídia descartada) | media_id={media_id}")
+        return
+    if step == MERGE:
+        finish_chunked(svc, chunks, media_id)
+        return
+
+    start_s, end_s = chunks.chunk_range(media_id, step)
+    logger.info(f"Pedaço {step} [{start_s:.1f}s, {end_s if end_s is not None else 'fim'}) | media_id={media_id}")
+    try:
+        with chunks.lease(media_id, step):
+            if chunks.attempts(media_id, step):
+                # tentativa anterior morreu no meio: descarta os hits que ela chegou a gravar
+                with svc.write_lock:
+                    svc.repo.delete_video_hits(media_id, start_s, end_s)
+            res = svc.process_video(
+                media_id, params["path"], frame_skip=params["frame_skip"],
+                sampling=params["sampling"], samples_per_second=params["samples_per_second"],
+                start_s=start_s, end_s=end_s, deadline_s=params.get("deadline_s"),
+            )
+    except Exception as e:
+        logger.exception(f"Falha no pedaço {step} | media_id={media_id}: {e}")
+        if chunks.fail(media_id, step, str(e)):
+            fail_chunked(chunks, media_id, str(e))
+        return
+
+    if chunks.complete(media_id, step, res):
+        finish_chunked(svc, chunks, media_id)
+
+def finish_chunked(svc: FaceService, chunks: ChunkCoordinator, media_id: int) -> None:
+    """Junta os resultados parciais e faz o callback único do vídeo."""
+    try:
+        with chunks.lease(media_id, MERGE):
+            with svc.write_lock:
+                merged = merge_chunk_results(svc.gallery, chunks.results(media_id), svc.cfg.threshold)
+            post_processed(media_id, video_output(merged))
+    except Exception as e:
+        logger.exception(f"Falha ao juntar pedaços | media_id={media_id}: {e}")
+        if chunks.fail(media_id, MERGE, str(e)):
+            fail_chunked(chunks, media_id, str(e))
+        return
+    chunks.cleanup(media_id)
+    logger.info(f"Vídeo em pedaços concluído | media_id={media_id} hits={len(merged.hits)}")
+
+def fail_chunked(chunks: ChunkCoordinator, media_id: int, error: str) -> None:
+    chunks.cleanup(media_id)
+    try:
+        post_processed(media_id, {"status": "failed", "error": error})
+    except Exception:
+        pass
+
+_first_job = threading.Lock()
+_first_job_done = False
+
+def record_first_job() -> None:
+    """Tempo do início do processo até o primeiro job concluído (uma vez por processo)."""
+    global _first_job_done
+    with _first_job:
+        if _first_job_done:
+            return
+        _first_job_done = True
+    elapsed = time.perf_counter() - PROCESS_T0
+    metrics.observe("first_job", elapsed)
+    logger.info(f"Primeiro job concluído {elapsed:.2f}s após o início do processo")
+
 # ------------------------
 # Loop principal
 # ------------------------
 
+def recognizer_config(index_path: str) -> RecognizerConfig:
+    return RecognizerConfig(
+        threshold=THRESHOLD, model=MODEL, upsample=UPSAMPLE, gallery_ttl_s=GALLERY_TTL,
+        detect_scale=DETECT_SCALE, detect_max_side=DETECT_MAX_SIDE,
+        index=FACE_INDEX, index_path=index_path, ivf_nlist=IVF_NLIST, ivf_nprobe=IVF_NPROBE,
+        consolidate=FACE_CONSOLIDATE, prototype_radius=PROTOTYPE_RADIUS, max_prototypes=MAX_PROTOTYPES,
+        track=FACE_TRACK, track_reencode_s=TRACK_REENCODE_S,
+        raw_hits=VIDEO_RAW_HITS, segment_gap_s=SEGMENT_GAP_S,
+        unknown_min_faces=UNKNOWN_MIN_FACES, unknown_radius=UNKNOWN_RADIUS, unknown_ttl_s=UNKNOWN_TTL_S,
+        video_workers=VIDEO_WORKERS, image_workers=WORKER_CONCURRENCY,
+        detect_batch=DETECT_BATCH, batch_wait_ms=BATCH_WAIT_MS,
+        cache_dir=str(BASE_DIR / FACE_CACHE_DIR) if FACE_CACHE_DIR else None,
+        cache_max_bytes=int(FACE_CACHE_MB * 2**20),
+    )
+
+def open_service() -> FaceService:
+    repo, index_base = open_face_repo(batch_rows=REPO_BATCH_ROWS, batch_ms=REPO_BATCH_MS)
+    index_path = FACE_INDEX_PATH or f"{index_base}.{FACE_INDEX}-index.npz"
+    return FaceService(repo, recognizer_config(index_path))
+
+def warm_service(svc: FaceService) -> None:
+    """Modelos do dlib e galeria carregados agora, não no primeiro job."""
+    with metrics.timer("warmup"):
+        warm_up(svc.cfg)
+        with svc.write_lock:
+            svc.gallery.ensure_fresh()
+
 def main() -> None:
     r = redis.from_url(REDIS_URL, decode_responses=True)
-
-    sqlite_path = resolve_sqlite_path()
-    logger.info(f"Usando SQLite em: {sqlite_path}")
-    repo = FaceRepo(sqlite_path)
-    svc = FaceService(repo, RecognizerConfig(threshold=THRESHOLD, model=MODEL, upsample=UPSAMPLE))
-
-    logger.info(f"Worker iniciado | Redis={REDIS_URL} | QueueKey={QUEUE_KEY}")
+    svc = open_service()
+    if WORKER_WARMUP:
+        warm_service(svc)
+
+    chunks = open_chunks(r)
+    queue = open_queue(r)
+    queue.start_heartbeat()
+
+    startup = time.perf_counter() - PROCESS_T0
+    metrics.observe("startup", startup)
+    logger.info(
+        f"Worker iniciado em {startup:.2f}s | Redis={REDIS_URL} | QueueKey={QUEUE_KEY} | "
+        f"id={queue.worker_id} | concorrência={WORKER_CONCURRENCY}"
+    )
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    if METRICS_JSON_PATH:
+        metrics.dump_every(METRICS_JSON_PATH, METRICS_DUMP_S)
+
+    # Cada job roda numa thread: HTTP (fetch/callback) em paralelo, CPU nos pools
+    # de processos do FaceService e matching/escritas serializados por write_lock.
+    # O semáforo impede de tirar da fila mais jobs do que há threads livres,
+    # deixando o resto para outros workers.
+    jobs = ThreadPoolExecutor(max_workers=WORKER_CONCURRENCY, thread_name_prefix="job")
+    free = threading.BoundedSemaphore(WORKER_CONCURRENCY)
 
     while True:
-        # BRPOP retorna (key, value); bloqueia até 5s pra permitir sinais/graceful shutdown
-        item = r.brpop(QUEUE_KEY, timeout=5)
-        if item is None:
+        # retentativas vencidas, jobs de workers mortos e pedaços de vídeo órfãos voltam para a fila
+        queue.promote_delayed()
+        for raw in queue.reap():
+            notify_failed(raw, "worker parou de responder e o job esgotou as tentativas")
+        for media_id in chunks.requeue_expired():
+            fail_chunked(chunks, media_id, "pedaço excedeu o número de tentativas")
+
+        free.acquire()
+        # o job vai para a lista de processamento deste worker; bloqueia até 5s pra permitir sinais/graceful shutdown
+        raw = queue.pop(timeout=5)
+        if raw is None:
+            free.release()
             continue
 
-        key, raw = item
+        fut = jobs.submit(run_job, queue, svc, chunks, raw)
+        fut.add_done_callback(lambda _: free.release())
+
+def notify_failed(raw: str, error: str) -> None:
+    """Job que esgotou as tentativas (foi para o dead-letter): avisa o Laravel da falha."""
+    metrics.inc("jobs", status="failed")
+    try:
+        if "chunk" in json.loads(raw):
+            return  # pedaço de vídeo: quem falha a mídia inteira é o ChunkCoordinator
+    except (ValueError, TypeError):
+        pass
+    media_id = media_id_of(raw)
+    if media_id:
         try:
-            data = json.loads(raw)
-            media_id = int(data["media_id"])
-            logger.info(f"Job recebido | media_id={media_id}")
-
-            media = fetch_media(media_id)
-            # Espera JSON em algo como:
-            # { id, type: 'image'|'video', path, meta: {frame_skip?} }
-            mtype = media["type"]
-            path = media["path"]
-            meta = media.get("meta") or {}
-            frame_skip = int(meta.get("frame_skip", FRAME_SKIP_DEFAULT))
-
-            if mtype == "photo":
-                res = svc.process_image(media_id, path)
-                out = {
-                    "status": "processed",
-                    "detections": [d.model_dump() for d in res.detections],
-                }
-            elif mtype == "video":
-                res = svc.process_video(media_id, path, frame_skip=frame_skip)
-                out = {
-                    "status": "processed",
-                    "fps": res.fps,
-                    "frame_skip": res.frame_skip,
-                    "hits": [h.model_dump() for h in res.hits],
-                }
-            else:
-                raise ValueError(f"Tipo de mídia não suportado: {mtype}")
-
-            post_processed(media_id, out)
-            logger.info(f"Processado com sucesso | media_id={media_id} tipo={mtype}")
-
-        except Exception as e:
-            logger.exception(f"Falha ao processar job: {e}")
-            # (opcional) notificar Laravel sobre falha
-            try:
-                # tente extrair media_id se possível
-                media_id = int(json.loads(raw).get("data", {}).get("media_id", 0))
-                if media_id:
-                    post_processed(media_id, {"status": "failed", "error": str(e)})
-            except Exception:
-                pass
-
-        # pequeno respiro
-        time.sleep(0.1)
+            post_processed(media_id, {"status": "failed", "error": error})
+        except Exception as cb_err:
+            logger.error(f"Callback de falha não enviado | media_id={media_id}: {cb_err}")
+
+def run_job(queue: ReliableQueue, svc: FaceService, chunks: ChunkCoordinator, raw: str) -> None:
+    """Executa um job e o confirma; em caso de falha, reagenda com backoff ou manda ao dead-letter."""
+    try:
+        with metrics.job():
+            handle_job(svc, chunks, raw, queue)
+    except Exception as e:
+        logger.exception(f"Falha ao processar job: {e}")
+        if queue.retry(raw, str(e)):
+            metrics.inc("jobs", status="retried")
+            return
+        notify_failed(raw, str(e))
+    else:
+        queue.ack(raw)
+        metrics.inc("jobs", status="processed")
+        record_first_job()
+
+def persist_gallery(svc: FaceService) -> None:
+    with svc.write_lock:
+        svc.gallery.persist()
+
+def handle_job(svc: FaceService, chunks: ChunkCoordinator, raw: str, queue: Optional[ReliableQueue] = None) -> None:
+    """Processa um job (mídia nova ou pedaço de vídeo); exceções sobem para `run_job`."""
+    data = json.loads(raw)
+    media_id = int(data["media_id"])
+    record_queue_wait(data)
+    if "chunk" in data:
+        handle_chunk(svc, chunks, media_id, data["chunk"])
+        persist_gallery(svc)
+        return
+    logger.info(f"Job recebido | media_id={media_id}")
+
+    media = fetch_media(media_id)
+    # Espera JSON em algo como:
+    # { id, type: 'image'|'video', path, meta: {frame_skip?} }
+    mtype = media["type"]
+    path = media["path"]
+    meta = media.get("meta") or {}
+    frame_skip = int(meta.get("frame_skip", FRAME_SKIP_DEFAULT))
+    sampling = meta.get("sampling") or FRAME_SAMPLING_DEFAULT
+    samples_per_second = meta.get("samples_per_second") or SAMPLES_PER_SECOND_DEFAULT
+    deadline_s = video_deadline(meta, queue) if mtype == "video" else None
+
+    if mtype == "photo":
+        res = svc.process_image(media_id, path)
+        out = {
+            "status": "processed",
+            "detections": [d.model_dump() for d in res.detections],
+        }
+    elif mtype == "video":
+        plan = plan_chunks(svc.video_duration_s(path), VIDEO_CHUNK_S) if VIDEO_CHUNK_S > 0 else [(0.0, None)]
+        if len(plan) > 1:
+            # vídeo longo: os pedaços vão para a fila e o callback sai no merge
+            chunks.create(media_id, plan, {
+                "path": path, "frame_skip": frame_skip,
+                "sampling": sampling, "samples_per_second": samples_per_second, "deadline_s": deadline_s,
+            })
+            return
+        if int(data.get("attempts") or 0):
+            # retentativa (ou job órfão devolvido pelo reap): descarta hits e segmentos da tentativa anterior
+            with svc.write_lock:
+                svc.repo.delete_video_hits(media_id)
+        if VIDEO_STREAM:
+            out = stream_video_job(svc, media_id, path, frame_skip, sampling, samples_per_second, deadline_s)
+        else:
+            res = svc.process_video(
+                media_id, path, frame_skip=frame_skip,
+                sampling=sampling, samples_per_second=samples_per_second, deadline_s=deadline_s,
+            )
+            out = video_output(res)
+    else:
+        raise ValueError(f"Tipo de mídia não suportado: {mtype}")
+
+    # resumo do job (tempo por estágio, frames, rostos) vai junto, em meta.metrics
+    stats = metrics.current_job()
+    if stats is not None:
+        out["metrics"] = stats.to_dict()
+    post_processed(media_id, out)
+    logger.info(f"Processado com sucesso | media_id={media_id} tipo={mtype}")
+    persist_gallery(svc)
+
 
 if __name__ == "__main__":
     main()
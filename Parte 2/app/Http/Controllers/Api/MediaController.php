@@ -15,6 +15,22 @@ public function find($id)
         return Media::findOrFail($id);
     }
 
+    /**
+     * Progresso parcial de um vídeo em streaming (VIDEO_STREAM=1 no worker).
+     * Os hits já estão sendo gravados em video_hits; aqui só atualizamos meta.progress.
+     */
+    public function progress(Request $request, Media $media)
+    {
+        $meta = $media->meta ?? [];
+        $meta['progress'] = $request->only(['progress', 'position_s', 'frames_processed', 'hits', 'people']);
+        $media->update([
+            'status' => 'processing',
+            'meta'   => $meta,
+        ]);
+
+        return response()->json(['ok' => true]);
+    }
+
     public function processed(Request $request, Media $media)
     {
         // 1) Validação "externa"
@@ -42,10 +58,20 @@ public function processed(Request $request, Media $media)
             $meta['detections'] = $data['detections'];
         }
 
-        if ($media->type === 'video') {
+        if ($media->type === 'video' && !empty($data['streamed'])) {
+            // streaming: o worker já gravou os hits em video_hits; chega só o resumo
+            $meta['fps'] = $data['fps'];
+            $meta['frame_skip'] = $data['frame_skip'];
+            $meta['summary'] = $data['summary'] ?? null;
+            unset($meta['progress']);
+        } elseif ($media->type === 'video') {
             $meta['fps'] = $data['fps'];
             $meta['frame_skip'] = $data['frame_skip'];
             $meta['hits'] = $data['hits'];
+            // segmentos de aparição: o worker já gravou em video_segments
+            $meta['segments'] = $data['segments'] ?? [];
+            // vídeo com prazo: configurações de detecção/amostragem usadas (no streaming vem em summary)
+            $meta['budget'] = $data['budget'] ?? null;
 
             $rows = [];
             $now = now();
@@ -75,6 +101,11 @@ public function processed(Request $request, Media $media)
             }
         }
 
+        if (isset($data['metrics'])) {
+            // resumo do worker: tempo por estágio e contadores do job
+            $meta['metrics'] = $data['metrics'];
+        }
+
         $media->update([
             'status' => 'processed',
             'meta'   => $meta,
@@ -8,7 +8,9 @@
 use Illuminate\Queue\InteractsWithQueue;
 use Illuminate\Queue\SerializesModels;
 use Illuminate\Foundation\Bus\Dispatchable;
+use Illuminate\Support\Facades\Process;
 use Illuminate\Support\Facades\Queue;
+use Illuminate\Support\Facades\Storage;
 
 class ProcessMedia implements ShouldQueue
 {
@@ -53,18 +55,78 @@ public static function dispatchRaw(int $mediaId, string $queue = 'face', ?string
             throw new \Exception("Media not found");
         }
 
+        $duration = $media->type === 'video' ? self::videoDuration($media) : null;
+        $class = self::queueClass($media, $duration);
+
         $payload = json_encode([
-            'type'      => $media->type,
-            'media_id'  => $mediaId,
-            'queued_at' => now()->toIso8601String(),
-            'meta'      => $media->meta,
+            'type'       => $media->type,
+            'media_id'   => $mediaId,
+            'queued_at'  => now()->toIso8601String(),
+            'class'      => $class,
+            'duration_s' => $duration,
+            'meta'       => $media->meta,
         ], JSON_UNESCAPED_SLASHES | JSON_UNESCAPED_UNICODE);
 
         // conexão default do queue.php (ex.: 'redis'), ou a passada por parâmetro
         $conn = $connection ?: config('queue.default');
 
+        // fila por classe (queues:face:photo...), que o worker lê por prioridade
+        if (config('queue.face.classes')) {
+            $queue = "$queue:$class";
+        }
+
         // IMPORTANTE: isso empurra o JSON “cru” para a lista Redis da fila.
         // Laravel workers não saberão processar essa mensagem (não tem 'job' nem 'command').
         Queue::connection($conn)->pushRaw($payload, $queue);
     }
+
+    /**
+     * Classe de prioridade da mídia: photo, short ou long (vídeos).
+     * Sem duração conhecida, o tamanho do arquivo decide.
+     */
+    public static function queueClass(Media $media, ?float $duration): string
+    {
+        if ($media->type !== 'video') {
+            return 'photo';
+        }
+        if ($duration !== null) {
+            return $duration <= config('queue.face.short_video_s', 120) ? 'short' : 'long';
+        }
+        $disk = Storage::disk('public');
+        $bytes = $disk->exists($media->path) ? $disk->size($media->path) : 0;
+
+        return $bytes <= config('queue.face.short_video_mb', 50) * 1024 * 1024 ? 'short' : 'long';
+    }
+
+    /**
+     * Duração do vídeo em segundos: meta.duration_s, se houver, senão ffprobe.
+     */
+    public static function videoDuration(Media $media): ?float
+    {
+        $known = $media->meta['duration_s'] ?? null;
+        if (is_numeric($known)) {
+            return (float) $known;
+        }
+
+        $path = Storage::disk('public')->path($media->path);
+        if (!is_file($path)) {
+            return null;
+        }
+
+        try {
+            $result = Process::timeout(10)->run([
+                config('queue.face.ffprobe', 'ffprobe'),
+                '-v', 'error',
+                '-show_entries', 'format=duration',
+                '-of', 'default=noprint_wrappers=1:nokey=1',
+                $path,
+            ]);
+        } catch (\Throwable $e) {
+            return null; // ffprobe ausente ou travado: fica pelo tamanho do arquivo
+        }
+
+        $out = trim($result->output());
+
+        return $result->successful() && is_numeric($out) ? (float) $out : null;
+    }
 }
@@ -26,6 +26,11 @@ public function videoHits()
         return $this->hasMany(VideoHit::class);
     }
 
+    public function videoSegments()
+    {
+        return $this->hasMany(VideoSegment::class);
+    }
+
     public function people()
     {
         return $this->belongsToMany(Person::class, 'video_hits', 'media_id', 'person_id')
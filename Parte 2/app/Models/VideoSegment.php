@@ -0,0 +1,30 @@
+<?php
+
+namespace App\Models;
+
+use Illuminate\Database\Eloquent\Model;
+
+class VideoSegment extends Model
+{
+    protected $table = 'video_segments';
+
+    protected $fillable = [
+        'media_id',
+        'person_id',
+        'start_frame', 'end_frame',
+        'start_s', 'end_s',
+        'hits',
+        'best_distance',
+        'left', 'top', 'right', 'bottom',
+    ];
+
+    public function media()
+    {
+        return $this->belongsTo(Media::class);
+    }
+
+    public function person()
+    {
+        return $this->belongsTo(Person::class);
+    }
+}
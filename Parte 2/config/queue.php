@@ -109,4 +109,24 @@
         'table' => 'failed_jobs',
     ],
 
+    /*
+    |--------------------------------------------------------------------------
+    | Fila do worker Python (reconhecimento facial)
+    |--------------------------------------------------------------------------
+    |
+    | Com 'classes' ligado, ProcessMedia::dispatchRaw publica cada mídia numa
+    | fila por classe (face:photo, face:short, face:long), que o worker lê com
+    | prioridade (QUEUE_CLASSES no worker). Vídeo curto é o de até
+    | 'short_video_s' segundos (duração pelo ffprobe) ou, sem ffprobe, de até
+    | 'short_video_mb' MB.
+    |
+    */
+
+    'face' => [
+        'classes' => (bool) env('FACE_QUEUE_CLASSES', true),
+        'short_video_s' => (int) env('FACE_SHORT_VIDEO_S', 120),
+        'short_video_mb' => (int) env('FACE_SHORT_VIDEO_MB', 50),
+        'ffprobe' => env('FFPROBE_BIN', 'ffprobe'),
+    ],
+
 ];
@@ -0,0 +1,42 @@
+<?php
+
+use Illuminate\Database\Migrations\Migration;
+use Illuminate\Database\Schema\Blueprint;
+use Illuminate\Support\Facades\Schema;
+
+return new class extends Migration
+{
+    /**
+     * Run the migrations.
+     */
+    public function up(): void
+    {
+        Schema::create('video_segments', function (Blueprint $table) {
+            $table->id();
+            $table->foreignId('media_id')->constrained('media')->cascadeOnDelete();
+            $table->foreignId('person_id')->constrained('people')->cascadeOnDelete();
+            $table->unsignedInteger('start_frame');
+            $table->unsignedInteger('end_frame');
+            $table->decimal('start_s', 10, 3);
+            $table->decimal('end_s', 10, 3);
+            $table->unsignedInteger('hits');
+            $table->float('best_distance');
+            $table->unsignedInteger('left');
+            $table->unsignedInteger('top');
+            $table->unsignedInteger('right');
+            $table->unsignedInteger('bottom');
+            $table->timestamps();
+
+            $table->index(['media_id', 'start_s']);
+            $table->index('person_id');
+        });
+    }
+
+    /**
+     * Reverse the migrations.
+     */
+    public function down(): void
+    {
+        Schema::dropIfExists('video_segments');
+    }
+};
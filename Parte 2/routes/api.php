@@ -9,6 +9,7 @@
 Route::get('/media/{id}', [MediaController::class, 'find']);
 
 Route::post('/media/{media}/processed', [MediaController::class, 'processed']);
+Route::post('/media/{media}/progress', [MediaController::class, 'progress']);
 
 // Rotas para pessoas
 Route::patch('/people/{person}/name', [PersonController::class, 'updateName']);